@@ -0,0 +1,286 @@
+import io
+import struct
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+COPY_BATCH_ROWS = 100_000
+
+# PostgreSQL binary COPY framing
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + (0).to_bytes(4, "big") + (0).to_bytes(4, "big")
+PGCOPY_TRAILER = (-1).to_bytes(2, "big", signed=True)
+# PostgreSQL timestamps / dates count from 2000-01-01
+PG_EPOCH_US = 946_684_800_000_000
+PG_EPOCH_DAYS = 10_957
+COPY_READ_SIZE = 1 << 20
+
+
+def quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def to_arrow(data) -> pa.Table:
+    if isinstance(data, pa.Table):
+        return data
+    if isinstance(data, pa.RecordBatch):
+        return pa.Table.from_batches([data])
+    if isinstance(data, pd.DataFrame):
+        return pa.Table.from_pandas(data, preserve_index=False)
+    raise TypeError(f"Unsupported data type for COPY: {type(data).__name__}")
+
+
+def copy_rows(cur, table: str, data, batch_rows: int = COPY_BATCH_ROWS) -> int:
+    """
+    Stream a DataFrame / Arrow table into `table` with COPY FROM STDIN.
+    Rows are rendered as CSV into an in-memory buffer, batch_rows at a time.
+    NULLs are written unquoted-empty, strings are quoted (so '' stays '').
+    Returns the number of rows copied.
+    """
+    t = to_arrow(data)
+    if t.num_rows == 0:
+        return 0
+
+    cols = ", ".join(quote_ident(c) for c in t.column_names)
+    copy_sql = f"COPY {table} ({cols}) FROM STDIN WITH (FORMAT csv)"
+    options = pacsv.WriteOptions(include_header=False)
+
+    for batch in t.to_batches(max_chunksize=batch_rows):
+        buf = io.BytesIO()
+        pacsv.write_csv(batch, buf, options)
+        buf.seek(0)
+        cur.copy_expert(copy_sql, buf)
+
+    return t.num_rows
+
+
+def pg_column_type(t: pa.DataType) -> str:
+    """
+    PostgreSQL type for an Arrow type. Types without a binary encoder here load as text.
+    """
+    if pa.types.is_dictionary(t):
+        return pg_column_type(t.value_type)
+    if pa.types.is_boolean(t):
+        return "boolean"
+    if pa.types.is_int8(t) or pa.types.is_int16(t) or pa.types.is_uint8(t):
+        return "smallint"
+    if pa.types.is_int32(t) or pa.types.is_uint16(t):
+        return "integer"
+    if pa.types.is_uint64(t):
+        # values from 2**63 up do not fit a bigint
+        return "numeric"
+    if pa.types.is_integer(t):
+        return "bigint"
+    if pa.types.is_float16(t) or pa.types.is_float32(t):
+        return "real"
+    if pa.types.is_floating(t):
+        return "double precision"
+    if pa.types.is_timestamp(t):
+        return "timestamptz" if t.tz else "timestamp"
+    if pa.types.is_date(t):
+        return "date"
+    return "text"
+
+
+def create_table_sql(table: str, schema: pa.Schema) -> str:
+    cols = ",\n  ".join(f"{quote_ident(f.name)} {pg_column_type(f.type)}" for f in schema)
+    return f"CREATE TABLE IF NOT EXISTS {table} (\n  {cols}\n);"
+
+
+_FIXED_WIDTH = {
+    "boolean": np.dtype("u1"),
+    "smallint": np.dtype(">i2"),
+    "integer": np.dtype(">i4"),
+    "bigint": np.dtype(">i8"),
+    "real": np.dtype(">f4"),
+    "double precision": np.dtype(">f8"),
+    "timestamptz": np.dtype(">i8"),
+    "timestamp": np.dtype(">i8"),
+    "date": np.dtype(">i4"),
+}
+
+
+def cast_reader(reader: pa.RecordBatchReader, schema: pa.Schema) -> pa.RecordBatchReader:
+    """
+    `reader` with its batches cast to `schema` (same columns, same order), for
+    a binary COPY into a table whose types are not the Parquet ones.
+    Timestamps finer than microseconds are truncated, as in _column_payload.
+    """
+    def batches():
+        for batch in reader:
+            yield pa.RecordBatch.from_arrays(
+                [pc.cast(col, f.type, safe=not pa.types.is_timestamp(f.type)) for col, f in zip(batch.columns, schema)],
+                schema=schema,
+            )
+
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+
+def _numeric_binary(arr: pa.Array) -> pa.Array:
+    """
+    Unsigned integers in the binary form of numeric (base-10000 digits, no
+    fraction), as a binary array encode_binary_rows copies like text.
+    """
+    out = []
+    for v in arr.to_pylist():
+        if v is None:
+            out.append(None)
+            continue
+        digits = []
+        while v:
+            v, d = divmod(v, 10000)
+            digits.append(d)
+        weight = max(len(digits) - 1, 0)
+        digits.reverse()
+        # trailing zero digits are implied by the weight
+        while digits and digits[-1] == 0:
+            digits.pop()
+        out.append(struct.pack(f">hhHh{len(digits)}h", len(digits), weight, 0, 0, *digits))
+    return pa.array(out, pa.binary())
+
+
+def _column_payload(arr: pa.Array):
+    """
+    (pg type, big-endian numpy values or None, arrow string array or None) for one column.
+    """
+    if pa.types.is_dictionary(arr.type):
+        arr = arr.dictionary_decode()
+    pg = pg_column_type(arr.type)
+    if pg == "text":
+        arr = pc.cast(arr, pa.string())
+        if arr.null_count:
+            # nulls may still own bytes in the data buffer; rebuild them empty
+            arr = pc.if_else(pc.is_valid(arr), arr, pa.scalar(None, pa.string()))
+        return pg, None, arr
+    if pg == "numeric":
+        return pg, None, _numeric_binary(arr)
+    if pg in ("timestamptz", "timestamp"):
+        # PostgreSQL keeps microseconds: finer timestamps are truncated, not rejected
+        us = pc.cast(pc.cast(arr, pa.timestamp("us", arr.type.tz), safe=False), pa.int64())
+        values = us.to_numpy(zero_copy_only=False) if not us.null_count else pc.fill_null(us, 0).to_numpy()
+        return pg, (values - PG_EPOCH_US).astype(_FIXED_WIDTH[pg]), None
+    if pg == "date":
+        days = pc.cast(pc.cast(arr, pa.date32()), pa.int32())
+        values = pc.fill_null(days, 0).to_numpy()
+        return pg, (values.astype(np.int64) - PG_EPOCH_DAYS).astype(_FIXED_WIDTH[pg]), None
+    if pg == "boolean":
+        values = pc.fill_null(arr, False).to_numpy(zero_copy_only=False)
+    else:
+        values = pc.fill_null(arr, 0).to_numpy(zero_copy_only=False)
+    return pg, values.astype(_FIXED_WIDTH[pg]), None
+
+
+def _scatter(out: np.ndarray, starts: np.ndarray, values: np.ndarray) -> None:
+    """
+    Write values[i] (fixed width) at out[starts[i]:].
+    """
+    if not len(starts):
+        return
+    raw = np.ascontiguousarray(values).view(np.uint8).reshape(len(values), -1)
+    out[starts[:, None] + np.arange(raw.shape[1])] = raw
+
+
+def encode_binary_rows(batch: pa.RecordBatch) -> bytes:
+    """
+    Tuples of `batch` in PostgreSQL binary COPY format (no header / trailer).
+    Built column by column with numpy: field sizes give each row's offset,
+    then every column is scattered into one output buffer.
+    """
+    n = batch.num_rows
+    columns = [_column_payload(col) for col in batch.columns]
+
+    valid = [np.asarray(col.is_valid()) if col.null_count else np.ones(n, dtype=bool) for col in batch.columns]
+    sizes = []
+    for (pg, values, strings), ok in zip(columns, valid):
+        if strings is not None:
+            offsets = np.frombuffer(strings.buffers()[1], dtype=np.int32)[strings.offset:strings.offset + n + 1]
+            lengths = np.diff(offsets).astype(np.int64)
+        else:
+            lengths = np.where(ok, values.dtype.itemsize, 0).astype(np.int64)
+        sizes.append(lengths)
+
+    row_sizes = 2 + sum(4 + s for s in sizes)
+    row_starts = np.zeros(n, dtype=np.int64)
+    np.cumsum(row_sizes[:-1], out=row_starts[1:])
+    out = np.zeros(int(row_sizes.sum()), dtype=np.uint8)
+
+    _scatter(out, row_starts, np.full(n, len(columns), dtype=">i2"))
+    field_starts = row_starts + 2
+    for (pg, values, strings), ok, lengths in zip(columns, valid, sizes):
+        _scatter(out, field_starts, np.where(ok, lengths, -1).astype(">i4"))
+        data_starts = field_starts + 4
+        if strings is not None:
+            offsets = np.frombuffer(strings.buffers()[1], dtype=np.int32)[strings.offset:strings.offset + n + 1]
+            lo, hi = int(offsets[0]), int(offsets[-1])
+            if hi > lo:
+                data = np.frombuffer(strings.buffers()[2], dtype=np.uint8)[lo:hi]
+                out[np.repeat(data_starts - offsets[:-1], lengths) + np.arange(lo, hi)] = data
+        else:
+            _scatter(out, data_starts[ok], values[ok])
+        field_starts = data_starts + lengths
+
+    return out.tobytes()
+
+
+class _ChunkReader(io.RawIOBase):
+    """
+    File-like view over an iterator of byte chunks (what copy_expert reads from).
+    A read returns at most the rest of the current chunk, without re-copying it.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._chunk = memoryview(b"")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while self._pos >= len(self._chunk):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b""
+            self._chunk, self._pos = memoryview(chunk), 0
+        end = len(self._chunk) if size is None or size < 0 else min(len(self._chunk), self._pos + size)
+        out = self._chunk[self._pos:end].tobytes()
+        self._pos = end
+        return out
+
+
+def binary_copy_chunks(batches):
+    yield PGCOPY_HEADER
+    for batch in batches:
+        if batch.num_rows:
+            yield encode_binary_rows(batch)
+    yield PGCOPY_TRAILER
+
+
+def copy_binary(cur, table: str, data, batch_rows: int = COPY_BATCH_ROWS) -> int:
+    """
+    Stream a DataFrame / Arrow table / RecordBatchReader into `table` with one
+    binary COPY. Column types must match pg_column_type() of the Arrow types.
+    Returns the number of rows copied.
+    """
+    if isinstance(data, pa.RecordBatchReader):
+        names, batches = data.schema.names, data
+    else:
+        t = to_arrow(data)
+        if t.num_rows == 0:
+            return 0
+        names, batches = t.column_names, t.to_batches(max_chunksize=batch_rows)
+
+    rows = 0
+
+    def counted(batches):
+        nonlocal rows
+        for batch in batches:
+            rows += batch.num_rows
+            yield batch
+
+    cols = ", ".join(quote_ident(c) for c in names)
+    copy_sql = f"COPY {table} ({cols}) FROM STDIN WITH (FORMAT binary)"
+    cur.copy_expert(copy_sql, _ChunkReader(binary_copy_chunks(counted(batches))), size=COPY_READ_SIZE)
+    return rows
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 PROJECT_ROOT = Path("/opt/project/socar_hackathon_deciders")
@@ -9,7 +10,58 @@ PARQUET_DIRS = [
 
 MANIFEST_TABLE = "raw_vault.file_manifest"
 REJECT_TABLE = "raw_vault.rejected_records"
+REJECT_SUMMARY_TABLE = "raw_vault.reject_summary"
+# files to load per run and batch, with the stat and hash of the scan (the DAG passes only batch ids)
+SCAN_TABLE = "raw_vault.file_scan"
+SCAN_RETENTION_DAYS = 7
+
+# Rejected rows stored per rule and file; the full count goes to REJECT_SUMMARY_TABLE
+REJECT_SAMPLE_LIMIT = 10_000
 
 POSTGRES_CONN_ID = "RAWVAULT_PG"
 
+# scan_files: files whose size/mtime (and inode) match the manifest are not re-hashed
+SCAN_COMPARE_INODE = True
+SCAN_HASH_WORKERS = 4
+
+# t_process is mapped over batches of PROCESS_BATCH_SIZE files, at most PROCESS_CONCURRENCY at a time
+PROCESS_BATCH_SIZE = int(os.environ.get("RAW_VAULT_PROCESS_BATCH_SIZE", "5"))
+PROCESS_CONCURRENCY = int(os.environ.get("RAW_VAULT_PROCESS_CONCURRENCY", "4"))
+
+HUB_WELL_TABLE = "raw_vault.hub_well"
+HUB_SENSOR_TABLE = "raw_vault.hub_sensor"
+HUB_SURVEY_TYPE_TABLE = "raw_vault.hub_survey_type"
+SAT_READINGS_TABLE = "raw_vault.sat_link_sensor_well_readings"
+
+# Rows per record batch when streaming a parquet file into the satellite
+INGEST_BATCH_ROWS = 100_000
+
+# Hub business keys shared between the task processes of one DAG run
+REFCACHE_DIR = Path(os.environ.get("RAW_VAULT_REFCACHE_DIR", "/tmp/raw_vault_refcache"))
+
+# sat_link_sensor_well_readings is range-partitioned on this column ("load_dts" or "timestamp"),
+# one partition per SAT_PARTITION_INTERVAL ("month" or "year")
+SAT_PARTITION_COLUMN = os.environ.get("RAW_VAULT_SAT_PARTITION_COLUMN", "load_dts")
+SAT_PARTITION_INTERVAL = os.environ.get("RAW_VAULT_SAT_PARTITION_INTERVAL", "month")
+
+# Star schema refreshed from the vault at the end of each DAG run (see marts.py).
+# Facts are merged past a high-water mark on "load_dts" (one per mart) or
+# "record_source" (one load_dts mark per source file).
+MART_SCHEMA = "analytics"
+MART_WATERMARK_TABLE = "raw_vault.mart_watermarks"
+MART_WATERMARK_COLUMN = os.environ.get("RAW_VAULT_MART_WATERMARK_COLUMN", "load_dts")
+
+# Depth band width of analytics.rollup_well_depth (see rollups.py)
+DEPTH_BIN_FT = int(os.environ.get("RAW_VAULT_DEPTH_BIN_FT", "500"))
+
+# Per-stage / per-file metrics (see metrics.py); the Prometheus textfile is
+# only written when RAW_VAULT_METRICS_TEXTFILE_DIR is set (node_exporter --collector.textfile.directory)
+METRICS_TABLE = "raw_vault.pipeline_metrics"
+METRICS_TEXTFILE_DIR = os.environ.get("RAW_VAULT_METRICS_TEXTFILE_DIR")
 
+# Opt-in profiling of the DAG tasks (see profiling.py; the scripts use scripts/vault_profile.py):
+# cProfile + tracemalloc, one <name>__<run>__<pid>.prof / .json pair per profiled run under
+# PROFILE_DIR, by default profiles/ of the checkout the DAG is loaded from
+PROFILE_ENABLED = os.environ.get("RAW_VAULT_PROFILE", "").lower() in ("1", "true", "yes")
+PROFILE_DIR = Path(os.environ.get("RAW_VAULT_PROFILE_DIR", Path(__file__).resolve().parents[2] / "profiles"))
+PROFILE_TOP_ALLOCATIONS = int(os.environ.get("RAW_VAULT_PROFILE_TOP_ALLOCATIONS", "25"))
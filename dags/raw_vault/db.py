@@ -1,13 +1,90 @@
-from airflow.providers.postgres.hooks.postgres import PostgresHook
+from contextlib import contextmanager
 
-from .config import POSTGRES_CONN_ID, MANIFEST_TABLE, REJECT_TABLE
+import psycopg2.extensions
 
-def get_hook() -> PostgresHook:
+from .config import POSTGRES_CONN_ID, MANIFEST_TABLE, REJECT_TABLE, REJECT_SUMMARY_TABLE, SCAN_TABLE
+
+# statements / COPYs / commits sent by this process (read by metrics.py)
+_round_trips = 0
+
+def round_trips() -> int:
+    return _round_trips
+
+def _count_round_trips(n: int = 1) -> None:
+    global _round_trips
+    _round_trips += n
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """
+    Cursor that counts its round trips (executemany sends one per parameter set).
+    """
+
+    def execute(self, query, vars=None):
+        _count_round_trips()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        _count_round_trips(len(vars_list))
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        _count_round_trips()
+        return super().copy_expert(sql, file, size)
+
+def get_hook():
+    # imported here: scripts use the helpers below with their own psycopg2 connection
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
     return PostgresHook(postgres_conn_id=POSTGRES_CONN_ID)
 
-def ensure_support_tables():
-    hook = get_hook()
-    with hook.get_conn() as conn:
+@contextmanager
+def pipeline_connection():
+    """
+    One connection for a whole task run, with the session in UTC. Helpers
+    receive it as `conn` instead of opening their own; it is closed when the
+    block exits.
+    """
+    conn = get_hook().get_conn()
+    conn.cursor_factory = CountingCursor
+    try:
+        # naive timestamps are UTC everywhere in Python (as_utc, _column_range);
+        # COPY and timestamptz casts must not read them in the server's TimeZone
+        with transaction(conn):
+            with conn.cursor() as cur:
+                cur.execute("SET TIME ZONE 'UTC';")
+        yield conn
+    finally:
+        conn.close()
+
+@contextmanager
+def transaction(conn):
+    """
+    Commit on success, roll back on any error.
+    """
+    try:
+        yield conn
+        conn.commit()
+        _count_round_trips()
+    except Exception:
+        conn.rollback()
+        raise
+
+def table_columns(conn, table: str) -> list[str]:
+    """
+    Column names of `schema.table` in ordinal order ([] if it does not exist).
+    """
+    schema, name = table.split(".", 1)
+    with transaction(conn):
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema=%s AND table_name=%s ORDER BY ordinal_position;",
+                (schema, name),
+            )
+            return [row[0] for row in cur.fetchall()]
+
+def ensure_support_tables(conn):
+    with transaction(conn):
         with conn.cursor() as cur:
             cur.execute("""
             CREATE SCHEMA IF NOT EXISTS raw_vault;
@@ -24,6 +101,13 @@ def ensure_support_tables():
             );
             """)
             cur.execute(f"""
+            ALTER TABLE {MANIFEST_TABLE}
+              ADD COLUMN IF NOT EXISTS file_size bigint,
+              ADD COLUMN IF NOT EXISTS file_mtime_ns bigint,
+              ADD COLUMN IF NOT EXISTS file_inode bigint,
+              ADD COLUMN IF NOT EXISTS last_error text;
+            """)
+            cur.execute(f"""
             CREATE TABLE IF NOT EXISTS {REJECT_TABLE} (
               rejected_dts timestamptz,
               rule_name text,
@@ -32,5 +116,25 @@ def ensure_support_tables():
               payload jsonb
             );
             """)
-        conn.commit()
-
+            cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {REJECT_SUMMARY_TABLE} (
+              rejected_dts timestamptz,
+              rule_name text,
+              record_source text,
+              rejected_count bigint,
+              sampled_count bigint
+            );
+            """)
+            cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SCAN_TABLE} (
+              run_id text,
+              batch_id integer,
+              file_path text,
+              sha256 text,
+              file_size bigint,
+              file_mtime_ns bigint,
+              file_inode bigint,
+              scanned_dts timestamptz,
+              PRIMARY KEY (run_id, batch_id, file_path)
+            );
+            """)
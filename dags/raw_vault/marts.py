@@ -0,0 +1,254 @@
+import time
+from dataclasses import dataclass
+
+from .config import (
+    MART_SCHEMA, MART_WATERMARK_TABLE, MART_WATERMARK_COLUMN, SAT_READINGS_TABLE,
+    HUB_WELL_TABLE, HUB_SENSOR_TABLE, HUB_SURVEY_TYPE_TABLE,
+)
+from .db import pipeline_connection, transaction
+from .metrics import MetricsRecorder
+
+WATERMARK_COLUMNS = ("load_dts", "record_source")
+# watermark_key of the single per-mart mark ("load_dts" mode, dimensions)
+GLOBAL_KEY = ""
+
+
+@dataclass(frozen=True)
+class Dimension:
+    name: str
+    hub: str
+    key: str
+    hash_key: str
+
+
+DIMENSIONS = [
+    Dimension("dim_well", HUB_WELL_TABLE, "well_id", "well_hk"),
+    Dimension("dim_sensor", HUB_SENSOR_TABLE, "sensor_id", "sensor_hk"),
+    Dimension("dim_survey_type", HUB_SURVEY_TYPE_TABLE, "survey_type_id", "survey_type_hk"),
+]
+
+FACT_TABLE = "fact_sensor_readings"
+
+# fact column -> expression over the satellite row `s` (% doubled: executed with parameters)
+FACT_COLUMNS = [
+    ("well_id", "text", "s.well_id::text"),
+    ("sensor_id", "text", "s.sensor_id::text"),
+    ("survey_type_id", "text", "s.survey_type_id::text"),
+    ("reading_ts", "timestamptz", 's."timestamp"'),
+    ("depth_ft", "double precision", "s.depth_ft"),
+    ("amplitude", "double precision", "s.amplitude"),
+    ("quality_flag", "integer", "s.quality_flag"),
+    ("source_format", "text", r"CASE WHEN s.record_source LIKE '%%\_decoded.parquet' THEN 'sgx' ELSE 'parquet' END"),
+    ("record_source", "text", "s.record_source"),
+    ("load_dts", "timestamptz", "s.load_dts"),
+]
+
+
+def _exists(cur, table: str) -> bool:
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (table,))
+    return cur.fetchone()[0]
+
+
+def ensure_mart_tables(conn) -> None:
+    with transaction(conn):
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {MART_SCHEMA};")
+            cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {MART_WATERMARK_TABLE} (
+              mart_name text,
+              watermark_key text,
+              watermark_column text,
+              watermark timestamptz,
+              last_rows bigint,
+              last_seconds double precision,
+              updated_dts timestamptz,
+              PRIMARY KEY (mart_name, watermark_key)
+            );
+            """)
+            cur.execute(f"ALTER TABLE {MART_WATERMARK_TABLE} ADD COLUMN IF NOT EXISTS source_oid bigint;")
+            for dim in DIMENSIONS:
+                cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {MART_SCHEMA}.{dim.name} (
+                  {dim.key} text PRIMARY KEY,
+                  {dim.hash_key} text,
+                  record_source text,
+                  load_dts timestamptz,
+                  updated_dts timestamptz
+                );
+                """)
+            cols = ",\n              ".join(f"{c} {t}" for c, t, _ in FACT_COLUMNS)
+            cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {MART_SCHEMA}.{FACT_TABLE} (
+              {cols}
+            );
+            """)
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {FACT_TABLE}_well_ts_idx "
+                        f"ON {MART_SCHEMA}.{FACT_TABLE} (well_id, reading_ts);")
+
+
+def _global_mark_sql(per_source_fallback: bool = True) -> str:
+    """
+    The mart's single load_dts mark (%(mart)s); -infinity when the mart was
+    never refreshed. per_source_fallback: after a switch from "record_source"
+    mode, start from the newest per-source mark instead.
+    """
+    fallback = (
+        f"(SELECT max(watermark) FROM {MART_WATERMARK_TABLE} WHERE mart_name = %(mart)s),"
+        if per_source_fallback else ""
+    )
+    return f"""coalesce(
+      (SELECT watermark FROM {MART_WATERMARK_TABLE} WHERE mart_name = %(mart)s AND watermark_key = ''),
+      {fallback}
+      '-infinity'::timestamptz
+    )"""
+
+
+def _save_marks(cur, mart: str, column: str, marks: list[tuple], seconds: float) -> int:
+    """
+    Upsert (watermark_key, watermark, rows) marks. Returns the total rows.
+    """
+    cur.executemany(f"""
+    INSERT INTO {MART_WATERMARK_TABLE} AS w
+      (mart_name, watermark_key, watermark_column, watermark, last_rows, last_seconds, updated_dts)
+    VALUES (%s,%s,%s,%s,%s,%s,now())
+    ON CONFLICT (mart_name, watermark_key) DO UPDATE SET
+      watermark_column = EXCLUDED.watermark_column,
+      watermark = coalesce(EXCLUDED.watermark, w.watermark),
+      last_rows = EXCLUDED.last_rows,
+      last_seconds = EXCLUDED.last_seconds,
+      updated_dts = EXCLUDED.updated_dts;
+    """, [(mart, key, column, mark, rows, seconds) for key, mark, rows in marks])
+    return sum(rows for _, _, rows in marks)
+
+
+def merge_dimension(cur, dim: Dimension) -> int:
+    """
+    Upsert the hub rows newer than the dimension's load_dts mark in one
+    statement; unchanged keys are not rewritten. Returns the rows inserted / updated.
+    """
+    t0 = time.perf_counter()
+    cur.execute(f"""
+    WITH src AS (
+      SELECT DISTINCT ON (h.{dim.key}) h.{dim.key}::text AS key, h.{dim.hash_key}::text AS hk,
+             h.record_source, h.load_dts
+      FROM {dim.hub} h
+      WHERE h.load_dts > {_global_mark_sql()} AND h.{dim.key} IS NOT NULL
+      ORDER BY h.{dim.key}, h.load_dts DESC
+    ),
+    up AS (
+      INSERT INTO {MART_SCHEMA}.{dim.name} AS d ({dim.key}, {dim.hash_key}, record_source, load_dts, updated_dts)
+      SELECT key, hk, record_source, load_dts, now() FROM src
+      ON CONFLICT ({dim.key}) DO UPDATE SET
+        {dim.hash_key} = EXCLUDED.{dim.hash_key},
+        record_source = EXCLUDED.record_source,
+        load_dts = EXCLUDED.load_dts,
+        updated_dts = EXCLUDED.updated_dts
+      WHERE (d.{dim.hash_key}, d.record_source) IS DISTINCT FROM (EXCLUDED.{dim.hash_key}, EXCLUDED.record_source)
+      RETURNING 1
+    )
+    SELECT (SELECT max(load_dts) FROM src), (SELECT count(*) FROM up);
+    """, {"mart": dim.name})
+    mark, rows = cur.fetchone()
+    marks = [(GLOBAL_KEY, mark, rows)] if mark is not None else []
+    _save_marks(cur, dim.name, "load_dts", marks, time.perf_counter() - t0)
+    return rows
+
+
+def _reset_if_swapped(cur, mart: str, source: str) -> bool:
+    """
+    The marks only hold while `source` is the table they were taken on: a
+    swap load (load_vault_to_postgres.py) replaces the satellite with rows
+    that all carry a new load_dts. When the source's oid changed, empty the
+    mart and drop its marks so it is rebuilt from the new table. Marks saved
+    before the oid was tracked are adopted as they are.
+    """
+    cur.execute("SELECT to_regclass(%s)::oid::bigint;", (source,))
+    oid = cur.fetchone()[0]
+    cur.execute(f"SELECT DISTINCT source_oid FROM {MART_WATERMARK_TABLE} WHERE mart_name = %s;", (mart,))
+    swapped = any(s is not None and s != oid for s, in cur.fetchall())
+    if swapped:
+        print(f"{source} was replaced since the last refresh: rebuilding {MART_SCHEMA}.{mart}")
+        cur.execute(f"TRUNCATE {MART_SCHEMA}.{mart};")
+        cur.execute(f"DELETE FROM {MART_WATERMARK_TABLE} WHERE mart_name = %s;", (mart,))
+    return swapped
+
+
+def _track_source(cur, mart: str, source: str) -> None:
+    """
+    Stamp the mart's marks with the oid of the table they were taken on.
+    """
+    cur.execute(
+        f"UPDATE {MART_WATERMARK_TABLE} SET source_oid = to_regclass(%s)::oid::bigint WHERE mart_name = %s;",
+        (source, mart),
+    )
+
+
+def merge_facts(cur, watermark_column: str = MART_WATERMARK_COLUMN) -> int:
+    """
+    Append the satellite rows past the fact's high-water mark, in one
+    INSERT ... SELECT. With a load_dts-partitioned satellite only the
+    partitions past the mark are scanned; after a swap of the satellite the
+    fact is rebuilt. Returns the rows merged.
+    """
+    if watermark_column not in WATERMARK_COLUMNS:
+        raise ValueError(f"watermark column must be one of {WATERMARK_COLUMNS}")
+
+    t0 = time.perf_counter()
+    _reset_if_swapped(cur, FACT_TABLE, SAT_READINGS_TABLE)
+    cols = ", ".join(c for c, _, _ in FACT_COLUMNS)
+    exprs = ", ".join(e for _, _, e in FACT_COLUMNS)
+    if watermark_column == "load_dts":
+        source = f"FROM {SAT_READINGS_TABLE} s WHERE s.load_dts > {_global_mark_sql()}"
+        marks = "SELECT '', max(load_dts), count(*) FROM ins HAVING count(*) > 0"
+    else:
+        # one mark per source file; sources never seen start from the global mark
+        source = f"""FROM {SAT_READINGS_TABLE} s
+          LEFT JOIN {MART_WATERMARK_TABLE} w ON w.mart_name = %(mart)s AND w.watermark_key = s.record_source
+          WHERE s.load_dts > coalesce(w.watermark, {_global_mark_sql(per_source_fallback=False)})"""
+        marks = "SELECT record_source, max(load_dts), count(*) FROM ins GROUP BY record_source"
+
+    cur.execute(f"""
+    WITH ins AS (
+      INSERT INTO {MART_SCHEMA}.{FACT_TABLE} ({cols})
+      SELECT {exprs}
+      {source}
+      RETURNING record_source, load_dts
+    )
+    {marks};
+    """, {"mart": FACT_TABLE})
+    rows = _save_marks(cur, FACT_TABLE, watermark_column, cur.fetchall(), time.perf_counter() - t0)
+    _track_source(cur, FACT_TABLE, SAT_READINGS_TABLE)
+    return rows
+
+
+def refresh_marts() -> dict:
+    """
+    Incremental refresh of the analytics star schema; runs after the loads
+    of a DAG run (max_active_runs=1 keeps loads from committing behind a mark).
+    Each mart is merged and its watermark moved in its own transaction.
+    """
+    report = {}
+    recorder = MetricsRecorder()
+    try:
+        with recorder.stage("refresh_marts") as m, pipeline_connection() as conn:
+            ensure_mart_tables(conn)
+
+            steps = [(dim.name, dim.hub, lambda cur, dim=dim: merge_dimension(cur, dim)) for dim in DIMENSIONS]
+            steps.append((FACT_TABLE, SAT_READINGS_TABLE, merge_facts))
+
+            for mart, source, merge in steps:
+                t0 = time.perf_counter()
+                with transaction(conn):
+                    with conn.cursor() as cur:
+                        if not _exists(cur, source):
+                            print(f"{MART_SCHEMA}.{mart}: skipped ({source} does not exist)")
+                            continue
+                        rows = merge(cur)
+                seconds = time.perf_counter() - t0
+                rate = rows / seconds if seconds else 0
+                print(f"{MART_SCHEMA}.{mart}: {rows} rows merged in {seconds:.2f}s ({rate:,.0f} rows/s)")
+                report[mart] = {"rows": rows, "seconds": round(seconds, 3)}
+                m.rows_loaded += rows
+    finally:
+        recorder.flush()
+    return report
@@ -0,0 +1,197 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+from .config import METRICS_TABLE, METRICS_TEXTFILE_DIR
+from .bulk import copy_rows
+from .db import pipeline_connection, transaction, round_trips
+from .utils import utc_now_iso, run_id, unique_tmp_path
+
+METRICS_COLUMNS = [
+    "run_id", "stage", "file_name", "started_dts", "status", "seconds", "files",
+    "rows_read", "rows_rejected", "rows_loaded", "bytes_read", "db_round_trips", "rules",
+]
+
+# exported per stage (summed over the stage's records of the current run)
+PROMETHEUS_GAUGES = {
+    "seconds": "Wall time of the stage in the last run",
+    "files": "Files handled by the stage in the last run",
+    "rows_read": "Rows read by the stage in the last run",
+    "rows_rejected": "Rows rejected by the rules in the last run",
+    "rows_loaded": "Rows loaded by the stage in the last run",
+    "bytes_read": "Bytes read by the stage in the last run",
+    "db_round_trips": "Database round trips of the stage in the last run",
+}
+PROMETHEUS_FILE = "raw_vault_pipeline.prom"
+
+
+@dataclass
+class StageMetrics:
+    stage: str
+    file_name: str | None = None
+    started_dts: str = ""
+    status: str = "ok"
+    seconds: float = 0.0
+    files: int = 0
+    rows_read: int = 0
+    rows_rejected: int = 0
+    rows_loaded: int = 0
+    bytes_read: int = 0
+    db_round_trips: int = 0
+    # rule name -> {"rejected": n, "seconds": s}
+    rules: dict = field(default_factory=dict)
+
+    def add_rules(self, counts: dict[str, int], timings: dict[str, float]) -> None:
+        for rule, n in counts.items():
+            r = self.rules.setdefault(rule, {"rejected": 0, "seconds": 0.0})
+            r["rejected"] += n
+            r["seconds"] += timings.get(rule, 0.0)
+            self.rows_rejected += n
+
+
+def ensure_metrics_table(conn) -> None:
+    with transaction(conn):
+        with conn.cursor() as cur:
+            cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {METRICS_TABLE} (
+              run_id text,
+              stage text,
+              file_name text,
+              started_dts timestamptz,
+              status text,
+              seconds double precision,
+              files bigint,
+              rows_read bigint,
+              rows_rejected bigint,
+              rows_loaded bigint,
+              bytes_read bigint,
+              db_round_trips bigint,
+              rules jsonb
+            );
+            """)
+            cur.execute(f"CREATE INDEX IF NOT EXISTS pipeline_metrics_run_stage_idx ON {METRICS_TABLE} (run_id, stage);")
+
+
+class MetricsRecorder:
+    """
+    Collects StageMetrics of one task: one record per stage and one per file
+    (file_name set). flush() writes them to METRICS_TABLE and refreshes the
+    Prometheus textfile.
+    """
+
+    def __init__(self):
+        self.run_id = run_id()
+        self.records: list[StageMetrics] = []
+
+    @contextmanager
+    def stage(self, stage: str, file_name: str | None = None):
+        """
+        Time a block; the yielded StageMetrics is filled in by the caller.
+        Round trips are counted from the connection's cursors, failures
+        (including task timeouts) set status "failed".
+        """
+        m = StageMetrics(stage, file_name, utc_now_iso())
+        t0, trips0 = time.perf_counter(), round_trips()
+        try:
+            yield m
+        except BaseException:
+            m.status = "failed"
+            raise
+        finally:
+            m.seconds = time.perf_counter() - t0
+            m.db_round_trips = round_trips() - trips0
+            self.records.append(m)
+
+    def frame(self) -> pd.DataFrame:
+        rows = [
+            {**{c: getattr(m, c) for c in METRICS_COLUMNS if c not in ("run_id", "rules")},
+             "run_id": self.run_id, "rules": json.dumps(m.rules)}
+            for m in self.records
+        ]
+        return pd.DataFrame(rows, columns=METRICS_COLUMNS)
+
+    def flush(self, conn=None) -> None:
+        """
+        Persist and export the records collected so far. Metrics never fail the
+        task. Tasks call it in a `finally` without `conn`, so failed stages are
+        written too, on a connection of their own.
+        """
+        if not self.records:
+            return
+        for m in self.records:
+            if m.file_name is None:
+                print(f"metrics {m.stage}: {m.seconds:.2f}s, {m.files} files, {m.rows_read} rows read, "
+                      f"{m.rows_rejected} rejected, {m.rows_loaded} loaded, {m.bytes_read} bytes, "
+                      f"{m.db_round_trips} round trips ({m.status})")
+        try:
+            if conn is None:
+                with pipeline_connection() as own:
+                    self._write(own)
+            else:
+                self._write(conn)
+            self.records = []
+        except Exception as e:
+            print(f"metrics not written: {type(e).__name__}: {e}")
+
+    def _write(self, conn) -> None:
+        ensure_metrics_table(conn)
+        with transaction(conn):
+            with conn.cursor() as cur:
+                copy_rows(cur, METRICS_TABLE, self.frame())
+        if METRICS_TEXTFILE_DIR:
+            write_prometheus_textfile(conn, Path(METRICS_TEXTFILE_DIR), self.run_id)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_prometheus_textfile(conn, out_dir: Path, run: str) -> Path:
+    """
+    Stage totals of run `run` (every task of the DAG run, read back from
+    METRICS_TABLE) in the node_exporter textfile format, replaced atomically.
+    """
+    sums = ", ".join(f"coalesce(sum({c}), 0)" for c in PROMETHEUS_GAUGES)
+    with transaction(conn):
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT stage, {sums}, max(extract(epoch FROM started_dts)) FROM {METRICS_TABLE} "
+                f"WHERE run_id = %s AND file_name IS NULL GROUP BY stage ORDER BY stage;",
+                (run,),
+            )
+            stages = cur.fetchall()
+            cur.execute(
+                f"SELECT r.key, coalesce(sum((r.value->>'rejected')::bigint), 0) "
+                f"FROM {METRICS_TABLE} m, jsonb_each(m.rules) r "
+                f"WHERE m.run_id = %s AND m.file_name IS NOT NULL GROUP BY r.key ORDER BY r.key;",
+                (run,),
+            )
+            rules = cur.fetchall()
+
+    lines = []
+    for i, (name, help_text) in enumerate(PROMETHEUS_GAUGES.items()):
+        metric = f"raw_vault_stage_{name}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        lines += [f'{metric}{{stage="{_escape(row[0])}"}} {float(row[1 + i])}' for row in stages]
+    lines += ["# HELP raw_vault_stage_last_started_seconds Start of the stage in the last run (unix time)",
+              "# TYPE raw_vault_stage_last_started_seconds gauge"]
+    lines += [f'raw_vault_stage_last_started_seconds{{stage="{_escape(row[0])}"}} {float(row[-1] or 0)}' for row in stages]
+    lines += ["# HELP raw_vault_rule_rejected_rows Rows rejected per rule in the last run",
+              "# TYPE raw_vault_rule_rejected_rows gauge"]
+    lines += [f'raw_vault_rule_rejected_rows{{rule="{_escape(rule)}"}} {float(n)}' for rule, n in rules]
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / PROMETHEUS_FILE
+    # mapped tasks write the same file at once
+    tmp = unique_tmp_path(path)
+    try:
+        tmp.write_text("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
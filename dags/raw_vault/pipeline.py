@@ -1,133 +1,436 @@
-import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timezone
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
-from .config import PARQUET_DIRS, MANIFEST_TABLE, REJECT_TABLE
-from .utils import sha256_of_file, utc_now_iso
-from .db import get_hook, ensure_support_tables
+from .config import (
+    PARQUET_DIRS, MANIFEST_TABLE, REJECT_TABLE, REJECT_SUMMARY_TABLE, SCAN_TABLE, SCAN_RETENTION_DAYS,
+    SAT_READINGS_TABLE,
+    SCAN_COMPARE_INODE, SCAN_HASH_WORKERS, PROCESS_BATCH_SIZE, INGEST_BATCH_ROWS, REJECT_SAMPLE_LIMIT,
+    SAT_PARTITION_COLUMN,
+)
+from .utils import sha256_of_file, utc_now_iso, run_id
+from .db import pipeline_connection, transaction, ensure_support_tables, table_columns
+from .bulk import copy_rows
 from .rules import apply_all_rules
+from .rollups import RollupDelta, ensure_rollup_tables
+from .metrics import MetricsRecorder, StageMetrics
+from .schema import as_utc, ensure_satellite, ensure_partitions, ensure_indexes, relkind
 
-def scan_files() -> list[dict]:
-    out = []
+# what diff_against_manifest stores in SCAN_TABLE per file for the load tasks
+SCANNED_KEYS = ("file_path", "sha256", "file_size", "file_mtime_ns", "file_inode")
+
+def _manifest_stats(conn) -> dict[str, tuple]:
+    with transaction(conn):
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT file_path, sha256, file_size, file_mtime_ns, file_inode FROM {MANIFEST_TABLE};")
+            return {row[0]: row[1:] for row in cur.fetchall()}
+
+def _stat_unchanged(known: tuple | None, stat) -> bool:
+    if known is None:
+        return False
+    sha, size, mtime_ns, inode = known
+    if sha is None or size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+        return False
+    return not SCAN_COMPARE_INODE or inode == stat.st_ino
+
+def _scanned_sha256(fp: Path, stat, scanned: dict | None) -> str:
+    """
+    The hash the scan computed, if the file is unchanged since; a fresh one otherwise.
+    """
+    if scanned is not None:
+        known = (scanned.get("sha256"), scanned.get("file_size"), scanned.get("file_mtime_ns"), scanned.get("file_inode"))
+        if _stat_unchanged(known, stat):
+            return scanned["sha256"]
+    return sha256_of_file(fp)
+
+def _source_group(fp: Path) -> str | None:
     for group, d in PARQUET_DIRS:
-        if not d.exists():
-            continue
-        for fp in sorted(d.glob("*.parquet")):
-            stat = fp.stat()
-            out.append({
-                "file_path": str(fp),
-                "file_name": fp.name,
-                "source_group": group,
-                "sha256": sha256_of_file(fp),
-                "file_mtime": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).isoformat(),
-            })
+        if fp.parent == d:
+            return group
+    return None
+
+def describe_file(fp: Path, stat=None, sha256: str | None = None) -> dict:
+    stat = stat or fp.stat()
+    return {
+        "file_path": str(fp),
+        "file_name": fp.name,
+        "source_group": _source_group(fp),
+        "sha256": sha256,
+        "file_mtime": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).isoformat(),
+        "file_size": stat.st_size,
+        "file_mtime_ns": stat.st_mtime_ns,
+        "file_inode": stat.st_ino,
+    }
+
+def scan_files() -> list[dict]:
+    """
+    List parquet files with their sha256. Files whose size/mtime/inode match
+    the manifest keep the stored hash; only the others are hashed, in parallel.
+    First task of a run: the control tables' DDL runs here, once, not in the
+    parallel load tasks (ALTER TABLE would serialize them).
+    """
+    recorder = MetricsRecorder()
+    try:
+        with recorder.stage("scan_files") as m:
+            with pipeline_connection() as conn:
+                ensure_support_tables(conn)
+                known = _manifest_stats(conn)
+
+            out = []
+            to_hash = []
+            for _, d in PARQUET_DIRS:
+                if not d.exists():
+                    continue
+                for fp in sorted(d.glob("*.parquet")):
+                    stat = fp.stat()
+                    f = describe_file(fp, stat)
+                    prev = known.get(str(fp))
+                    if _stat_unchanged(prev, stat):
+                        f["sha256"] = prev[0]
+                    else:
+                        to_hash.append(f)
+                    out.append(f)
+
+            with ThreadPoolExecutor(max_workers=SCAN_HASH_WORKERS) as pool:
+                hashes = pool.map(lambda f: sha256_of_file(Path(f["file_path"])), to_hash)
+                for f, sha in zip(to_hash, hashes):
+                    f["sha256"] = sha
+
+            bytes_hashed = sum(f["file_size"] for f in to_hash)
+            m.files, m.bytes_read = len(out), bytes_hashed
+            print(f"scan_files: {len(out)} files, {len(out) - len(to_hash)} stat-skipped, "
+                  f"{len(to_hash)} hashed ({bytes_hashed} bytes)")
+    finally:
+        recorder.flush()
     return out
 
-def diff_against_manifest(files: list[dict]) -> dict:
-    ensure_support_tables()
-    hook = get_hook()
+def diff_against_manifest(files: list[dict], batch_size: int = PROCESS_BATCH_SIZE) -> dict:
+    """
+    {"batches": [...], "missing": [...]}: ids of the batches of files to load,
+    paths of the manifest files that are gone. The files of each batch are
+    stored in SCAN_TABLE with the stat and hash of the scan (load_batch reads
+    them back, process_and_load re-hashes only files changed since), so only
+    the ids go through XCom. Runs after scan_files.
+    """
+    recorder = MetricsRecorder()
+    try:
+        with recorder.stage("diff_against_manifest") as m, pipeline_connection() as conn:
+            with transaction(conn):
+                with conn.cursor() as cur:
+                    cur.execute(f"SELECT file_path, sha256 FROM {MANIFEST_TABLE};")
+                    existing = {row[0]: row[1] for row in cur.fetchall()}
 
-    with hook.get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(f"SELECT file_path, sha256 FROM {MANIFEST_TABLE};")
-            existing = {row[0]: row[1] for row in cur.fetchall()}
+            current_paths = set()
+            to_process = []
+            for f in files:
+                current_paths.add(f["file_path"])
+                old_sha = existing.get(f["file_path"])
+                if old_sha is None or old_sha != f["sha256"]:
+                    to_process.append({k: f[k] for k in SCANNED_KEYS})
+
+            batches = make_batches(to_process, batch_size)
+            now = utc_now_iso()
+            scan = pd.DataFrame(
+                [(run_id(), batch_id, *(f[k] for k in SCANNED_KEYS), now)
+                 for batch_id, batch in enumerate(batches) for f in batch],
+                columns=["run_id", "batch_id", *SCANNED_KEYS, "scanned_dts"],
+            )
+            with transaction(conn):
+                with conn.cursor() as cur:
+                    # a retried scan replaces the run's batches; old runs' rows are dropped
+                    cur.execute(
+                        f"DELETE FROM {SCAN_TABLE} WHERE run_id = %s OR scanned_dts < now() - make_interval(days => %s);",
+                        (run_id(), SCAN_RETENTION_DAYS),
+                    )
+                    copy_rows(cur, SCAN_TABLE, scan)
+
+            missing = [p for p in existing.keys() if p not in current_paths]
+            m.files = len(files)
+    finally:
+        recorder.flush()
+    return {"batches": list(range(len(batches))), "missing": missing}
 
-    current_paths = set()
-    to_process = []
-    for f in files:
-        current_paths.add(f["file_path"])
-        old_sha = existing.get(f["file_path"])
-        if old_sha is None or old_sha != f["sha256"]:
-            to_process.append(f)
+def make_batches(files: list, batch_size: int = PROCESS_BATCH_SIZE) -> list[list]:
+    return [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
 
-    missing = [p for p in existing.keys() if p not in current_paths]
-    return {"to_process": to_process, "missing": missing}
+def scanned_batch(batch_id: int) -> list[dict]:
+    """
+    The files of batch `batch_id` of this run, as stored by diff_against_manifest.
+    """
+    with pipeline_connection() as conn, transaction(conn):
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT {', '.join(SCANNED_KEYS)} FROM {SCAN_TABLE} "
+                f"WHERE run_id = %s AND batch_id = %s ORDER BY file_path;",
+                (run_id(), batch_id),
+            )
+            return [dict(zip(SCANNED_KEYS, row)) for row in cur.fetchall()]
+
+def load_batch(batch_id: int) -> dict:
+    """
+    process_and_load for one batch id of diff_against_manifest.
+    """
+    return process_and_load(scanned_batch(batch_id))
 
 def mark_missing(missing_paths: list[str]) -> None:
     if not missing_paths:
         return
-    hook = get_hook()
     now = utc_now_iso()
 
-    with hook.get_conn() as conn:
-        with conn.cursor() as cur:
-            for p in missing_paths:
-                cur.execute(
-                    f"UPDATE {MANIFEST_TABLE} SET status='missing', last_seen_dts=%s WHERE file_path=%s;",
-                    (now, p),
-                )
-        conn.commit()
-
-def _insert_rejects(rejected_rows: list[dict]) -> None:
-    if not rejected_rows:
-        return
-    hook = get_hook()
-    with hook.get_conn() as conn:
-        with conn.cursor() as cur:
-            for r in rejected_rows:
-                cur.execute(
-                    f"INSERT INTO {REJECT_TABLE} (rejected_dts, rule_name, reason, record_source, payload) "
-                    f"VALUES (%s,%s,%s,%s,%s::jsonb);",
-                    (r["rejected_dts"], r["rule_name"], r["reason"], r["record_source"], json.dumps(r["payload"])),
-                )
-        conn.commit()
-
-def _upsert_manifest(f: dict) -> None:
-    hook = get_hook()
-    now = utc_now_iso()
-    with hook.get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(f"""
-            INSERT INTO {MANIFEST_TABLE} (file_path, file_name, source_group, sha256, file_mtime, last_seen_dts, status)
-            VALUES (%s,%s,%s,%s,%s,%s,'active')
-            ON CONFLICT (file_path) DO UPDATE SET
-              sha256 = EXCLUDED.sha256,
-              file_mtime = EXCLUDED.file_mtime,
-              last_seen_dts = EXCLUDED.last_seen_dts,
-              status = 'active';
-            """, (f["file_path"], f["file_name"], f["source_group"], f["sha256"], f["file_mtime"], now))
-        conn.commit()
-
-def process_and_load(to_process: list[dict]) -> None:
-    if not to_process:
-        return
+    recorder = MetricsRecorder()
+    try:
+        with recorder.stage("mark_missing") as m, pipeline_connection() as conn, transaction(conn):
+            with conn.cursor() as cur:
+                for p in missing_paths:
+                    cur.execute(
+                        f"UPDATE {MANIFEST_TABLE} SET status='missing', last_seen_dts=%s WHERE file_path=%s;",
+                        (now, p),
+                    )
+            m.files = len(missing_paths)
+    finally:
+        recorder.flush()
 
-    ensure_support_tables()
-    hook = get_hook()
+def _insert_rejects(cur, rejected: pd.DataFrame) -> None:
+    copy_rows(cur, REJECT_TABLE, rejected)
 
-    target_table = "raw_vault.sat_link_sensor_well_readings"
+def _insert_reject_summary(cur, counts: dict[str, int], sampled: dict[str, int], record_source: str) -> None:
+    summary = [
+        (utc_now_iso(), rule, record_source, n, sampled.get(rule, 0))
+        for rule, n in counts.items() if n
+    ]
+    if summary:
+        cur.executemany(
+            f"INSERT INTO {REJECT_SUMMARY_TABLE} (rejected_dts, rule_name, record_source, rejected_count, sampled_count) "
+            f"VALUES (%s,%s,%s,%s,%s);",
+            summary,
+        )
 
-    for f in to_process:
-        fp = Path(f["file_path"])
-        record_source = f["file_name"]
+def _upsert_manifest(cur, f: dict) -> None:
+    now = utc_now_iso()
+    cur.execute(f"""
+    INSERT INTO {MANIFEST_TABLE} (file_path, file_name, source_group, sha256, file_mtime, last_seen_dts, status,
+                                  file_size, file_mtime_ns, file_inode)
+    VALUES (%s,%s,%s,%s,%s,%s,'active',%s,%s,%s)
+    ON CONFLICT (file_path) DO UPDATE SET
+      sha256 = EXCLUDED.sha256,
+      file_mtime = EXCLUDED.file_mtime,
+      last_seen_dts = EXCLUDED.last_seen_dts,
+      status = 'active',
+      file_size = EXCLUDED.file_size,
+      file_mtime_ns = EXCLUDED.file_mtime_ns,
+      file_inode = EXCLUDED.file_inode,
+      last_error = NULL;
+    """, (f["file_path"], f["file_name"], f["source_group"], f["sha256"], f["file_mtime"], now,
+          f.get("file_size"), f.get("file_mtime_ns"), f.get("file_inode")))
 
-        df = pd.read_parquet(fp)
+def _mark_failed(cur, f: dict, error: str) -> None:
+    """
+    Record a failed load. sha256 is left untouched so the next scan picks the file up again.
+    """
+    cur.execute(f"""
+    INSERT INTO {MANIFEST_TABLE} (file_path, file_name, source_group, last_seen_dts, status, last_error)
+    VALUES (%s,%s,%s,%s,'failed',%s)
+    ON CONFLICT (file_path) DO UPDATE SET
+      last_seen_dts = EXCLUDED.last_seen_dts,
+      status = 'failed',
+      last_error = EXCLUDED.last_error;
+    """, (f["file_path"], f["file_name"], f["source_group"], utc_now_iso(), error))
 
-        valid_df, rejected = apply_all_rules(df, record_source)
-        _insert_rejects(rejected)
+def _already_loaded(cur, f: dict) -> bool:
+    cur.execute(f"SELECT sha256, status FROM {MANIFEST_TABLE} WHERE file_path=%s;", (f["file_path"],))
+    row = cur.fetchone()
+    return row is not None and row[0] == f["sha256"] and row[1] == "active"
 
-        if valid_df.empty:
-            _upsert_manifest(f)
+def _column_range(fp: Path, column: str) -> tuple | None:
+    """
+    (min, max) of a parquet column from the row group statistics, reading the
+    column only when statistics are missing. None if the column is absent or all null.
+    """
+    pf = pq.ParquetFile(fp)
+    if column not in pf.schema_arrow.names:
+        return None
+    idx = pf.schema_arrow.names.index(column)
+    lows, highs = [], []
+    for i in range(pf.metadata.num_row_groups):
+        rg = pf.metadata.row_group(i)
+        if rg.num_rows == 0:
             continue
-        if "load_dts" not in valid_df.columns:
-            valid_df["load_dts"] = utc_now_iso()
-        if "record_source" not in valid_df.columns:
-            valid_df["record_source"] = record_source
+        stats = rg.column(idx).statistics
+        if stats is None or not stats.has_min_max:
+            mm = pc.min_max(pf.read(columns=[column]).column(column)).as_py()
+            return None if mm["min"] is None else (mm["min"], mm["max"])
+        lows.append(stats.min)
+        highs.append(stats.max)
+    return (min(lows), max(highs)) if lows else None
 
-        cols = list(valid_df.columns)
-        col_sql = ", ".join([f'"{c}"' for c in cols])
-        placeholders = ", ".join(["%s"] * len(cols))
+def _partition_range(fp: Path, load_dts: str) -> tuple | None:
+    """
+    (low, high) of the partition column over the rows of `fp`. A load_dts
+    column written by the vault builders is kept by _load_file, so its values
+    decide the partitions; the run's load_dts only when the file has none.
+    """
+    if SAT_PARTITION_COLUMN != "load_dts":
+        return _column_range(fp, SAT_PARTITION_COLUMN)
+    schema = pq.read_schema(fp)
+    if "load_dts" not in schema.names:
+        return load_dts, load_dts
+    if pa.types.is_timestamp(schema.field("load_dts").type):
+        return _column_range(fp, "load_dts")
+    # ISO strings, one per build run: compared as instants, not as text (offsets may differ)
+    values = pc.unique(pq.read_table(fp, columns=["load_dts"]).column("load_dts")).to_pylist()
+    instants = [as_utc(v) for v in values if v is not None]
+    return (min(instants), max(instants)) if instants else None
 
-        with hook.get_conn() as conn:
-            with conn.cursor() as cur:
-                for row in valid_df.itertuples(index=False, name=None):
-                    cur.execute(
-                        f'INSERT INTO {target_table} ({col_sql}) VALUES ({placeholders});',
-                        row
-                    )
-            conn.commit()
+def _load_file(conn, f: dict, target_columns: list[str], load_dts: str, metrics: StageMetrics) -> None:
+    """
+    Stream one parquet file into the satellite: record batches of INGEST_BATCH_ROWS
+    rows are validated and COPYed before the next one is read, so memory is
+    bounded by the batch size. Only the satellite's columns are read.
+    The loaded rows are also rolled up and merged into the rollup tables.
+    Row counts and per-rule rejects are added to `metrics`.
+    """
+    fp = Path(f["file_path"])
+    record_source = f["file_name"]
+
+    pf = pq.ParquetFile(fp)
+    columns = [c for c in pf.schema_arrow.names if not target_columns or c in target_columns]
+
+    reject_counts: dict[str, int] = {}
+    rule_seconds: dict[str, float] = {}
+    sampled: dict[str, int] = {}
+    rollup = RollupDelta()
+
+    with conn.cursor() as cur:
+        for batch in pf.iter_batches(batch_size=INGEST_BATCH_ROWS, columns=columns):
+            result = apply_all_rules(batch, record_source, conn)
+            metrics.rows_read += batch.num_rows
+            valid, rejected = result.valid, result.rejected
 
-        _upsert_manifest(f)
+            # REJECT_SAMPLE_LIMIT applies per rule over the whole file, not per batch
+            for rule, n in result.counts.items():
+                reject_counts[rule] = reject_counts.get(rule, 0) + n
+                rule_seconds[rule] = rule_seconds.get(rule, 0.0) + result.timings[rule]
+            if not rejected.empty:
+                budget = rejected["rule_name"].map(lambda r: REJECT_SAMPLE_LIMIT - sampled.get(r, 0))
+                rejected = rejected[rejected.groupby("rule_name").cumcount() < budget]
+                for rule, n in rejected["rule_name"].value_counts().items():
+                    sampled[rule] = sampled.get(rule, 0) + int(n)
+                _insert_rejects(cur, rejected)
 
+            if valid.num_rows:
+                if "load_dts" not in valid.column_names:
+                    valid = valid.append_column("load_dts", pa.array([load_dts] * valid.num_rows, pa.string()))
+                if "record_source" not in valid.column_names:
+                    valid = valid.append_column("record_source", pa.array([record_source] * valid.num_rows, pa.string()))
+                copy_rows(cur, SAT_READINGS_TABLE, valid)
+                rollup.add(valid)
+                metrics.rows_loaded += valid.num_rows
+
+        print(f"{record_source}: rules " + ", ".join(
+            f"{rule}={reject_counts[rule]} rejected ({rule_seconds[rule]:.3f}s)" for rule in reject_counts
+        ))
+        metrics.add_rules(reject_counts, rule_seconds)
+        _insert_reject_summary(cur, reject_counts, sampled, record_source)
+        touched = rollup.apply(cur)
+        if touched:
+            print(f"{record_source}: rollups " + ", ".join(f"{name}={n} rows" for name, n in touched.items()))
+        _upsert_manifest(cur, f)
+
+def process_and_load(file_paths: list[dict | str]) -> dict:
+    """
+    Load a batch of files (diff_against_manifest entries, or plain paths).
+    Each file is its own transaction and its outcome is written to the
+    manifest ('active' or 'failed' + last_error); one bad file does not stop
+    the others, but the task fails at the end so Airflow retries. A retry
+    skips files already loaded with the same sha256. The control tables must
+    exist (scan_files creates them).
+    """
+    if not file_paths:
+        return {"loaded": 0, "skipped": 0, "failed": []}
+
+    loaded, skipped, failed = 0, 0, []
+    recorder = MetricsRecorder()
+
+    try:
+        with recorder.stage("process_and_load") as total, pipeline_connection() as conn:
+            with transaction(conn):
+                with conn.cursor() as cur:
+                    ensure_satellite(cur)
+            ensure_rollup_tables(conn)
+            target_columns = table_columns(conn, SAT_READINGS_TABLE)
+
+            for item in file_paths:
+                scanned = item if isinstance(item, dict) else None
+                path = scanned["file_path"] if scanned else item
+                fp = Path(path)
+                f = {"file_path": path, "file_name": fp.name, "source_group": _source_group(fp)}
+                try:
+                    with recorder.stage("load_file", fp.name) as m:
+                        stat = fp.stat()
+                        f = describe_file(fp, stat, _scanned_sha256(fp, stat, scanned))
+                        m.files, m.bytes_read = 1, f["file_size"]
+
+                        with transaction(conn):
+                            with conn.cursor() as cur:
+                                done = _already_loaded(cur, f)
+                        if done:
+                            m.status = "skipped"
+                            skipped += 1
+                            continue
+
+                        # partitions are committed on their own so the load does not hold the parent's lock
+                        load_dts = utc_now_iso()
+                        bounds = _partition_range(fp, load_dts)
+                        if bounds is not None:
+                            with transaction(conn):
+                                with conn.cursor() as cur:
+                                    ensure_partitions(cur, SAT_READINGS_TABLE, *bounds)
+
+                        # satellite rows, rejects and manifest entry commit (or roll back) together
+                        with transaction(conn):
+                            _load_file(conn, f, target_columns, load_dts, m)
+                        loaded += 1
+                except Exception as e:
+                    failed.append(path)
+                    with transaction(conn):
+                        with conn.cursor() as cur:
+                            _mark_failed(cur, f, f"{type(e).__name__}: {e}")
+
+            for m in recorder.records:
+                total.files += m.files
+                total.rows_read += m.rows_read
+                total.rows_loaded += m.rows_loaded
+                total.bytes_read += m.bytes_read
+                total.add_rules({r: v["rejected"] for r, v in m.rules.items()},
+                                {r: v["seconds"] for r, v in m.rules.items()})
+            if failed:
+                total.status = "failed"
+    finally:
+        # on its own connection: after a failure this one may be unusable
+        recorder.flush()
+
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(file_paths)} files failed to load: {failed}")
+    return {"loaded": loaded, "skipped": skipped, "failed": failed}
+
+def build_satellite_indexes() -> None:
+    """
+    Runs after the load tasks, whether they succeeded or not: the first time it
+    builds the indexes over the bulk-loaded data, afterwards it is a no-op (new
+    partitions inherit them). Nothing to do until a load created the satellite.
+    """
+    recorder = MetricsRecorder()
+    try:
+        with recorder.stage("build_satellite_indexes"), pipeline_connection() as conn, transaction(conn):
+            with conn.cursor() as cur:
+                if relkind(cur, SAT_READINGS_TABLE) is None:
+                    print(f"{SAT_READINGS_TABLE} does not exist yet; no indexes to build")
+                else:
+                    ensure_indexes(cur, SAT_READINGS_TABLE)
+    finally:
+        recorder.flush()
@@ -0,0 +1,112 @@
+import cProfile
+import json
+import os
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+import pyarrow as pa
+
+from .config import PROFILE_ENABLED, PROFILE_DIR, PROFILE_TOP_ALLOCATIONS
+from .utils import utc_now_iso, run_id
+
+# the scripts have their own copy (scripts/vault_profile.py, which also profiles worker processes)
+
+# pid of the profiled() block running, if any
+_active_pid: int | None = None
+
+
+def profile_stem(name: str) -> str:
+    """
+    <name>__<run>__<pid>: the run id made file-safe, the pid keeps the mapped
+    instances of a task apart.
+    """
+    run = re.sub(r"[^A-Za-z0-9._-]+", "_", run_id())
+    return f"{name}__{run}__{os.getpid()}"
+
+
+def _allocation_sites(snapshot: tracemalloc.Snapshot, top: int) -> list[dict]:
+    # module code objects loaded by imports would otherwise top the list
+    # (dropped after grouping: filter_traces() is slow on large snapshots)
+    skip = {tracemalloc.__file__, cProfile.__file__,
+            "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>"}
+    stats = [s for s in snapshot.statistics("lineno") if s.traceback[0].filename not in skip]
+    return [
+        {"site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}", "bytes": s.size, "blocks": s.count}
+        for s in stats[:top]
+    ]
+
+
+@contextmanager
+def profiled(name: str, enabled: bool | None = None, out_dir: Path | None = None):
+    """
+    Profile the block with cProfile and tracemalloc when `enabled` (default:
+    RAW_VAULT_PROFILE). Writes <stem>.prof (pstats) and <stem>.json (wall
+    time, peak traced memory, Arrow memory pool peak, and the sites holding
+    the most memory at the end of the block). A block nested in another one
+    of the same process is covered by the outer profile.
+    """
+    global _active_pid
+    if not (PROFILE_ENABLED if enabled is None else enabled) or _active_pid == os.getpid():
+        yield
+        return
+
+    out_dir = Path(out_dir or PROFILE_DIR)
+    stem = profile_stem(name)
+    started = utc_now_iso()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    t0 = time.perf_counter()
+    _active_pid = os.getpid()
+    profiler.enable()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "failed"
+        raise
+    finally:
+        profiler.disable()
+        _active_pid = None
+        seconds = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        sites = _allocation_sites(tracemalloc.take_snapshot(), PROFILE_TOP_ALLOCATIONS)
+        if not tracing:
+            tracemalloc.stop()
+        arrow_peak = pa.default_memory_pool().max_memory()
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(out_dir / f"{stem}.prof")
+        (out_dir / f"{stem}.json").write_text(json.dumps({
+            "name": name,
+            "run_id": run_id(),
+            "pid": os.getpid(),
+            "started_dts": started,
+            "status": status,
+            "seconds": round(seconds, 3),
+            "peak_bytes": peak,
+            # the pool's high-water mark over the life of the process
+            "arrow_peak_bytes": arrow_peak,
+            "top_allocations": sites,
+        }, indent=2))
+        print(f"profile {name}: {seconds:.2f}s, peak {peak / 1e6:.1f} MB traced, "
+              f"{arrow_peak / 1e6:.1f} MB arrow -> {out_dir / stem}.prof")
+
+
+def profile_task(name: str):
+    """
+    Decorator form of profiled() for DAG task callables.
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with profiled(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
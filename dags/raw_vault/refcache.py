@@ -0,0 +1,137 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+from .config import REFCACHE_DIR
+from .utils import run_id, unique_tmp_path
+
+
+def normalize_keys(values) -> pa.Array:
+    """
+    Business keys as stripped strings (same normalization the rules apply to data).
+    """
+    arr = pa.array(values) if not isinstance(values, (pa.Array, pa.ChunkedArray)) else values
+    return pc.utf8_trim_whitespace(pc.cast(arr, pa.string()))
+
+
+def _sorted_unique(keys: pa.Array) -> pa.Array:
+    keys = pc.drop_null(keys)
+    keys = keys.filter(pc.not_equal(keys, ""))
+    return pa.array(np.unique(keys.to_numpy(zero_copy_only=False).astype(str)), type=pa.string())
+
+
+def _fetch_keys(cur) -> pa.Array:
+    return normalize_keys(pa.array([None if r[0] is None else str(r[0]) for r in cur.fetchall()], type=pa.string()))
+
+
+@dataclass
+class HubKeys:
+    keys: pa.Array
+    max_load_dts: str | None
+    row_count: int
+    run_id: str | None
+
+
+class ReferenceKeyCache:
+    """
+    Hub business keys for the rule engine, loaded once per DAG run.
+
+    Keys are held as a sorted, unique Arrow string array so membership tests
+    are vectorized. A refresh compares count(*) / max(load_dts) with the cached
+    version and only fetches rows at or after the cached max(load_dts).
+    An Arrow IPC copy under REFCACHE_DIR lets the other task processes of the
+    same run skip the database entirely.
+    """
+
+    def __init__(self, cache_dir: Path = REFCACHE_DIR):
+        self.cache_dir = cache_dir
+        self._hubs: dict[tuple[str, str], HubKeys] = {}
+
+    def _cache_file(self, table: str, key_col: str) -> Path:
+        return self.cache_dir / f"{table}.{key_col}.arrow"
+
+    def _load_file(self, table: str, key_col: str) -> HubKeys | None:
+        path = self._cache_file(table, key_col)
+        try:
+            with pa.memory_map(str(path)) as source:
+                t = ipc.open_file(source).read_all()
+        except (OSError, pa.ArrowInvalid):
+            return None
+        meta = t.schema.metadata or {}
+        max_dts = meta.get(b"max_load_dts", b"").decode() or None
+        run_id = meta.get(b"run_id", b"").decode() or None
+        return HubKeys(t.column(0).combine_chunks(), max_dts, int(meta.get(b"row_count", b"0")), run_id)
+
+    def _save_file(self, table: str, key_col: str, hub: HubKeys) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "max_load_dts": hub.max_load_dts or "",
+            "row_count": str(hub.row_count),
+            "run_id": hub.run_id or "",
+        }
+        t = pa.table({key_col: hub.keys}).replace_schema_metadata(meta)
+        path = self._cache_file(table, key_col)
+        # mapped tasks sharing the cache dir may save the same hub at once
+        tmp = unique_tmp_path(path)
+        try:
+            with ipc.new_file(str(tmp), t.schema) as writer:
+                writer.write_table(t)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def keys(self, conn, table: str, key_col: str) -> pa.Array:
+        """
+        Sorted unique keys of `table.key_col`, refreshed at most once per DAG run.
+        """
+        current_run = run_id()
+        ident = (table, key_col)
+
+        hub = self._hubs.get(ident) or self._load_file(table, key_col)
+        if hub is not None and hub.run_id == current_run:
+            self._hubs[ident] = hub
+            return hub.keys
+
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT count(*), max(load_dts)::text FROM {table};")
+            row_count, max_dts = cur.fetchone()
+
+            if hub is not None and (hub.row_count, hub.max_load_dts) == (row_count, max_dts):
+                keys = hub.keys
+            elif hub is not None and hub.max_load_dts is not None and row_count > hub.row_count:
+                # hubs are insert-only: fetch the newest rows and merge
+                cur.execute(f"SELECT {key_col} FROM {table} WHERE load_dts >= %s;", (hub.max_load_dts,))
+                keys = _sorted_unique(pa.concat_arrays([hub.keys, _fetch_keys(cur)]))
+                if len(keys) != row_count:
+                    keys = None
+            else:
+                keys = None
+
+            if keys is None:
+                cur.execute(f"SELECT {key_col} FROM {table};")
+                keys = _sorted_unique(_fetch_keys(cur))
+
+        hub = HubKeys(keys, max_dts, row_count, current_run)
+        self._hubs[ident] = hub
+        try:
+            self._save_file(table, key_col, hub)
+        except OSError:
+            pass  # on-disk sharing is an optimization only
+        return keys
+
+    def contains(self, conn, table: str, key_col: str, values) -> pa.Array:
+        """
+        Vectorized membership of `values` (normalized) in the hub's keys, as an
+        Arrow boolean array. Nulls map to False.
+        """
+        keys = self.keys(conn, table, key_col)
+        return pc.is_in(normalize_keys(values), value_set=keys)
+
+
+# shared by every rule in the process
+reference_keys = ReferenceKeyCache()
@@ -0,0 +1,224 @@
+from dataclasses import dataclass
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .config import MART_SCHEMA, SAT_READINGS_TABLE, DEPTH_BIN_FT
+from .bulk import copy_rows
+from .db import transaction
+from .refcache import normalize_keys
+
+# quality_flag bucket for rows without a flag
+NO_QUALITY_FLAG = -1
+
+
+@dataclass(frozen=True)
+class Rollup:
+    name: str
+    keys: tuple[str, ...]
+
+
+# every rollup is also broken down by quality_flag (the distribution)
+ROLLUPS = [
+    Rollup("rollup_well_year", ("well_id", "year")),
+    Rollup("rollup_well_depth", ("well_id", "depth_bin_ft")),
+    Rollup("rollup_survey_type_year", ("survey_type_id", "year")),
+]
+
+KEY_TYPES = {
+    "well_id": "text",
+    "survey_type_id": "text",
+    "year": "integer",
+    "depth_bin_ft": "double precision",
+    "quality_flag": "integer",
+}
+
+# measure -> (type, arrow aggregation of a batch, arrow / SQL merge of two partials)
+MEASURES = {
+    "readings": ("bigint", "count_all", "sum"),
+    "amplitude_count": ("bigint", "count", "sum"),
+    "amplitude_sum": ("double precision", "sum", "sum"),
+    "amplitude_min": ("double precision", "min", "min"),
+    "amplitude_max": ("double precision", "max", "max"),
+    "depth_ft_count": ("bigint", "count", "sum"),
+    "depth_ft_sum": ("double precision", "sum", "sum"),
+    "depth_ft_min": ("double precision", "min", "min"),
+    "depth_ft_max": ("double precision", "max", "max"),
+}
+
+_SQL_MERGE = {"sum": "r.{c} + EXCLUDED.{c}", "min": "LEAST(r.{c}, EXCLUDED.{c})", "max": "GREATEST(r.{c}, EXCLUDED.{c})"}
+
+
+def _grain(rollup: Rollup) -> list[str]:
+    return list(rollup.keys) + ["quality_flag"]
+
+
+def ensure_rollup_tables(conn) -> None:
+    with transaction(conn):
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {MART_SCHEMA};")
+            for rollup in ROLLUPS:
+                grain = _grain(rollup)
+                cols = [f"{k} {KEY_TYPES[k]} NOT NULL" for k in grain]
+                cols += [f"{m} {t} NOT NULL DEFAULT 0" if agg.startswith("count") or agg == "sum" else f"{m} {t}"
+                         for m, (t, agg, _) in MEASURES.items()]
+                body = ",\n                  ".join(cols + ["updated_dts timestamptz", f"PRIMARY KEY ({', '.join(grain)})"])
+                cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {MART_SCHEMA}.{rollup.name} (
+                  {body}
+                );
+                """)
+
+
+def _column(table: pa.Table, name: str, type_: pa.DataType) -> pa.Array:
+    if name not in table.column_names:
+        return pa.nulls(table.num_rows, type_)
+    return table.column(name)
+
+
+def rollup_inputs(batch) -> pa.Table:
+    """
+    Rollup keys and measures of satellite rows: business keys normalized like
+    the rules do (blank = null), year of `timestamp`, depth bin of DEPTH_BIN_FT feet.
+    """
+    t = pa.Table.from_batches([batch]) if isinstance(batch, pa.RecordBatch) else batch
+
+    def key(name):
+        k = normalize_keys(_column(t, name, pa.string()))
+        return pc.if_else(pc.equal(k, ""), pa.scalar(None, pa.string()), k)
+
+    ts = _column(t, "timestamp", pa.timestamp("us"))
+    if not pa.types.is_timestamp(ts.type):
+        ts = pc.cast(ts, pa.timestamp("us"))
+    depth = pc.cast(_column(t, "depth_ft", pa.float64()), pa.float64())
+    flag = _column(t, "quality_flag", pa.int32())
+    flag = pc.cast(flag, pa.int32(), safe=pa.types.is_integer(flag.type))
+
+    return pa.table({
+        "well_id": key("well_id"),
+        "survey_type_id": key("survey_type_id"),
+        "year": pc.cast(pc.year(ts), pa.int32()),
+        "depth_bin_ft": pc.multiply(pc.floor(pc.divide(depth, float(DEPTH_BIN_FT))), float(DEPTH_BIN_FT)),
+        "quality_flag": pc.fill_null(flag, NO_QUALITY_FLAG),
+        "amplitude": pc.cast(_column(t, "amplitude", pa.float64()), pa.float64()),
+        "depth_ft": depth,
+    })
+
+
+def _aggregate(rollup: Rollup, inputs: pa.Table) -> pa.Table:
+    grain = _grain(rollup)
+    mask = None
+    for k in rollup.keys:
+        valid = pc.is_valid(inputs.column(k))
+        mask = valid if mask is None else pc.and_(mask, valid)
+    t = inputs.filter(mask)
+    aggs = [([], "count_all") if agg == "count_all" else (m.rsplit("_", 1)[0], agg) for m, (_, agg, _) in MEASURES.items()]
+    out = t.group_by(grain).aggregate(aggs)
+    # aggregate() names outputs <column>_<agg> ("count_all" for the row count)
+    out = out.rename_columns([("readings" if c == "count_all" else c) for c in out.column_names])
+    return out.select(grain + list(MEASURES))
+
+
+def _combine(rollup: Rollup, parts: list[pa.Table]) -> pa.Table:
+    grain = _grain(rollup)
+    t = pa.concat_tables(parts)
+    out = t.group_by(grain).aggregate([(m, merge) for m, (_, _, merge) in MEASURES.items()])
+    out = out.rename_columns([c.rsplit("_", 1)[0] if c not in grain else c for c in out.column_names])
+    out = out.select(grain + list(MEASURES))
+    # sums / counts of all-null groups are 0, not NULL
+    for i, (m, (_, agg, _)) in enumerate(MEASURES.items()):
+        if agg.startswith("count") or agg == "sum":
+            j = len(grain) + i
+            out = out.set_column(j, m, pc.fill_null(out.column(j), 0))
+    return out
+
+
+class RollupDelta:
+    """
+    Rollup rows of the batches of one file, merged into the rollup tables in
+    the file's load transaction (so they commit or roll back with its rows).
+    """
+
+    def __init__(self):
+        self._parts: dict[str, list[pa.Table]] = {r.name: [] for r in ROLLUPS}
+
+    def add(self, batch) -> None:
+        if not batch.num_rows:
+            return
+        inputs = rollup_inputs(batch)
+        for rollup in ROLLUPS:
+            self._parts[rollup.name].append(_aggregate(rollup, inputs))
+
+    def apply(self, cur) -> dict[str, int]:
+        """
+        Upsert into every rollup table; returns the rollup rows touched per table.
+        """
+        touched = {}
+        for rollup in ROLLUPS:
+            parts = [p for p in self._parts[rollup.name] if p.num_rows]
+            if not parts:
+                continue
+            delta = _combine(rollup, parts)
+            touched[rollup.name] = _upsert(cur, rollup, delta)
+        return touched
+
+
+def _upsert(cur, rollup: Rollup, delta: pa.Table) -> int:
+    # rows are merged in key order so concurrent loads lock them in the same order
+    grain = _grain(rollup)
+    staging = f"{rollup.name}_delta"
+    cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {MART_SCHEMA}.{rollup.name}) ON COMMIT DROP;")
+    cur.execute(f"TRUNCATE {staging};")
+    copy_rows(cur, staging, delta)
+
+    cols = ", ".join(grain + list(MEASURES))
+    merges = ",\n      ".join(f"{m} = " + _SQL_MERGE[merge].format(c=m) for m, (_, _, merge) in MEASURES.items())
+    cur.execute(f"""
+    INSERT INTO {MART_SCHEMA}.{rollup.name} AS r ({cols}, updated_dts)
+    SELECT {cols}, now() FROM {staging}
+    ORDER BY {', '.join(grain)}
+    ON CONFLICT ({', '.join(grain)}) DO UPDATE SET
+      {merges},
+      updated_dts = EXCLUDED.updated_dts;
+    """)
+    return delta.num_rows
+
+
+def rebuild_rollups(conn) -> None:
+    """
+    Recompute every rollup from the whole satellite (initial backfill, or after
+    DEPTH_BIN_FT changes). Regular loads update the rollups incrementally.
+    """
+    keys = {
+        "well_id": "nullif(btrim(s.well_id::text), '')",
+        "survey_type_id": "nullif(btrim(s.survey_type_id::text), '')",
+        "year": 'extract(year FROM s."timestamp")::int',
+        "depth_bin_ft": f"floor(s.depth_ft / {float(DEPTH_BIN_FT)}) * {float(DEPTH_BIN_FT)}",
+        "quality_flag": f"coalesce(s.quality_flag::int, {NO_QUALITY_FLAG})",
+    }
+    measures = {
+        "readings": "count(*)",
+        "amplitude_count": "count(s.amplitude)",
+        "amplitude_sum": "coalesce(sum(s.amplitude), 0)",
+        "amplitude_min": "min(s.amplitude)",
+        "amplitude_max": "max(s.amplitude)",
+        "depth_ft_count": "count(s.depth_ft)",
+        "depth_ft_sum": "coalesce(sum(s.depth_ft), 0)",
+        "depth_ft_min": "min(s.depth_ft)",
+        "depth_ft_max": "max(s.depth_ft)",
+    }
+    ensure_rollup_tables(conn)
+    with transaction(conn):
+        with conn.cursor() as cur:
+            for rollup in ROLLUPS:
+                grain = _grain(rollup)
+                select = ", ".join([keys[k] for k in grain] + [measures[m] for m in MEASURES])
+                not_null = " AND ".join(f"{keys[k]} IS NOT NULL" for k in rollup.keys)
+                cur.execute(f"TRUNCATE {MART_SCHEMA}.{rollup.name};")
+                cur.execute(f"""
+                INSERT INTO {MART_SCHEMA}.{rollup.name} ({', '.join(grain + list(MEASURES))}, updated_dts)
+                SELECT {select}, now()
+                FROM {SAT_READINGS_TABLE} s
+                WHERE {not_null}
+                GROUP BY {', '.join(str(i + 1) for i in range(len(grain)))};
+                """)
@@ -1,49 +1,113 @@
-import json
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
 import pandas as pd
-from typing import Tuple, List, Dict
+import pyarrow as pa
+import pyarrow.compute as pc
 
-from .db import get_hook
+from .config import HUB_WELL_TABLE, REJECT_SAMPLE_LIMIT
+from .refcache import normalize_keys, reference_keys
 from .utils import utc_now_iso
 
-def rule_well_must_exist(df: pd.DataFrame, record_source: str) -> Tuple[pd.DataFrame, List[Dict]]:
+REJECT_COLUMNS = ["rejected_dts", "rule_name", "reason", "record_source", "payload"]
+
+
+@dataclass(frozen=True)
+class Rule:
     """
-    Reject rows whose well_id does not exist in raw_vault.hub_well.
-    Returns: (valid_df, rejected_rows_as_dicts)
+    A validation rule. `check(table, conn)` returns a boolean mask over the rows
+    (True = reject), or None when the rule does not apply to this table.
     """
-    if "well_id" not in df.columns:
-        return df, []
+    name: str
+    reason: str
+    check: Callable[[pa.Table, object], Optional[pa.Array]]
 
-    hook = get_hook()
-    ref = pd.read_sql("SELECT well_id FROM raw_vault.hub_well;", hook.get_conn())
-    valid_wells = set(ref["well_id"].astype("string").str.strip().dropna())
 
-    well_series = df["well_id"].astype("string").str.strip()
-    bad_mask = (~well_series.isin(valid_wells)) & (~well_series.isna()) & (well_series != "")
+@dataclass
+class RuleResult:
+    valid: pa.Table
+    rejected: pd.DataFrame
+    counts: Dict[str, int] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
 
-    bad = df[bad_mask]
-    good = df[~bad_mask]
 
-    rejected = []
-    for _, row in bad.iterrows():
-        rejected.append({
-            "rejected_dts": utc_now_iso(),
-            "rule_name": "well_must_exist",
-            "reason": "well_id not found in raw_vault.hub_well",
-            "record_source": record_source,
-            "payload": row.to_dict(),
-        })
+def build_rejects(bad: pa.Table, rule_name: str, reason: str, record_source: str,
+                  limit: int = REJECT_SAMPLE_LIMIT) -> pd.DataFrame:
+    """
+    Reject records for (at most `limit` of) the rows in `bad`, payloads serialized as JSON in one pass.
+    """
+    sample = bad.slice(0, limit).to_pandas()
+    payload = []
+    if len(sample):
+        payload = sample.to_json(orient="records", lines=True, date_format="iso", double_precision=15).splitlines()
+    return pd.DataFrame({
+        "rejected_dts": utc_now_iso(),
+        "rule_name": rule_name,
+        "reason": reason,
+        "record_source": record_source,
+        "payload": payload,
+    }, columns=REJECT_COLUMNS)
 
-    return good, rejected
 
+def check_well_must_exist(table: pa.Table, conn) -> Optional[pa.Array]:
+    """
+    Reject rows whose well_id does not exist in raw_vault.hub_well (null / blank ids pass).
+    """
+    if "well_id" not in table.column_names:
+        return None
+    wells = normalize_keys(table.column("well_id"))
+    known = reference_keys.contains(conn, HUB_WELL_TABLE, "well_id", wells)
+    present = pc.fill_null(pc.not_equal(wells, ""), False)
+    return pc.and_(pc.invert(known), present)
 
-def apply_all_rules(df: pd.DataFrame, record_source: str) -> Tuple[pd.DataFrame, List[Dict]]:
+
+# Declared rules, evaluated in order; a row is attributed to the first rule that rejects it.
+RULES: List[Rule] = [
+    Rule("well_must_exist", "well_id not found in raw_vault.hub_well", check_well_must_exist),
+]
+
+
+def evaluate_rules(table: pa.Table, record_source: str, conn, rules: List[Rule] = RULES) -> RuleResult:
     """
-    Add new rules here in order.
+    Evaluate every rule's mask with Arrow compute kernels, combine them and
+    filter the table once. Reports per-rule reject counts and timings.
     """
-    all_rejected: List[Dict] = []
+    rejected_so_far = None
+    counts: Dict[str, int] = {}
+    timings: Dict[str, float] = {}
+    samples = []
 
-    df, rejected = rule_well_must_exist(df, record_source)
-    all_rejected.extend(rejected)
+    for rule in rules:
+        t0 = time.perf_counter()
+        mask = rule.check(table, conn)
+        if mask is not None:
+            mask = pc.fill_null(mask, False)
+            if rejected_so_far is not None:
+                mask = pc.and_(mask, pc.invert(rejected_so_far))
+                rejected_so_far = pc.or_(rejected_so_far, mask)
+            else:
+                rejected_so_far = mask
+            n = pc.sum(mask).as_py() or 0
+            if n:
+                samples.append(build_rejects(table.filter(mask), rule.name, rule.reason, record_source))
+        else:
+            n = 0
+        counts[rule.name] = n
+        timings[rule.name] = time.perf_counter() - t0
 
-    return df, all_rejected
+    valid = table if rejected_so_far is None else table.filter(pc.invert(rejected_so_far))
+    rejected = pd.concat(samples, ignore_index=True) if samples else pd.DataFrame(columns=REJECT_COLUMNS)
+    return RuleResult(valid, rejected, counts, timings)
 
+
+def apply_all_rules(data, record_source: str, conn) -> RuleResult:
+    """
+    Entry point for the pipeline: `data` is an Arrow table / record batch or a DataFrame.
+    `conn` is the pipeline connection (reference lookups).
+    """
+    if isinstance(data, pa.RecordBatch):
+        data = pa.Table.from_batches([data])
+    elif isinstance(data, pd.DataFrame):
+        data = pa.Table.from_pandas(data, preserve_index=False)
+    return evaluate_rules(data, record_source, conn)
@@ -0,0 +1,182 @@
+from datetime import datetime, timezone
+
+import pyarrow as pa
+
+from .config import SAT_READINGS_TABLE, SAT_PARTITION_COLUMN, SAT_PARTITION_INTERVAL
+
+# Created when the DAG finds no satellite; business keys stay text like the hubs
+SAT_COLUMNS = [
+    ("well_id", "text"),
+    ("survey_type_id", "text"),
+    ("sensor_id", "text"),
+    ("depth_ft", "double precision"),
+    ("amplitude", "double precision"),
+    ("timestamp", "timestamptz"),
+    ("quality_flag", "integer"),
+    ("load_dts", "timestamptz"),
+    ("record_source", "text"),
+]
+
+# Arrow types the SAT_COLUMNS types are bulk-loaded from (binary COPY needs them exactly)
+SAT_ARROW_TYPES = {
+    "text": pa.string(),
+    "double precision": pa.float64(),
+    "integer": pa.int32(),
+    "timestamptz": pa.timestamp("us", tz="UTC"),
+}
+
+# Built after bulk loads (see ensure_indexes); partitions created later inherit them
+SAT_INDEXES = [
+    ("well_id", "sensor_id", "load_dts"),
+    ("sensor_id", "well_id", "load_dts"),
+]
+
+PARTITION_INTERVALS = ("month", "year")
+
+
+def _ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _qualified(table: str) -> str:
+    schema, name = table.split(".", 1)
+    return f"{_ident(schema)}.{_ident(name)}"
+
+
+def as_utc(value) -> datetime:
+    """
+    datetime from a datetime / ISO string; naive values are taken as UTC.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def satellite_arrow_schema(schema: pa.Schema) -> pa.Schema:
+    """
+    `schema` with the SAT_COLUMNS types for the satellite columns, so the
+    table is the same whether the DAG or load_vault_to_postgres.py creates it
+    (naive timestamps become UTC, as in as_utc). Other columns, such as the
+    vault builder's hash keys, keep their own type.
+    """
+    sat = dict(SAT_COLUMNS)
+    return pa.schema([pa.field(f.name, SAT_ARROW_TYPES[sat[f.name]]) if f.name in sat else f for f in schema])
+
+
+def partition_bounds(value, interval: str = SAT_PARTITION_INTERVAL) -> tuple[datetime, datetime]:
+    """
+    [lower, upper) of the partition holding `value`.
+    """
+    if interval not in PARTITION_INTERVALS:
+        raise ValueError(f"partition interval must be one of {PARTITION_INTERVALS}")
+    v = as_utc(value)
+    if interval == "year":
+        lo = datetime(v.year, 1, 1, tzinfo=timezone.utc)
+        return lo, lo.replace(year=v.year + 1)
+    lo = datetime(v.year, v.month, 1, tzinfo=timezone.utc)
+    hi = lo.replace(year=v.year + 1, month=1) if v.month == 12 else lo.replace(month=v.month + 1)
+    return lo, hi
+
+
+def partition_name(table: str, lower: datetime, interval: str = SAT_PARTITION_INTERVAL) -> str:
+    name = table.split(".", 1)[1]
+    return f"{name}_p{lower:%Y}" if interval == "year" else f"{name}_p{lower:%Y_%m}"
+
+
+def relkind(cur, table: str) -> str | None:
+    """
+    'p' for a partitioned table, 'r' for a plain one, None if it does not exist.
+    """
+    cur.execute("SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(%s);", (table,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def create_partitioned_sql(table: str, columns: list[tuple[str, str]],
+                           partition_column: str = SAT_PARTITION_COLUMN) -> list[str]:
+    """
+    DDL for a range-partitioned table plus its DEFAULT partition (rows with a
+    NULL partition key; range partitions are always created before loading).
+    """
+    if partition_column not in [c for c, _ in columns]:
+        raise ValueError(f"partition column {partition_column!r} not in {[c for c, _ in columns]}")
+    cols = ",\n  ".join(f"{_ident(c)} {t}" for c, t in columns)
+    return [
+        f"CREATE TABLE IF NOT EXISTS {_qualified(table)} (\n  {cols}\n) PARTITION BY RANGE ({_ident(partition_column)});",
+        f"CREATE TABLE IF NOT EXISTS {_qualified(table + '_default')} PARTITION OF {_qualified(table)} DEFAULT;",
+    ]
+
+
+def ensure_satellite(cur, table: str = SAT_READINGS_TABLE) -> str:
+    """
+    Create the satellite as a partitioned table if it does not exist.
+    Returns its relkind; an existing plain table is left as is (no partitions
+    are managed for it) until it is reloaded by load_vault_to_postgres.py.
+    """
+    kind = relkind(cur, table)
+    if kind is None:
+        for sql in create_partitioned_sql(table, SAT_COLUMNS):
+            cur.execute(sql)
+        kind = "p"
+    elif kind != "p":
+        print(f"{table} is not partitioned; partitions are not managed for it")
+    return kind
+
+
+def ensure_partitions(cur, table: str, low, high, interval: str = SAT_PARTITION_INTERVAL) -> list[str]:
+    """
+    Create the range partitions covering [low, high] if missing. Serialized
+    per table with an advisory lock so concurrent loads do not race.
+    Returns the names of the partitions created.
+    """
+    if relkind(cur, table) != "p":
+        return []
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (table,))
+
+    schema = table.split(".", 1)[0]
+    created = []
+    lo, hi = partition_bounds(low, interval)
+    last = as_utc(high)
+    while lo <= last:
+        name = partition_name(table, lo, interval)
+        if relkind(cur, f"{schema}.{name}") is None:
+            cur.execute(
+                f"CREATE TABLE {_ident(schema)}.{_ident(name)} PARTITION OF {_qualified(table)} "
+                f"FOR VALUES FROM (%s) TO (%s);",
+                (lo.isoformat(), hi.isoformat()),
+            )
+            created.append(name)
+        lo, hi = hi, partition_bounds(hi, interval)[1]
+    return created
+
+
+def index_name(table: str, columns: tuple[str, ...]) -> str:
+    # well_id, sensor_id, load_dts -> <table>_well_sensor_load_idx (stays under 63 chars for __staging names)
+    return f"{table.split('.', 1)[1]}_{'_'.join(c.split('_')[0] for c in columns)}_idx"
+
+
+def ensure_indexes(cur, table: str = SAT_READINGS_TABLE) -> None:
+    """
+    Composite lookup indexes. Call after bulk loads: on a partitioned table they
+    are built on every existing partition and inherited by new ones.
+    """
+    for columns in SAT_INDEXES:
+        cols = ", ".join(_ident(c) for c in columns)
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {_ident(index_name(table, columns))} ON {_qualified(table)} ({cols});")
+
+
+def rename_table_family(cur, schema: str, old: str, new: str) -> None:
+    """
+    Rename a table and every relation named after it (partitions, indexes) from old* to new*.
+    """
+    cur.execute(
+        "SELECT c.relname, c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = %s AND c.relname LIKE %s AND c.relkind IN ('r', 'p', 'i', 'I') "
+        "ORDER BY length(c.relname);",
+        (schema, old.replace("_", r"\_") + "%"),
+    )
+    for relname, kind in cur.fetchall():
+        what = "INDEX" if kind in ("i", "I") else "TABLE"
+        cur.execute(f"ALTER {what} {_ident(schema)}.{_ident(relname)} RENAME TO {_ident(new + relname[len(old):])};")
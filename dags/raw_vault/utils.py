@@ -1,10 +1,18 @@
 import hashlib
+import os
+import uuid
 from pathlib import Path
 from datetime import datetime, timezone
 
+# outside Airflow, one process counts as one run
+_PROCESS_RUN_ID = f"process-{uuid.uuid4().hex}"
+
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
+def run_id() -> str:
+    return os.environ.get("AIRFLOW_CTX_DAG_RUN_ID") or _PROCESS_RUN_ID
+
 def sha256_of_file(path: Path) -> str:
     h = hashlib.sha256()
     with path.open("rb") as f:
@@ -12,3 +20,7 @@ def sha256_of_file(path: Path) -> str:
             h.update(chunk)
     return h.hexdigest()
 
+
+def unique_tmp_path(path: Path) -> Path:
+    # next to `path` (same filesystem, so os.replace is atomic) and unique per writer
+    return path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
@@ -3,7 +3,12 @@ from datetime import datetime, timedelta
 from airflow import DAG
 from airflow.decorators import task
 
-from raw_vault.pipeline import scan_files, diff_against_manifest, mark_missing, process_and_load
+from raw_vault.config import PROCESS_CONCURRENCY
+from raw_vault.marts import refresh_marts
+from raw_vault.profiling import profile_task
+from raw_vault.pipeline import (
+    scan_files, diff_against_manifest, mark_missing, load_batch, build_satellite_indexes,
+)
 
 with DAG(
     dag_id="raw_vault_incremental_ingest",
@@ -15,24 +20,43 @@ with DAG(
     tags=["raw_vault"],
 ) as dag:
 
+    # only batch ids travel through XCom: the files of each batch, with their scan stat and hash
+    # (no second hashing pass), are stored in raw_vault.file_scan;
+    # the control tables' DDL runs here once, not in the parallel loads
     @task
+    @profile_task("t_scan")
     def t_scan():
-        return scan_files()
+        return diff_against_manifest(scan_files())
 
     @task
-    def t_diff(files):
-        return diff_against_manifest(files)
+    @profile_task("t_batches")
+    def t_batches(diff):
+        return diff["batches"]
 
     @task
+    @profile_task("t_mark_missing")
     def t_mark_missing(diff):
         return mark_missing(diff["missing"])
 
-    @task
-    def t_process(diff):
-        return process_and_load(diff["to_process"])
-
-    files = t_scan()
-    diff = t_diff(files)
+    @task(max_active_tis_per_dagrun=PROCESS_CONCURRENCY)
+    @profile_task("t_process")
+    def t_process(batch_id):
+        return load_batch(batch_id)
+
+    # indexes are built once the batches are loaded, not maintained during the bulk load;
+    # all_done: a failed file or a run with nothing new (skipped expand) must not hold them back
+    @task(trigger_rule="all_done")
+    @profile_task("t_index")
+    def t_index():
+        return build_satellite_indexes()
+
+    # facts are merged past their watermark once every batch of the run is loaded;
+    # all_done: rows committed by the batches that did succeed are merged too (marks make reruns safe)
+    @task(trigger_rule="all_done")
+    @profile_task("t_marts")
+    def t_marts():
+        return refresh_marts()
+
+    diff = t_scan()
     t_mark_missing(diff)
-    t_process(diff)
-
+    t_process.expand(batch_id=t_batches(diff)) >> t_index() >> t_marts()
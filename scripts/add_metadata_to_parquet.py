@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 
-import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import re
 from pathlib import Path
 
+from vault_profile import run_main
+
 YEAR_REGEX = re.compile(r"19\d{2}")
 
 def extract_year(filename: str) -> int:
@@ -13,6 +16,22 @@ def extract_year(filename: str) -> int:
         raise ValueError(f"No 1900s year found in filename: {filename}")
     return int(match.group())
 
+def with_metadata(table: pa.Table, year: int) -> pa.Table:
+    """
+    `table` with the metadata columns set (overwritten if present):
+    timestamp = <year>-01-01, sensor_id = null (not inferred).
+    """
+    columns = {
+        "timestamp": pa.array(np.full(table.num_rows, np.datetime64(f"{year:04d}-01-01", "us"))),
+        "sensor_id": pa.nulls(table.num_rows, pa.float64()),
+    }
+    for name, values in columns.items():
+        if name in table.column_names:
+            table = table.set_column(table.column_names.index(name), name, values)
+        else:
+            table = table.append_column(name, values)
+    return table
+
 def main():
     sgx_dir = Path("processed_data/sgx_parquet")
 
@@ -28,16 +47,10 @@ def main():
         print(f"Processing {fp.name}")
 
         year = extract_year(fp.name)
-        df = pd.read_parquet(fp)
-
-        # overwrite / add metadata columns
-        df["timestamp"] = pd.Timestamp(year=year, month=1, day=1)
-        df["sensor_id"] = np.nan
-
-        df.to_parquet(fp, index=False)
+        pq.write_table(with_metadata(pq.read_table(fp), year), fp)
 
     print(f"Finished processing SGX decoded parquet files")
 
 if __name__ == "__main__":
-    main()
+    run_main("add_metadata_to_parquet", main)
 
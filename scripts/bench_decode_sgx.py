@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from decode_sgx import decode_one, decode_one_loop
+from synthetic_data import write_synthetic_sgx
+from vault_profile import run_main
+
+
+def time_call(fn, path: Path, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(path)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark vectorized vs loop SGX decoding.")
+    ap.add_argument("--traces", type=int, default=1_000_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--skip-loop", action="store_true", help="Only time the vectorized decoder")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.sgx"
+        write_synthetic_sgx(path, args.traces)
+        size_mb = path.stat().st_size / 1e6
+        print(f"file: {args.traces} traces, {size_mb:.1f} MB")
+
+        t_vec, table_vec = time_call(decode_one, path, args.repeat)
+        print(f"vectorized: {t_vec:.4f}s ({args.traces / t_vec:,.0f} traces/s)")
+
+        if args.skip_loop:
+            return
+
+        t_loop, table_loop = time_call(decode_one_loop, path, args.repeat)
+        print(f"loop:       {t_loop:.4f}s ({args.traces / t_loop:,.0f} traces/s)")
+        print(f"speedup:    {t_loop / t_vec:.1f}x")
+        print(f"identical:  {table_vec.equals(table_loop)}")
+
+
+if __name__ == "__main__":
+    run_main("bench_decode_sgx", main)
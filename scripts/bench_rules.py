@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import dags_path  # noqa: F401
+from raw_vault.config import HUB_WELL_TABLE
+from raw_vault.refcache import HubKeys, reference_keys
+from raw_vault.rules import apply_all_rules
+from raw_vault.utils import run_id
+from vault_profile import run_main
+
+
+def synthetic_batch(n: int, known_wells: int, seed: int = 0) -> pa.Table:
+    """
+    Satellite-shaped rows; roughly 1% of well_ids are unknown and 0.5% are null.
+    """
+    rng = np.random.default_rng(seed)
+    wells = rng.integers(1, int(known_wells * 1.01) + 1, n).astype(str).astype(object)
+    wells[rng.random(n) < 0.005] = None
+    return pa.table(
+        {
+            "sensor_id": rng.integers(100, 140, n).astype(str),
+            "well_id": pa.array(wells, pa.string()),
+            "depth_ft": rng.uniform(1000, 12000, n),
+            "amplitude": rng.normal(0, 10, n),
+            "quality_flag": rng.integers(0, 2, n),
+        }
+    )
+
+
+def seed_reference_keys(known_wells: int) -> None:
+    """
+    Prime the process cache so no database is needed.
+    """
+    keys = pa.array(np.unique(np.arange(1, known_wells + 1).astype(str)), pa.string())
+    reference_keys._hubs[(HUB_WELL_TABLE, "well_id")] = HubKeys(keys, None, known_wells, run_id())
+
+
+def pandas_well_must_exist(df: pd.DataFrame, keys: set) -> tuple[pd.DataFrame, int]:
+    """
+    The previous pandas implementation of well_must_exist (reject payloads not serialized).
+    """
+    well_series = df["well_id"].astype("string").str.strip()
+    known = well_series.isin(keys).to_numpy()
+    bad_mask = (~known) & (~well_series.isna()).to_numpy() & (well_series != "").fillna(False).to_numpy()
+    return df[~bad_mask], int(bad_mask.sum())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the Arrow rule engine against the pandas rules.")
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    ap.add_argument("--wells", type=int, default=5_000, help="Keys in hub_well")
+    args = ap.parse_args()
+
+    table = synthetic_batch(args.rows, args.wells)
+    seed_reference_keys(args.wells)
+
+    t0 = time.perf_counter()
+    result = apply_all_rules(table, "bench.parquet", conn=None)
+    t_arrow = time.perf_counter() - t0
+    print(f"arrow:  {t_arrow:.2f}s ({args.rows / t_arrow:,.0f} rows/s), "
+          f"{result.valid.num_rows} valid, rejected {result.counts}")
+    for rule, seconds in result.timings.items():
+        print(f"  {rule}: {seconds:.3f}s")
+
+    keys = set(str(k) for k in range(1, args.wells + 1))
+    t0 = time.perf_counter()
+    df = table.to_pandas()  # the pandas rules ran on batch.to_pandas()
+    valid_df, n_bad = pandas_well_must_exist(df, keys)
+    t_pandas = time.perf_counter() - t0
+    print(f"pandas: {t_pandas:.2f}s ({args.rows / t_pandas:,.0f} rows/s), {len(valid_df)} valid, rejected {n_bad}")
+
+    assert n_bad == result.counts["well_must_exist"]
+    assert len(valid_df) == result.valid.num_rows
+    print(f"speedup: {t_pandas / t_arrow:.1f}x")
+
+
+if __name__ == "__main__":
+    run_main("bench_rules", main)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from vault_hash import hash_diff, hash_key
+from vault_profile import run_main
+from vault_store import read_vault_table, write_vault_table
+
+
+def synthetic_satellite(n: int, sources: int = 20, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "sensor_id": rng.integers(100, 140, n).astype(str),
+            "well_id": rng.integers(1, 500, n).astype(str),
+            "survey_type_id": rng.choice(["101", "102", "205"], n),
+            "depth_ft": rng.uniform(1000, 12000, n),
+            "amplitude": rng.normal(0, 10, n),
+            "timestamp": pd.Timestamp("1990-01-01") + pd.to_timedelta(rng.integers(0, 3650, n), unit="D"),
+            "quality_flag": rng.integers(0, 2, n),
+        }
+    )
+    df.insert(0, "sensor_well_hk", hash_key(df, ["sensor_id", "well_id"]))
+    df["hashdiff"] = hash_diff(df, ["survey_type_id", "depth_ft", "amplitude", "timestamp", "quality_flag"])
+    df["load_dts"] = "2025-01-01T00:00:00+00:00"
+    df["record_source"] = pd.Series(rng.integers(0, sources, n)).map(lambda i: f"archive_batch_{i}.parquet")
+    return df
+
+
+def dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def filter_csv(path: Path, source: str) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    return df[df["record_source"] == source]
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare CSV with partitioned Parquet for a satellite-shaped table.")
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    ap.add_argument("--sources", type=int, default=20, help="Distinct record_source partitions")
+    args = ap.parse_args()
+
+    df = synthetic_satellite(args.rows, args.sources)
+    source = df["record_source"].iloc[0]
+    work = Path(tempfile.mkdtemp(prefix="bench_vault_store_"))
+    try:
+        csv_path = work / "sat.csv"
+        pq_dir = work / "sat"
+
+        _, csv_write = timed(lambda: df.to_csv(csv_path, index=False))
+        _, pq_write = timed(lambda: write_vault_table(df, pq_dir))
+
+        _, csv_read = timed(lambda: pd.read_csv(csv_path))
+        _, pq_read = timed(lambda: read_vault_table(pq_dir).to_pandas())
+
+        csv_one, csv_filter = timed(lambda: filter_csv(csv_path, source))
+        pq_one, pq_filter = timed(lambda: read_vault_table(pq_dir, filters=[("record_source", "=", source)]))
+        assert len(csv_one) == pq_one.num_rows
+
+        csv_mb = csv_path.stat().st_size / 1e6
+        pq_mb = dir_size(pq_dir) / 1e6
+        print(f"rows: {args.rows:,}, partitions: {args.sources}")
+        print(f"{'':16}{'CSV':>10}{'Parquet':>10}")
+        print(f"{'size (MB)':16}{csv_mb:>10.1f}{pq_mb:>10.1f}")
+        print(f"{'write (s)':16}{csv_write:>10.2f}{pq_write:>10.2f}")
+        print(f"{'read all (s)':16}{csv_read:>10.2f}{pq_read:>10.2f}")
+        print(f"{'read 1 src (s)':16}{csv_filter:>10.2f}{pq_filter:>10.2f}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run_main("bench_vault_store", main)
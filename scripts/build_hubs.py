@@ -4,9 +4,18 @@ import pandas as pd
 from pathlib import Path
 from datetime import datetime, timezone
 
+from vault_hash import hash_key, normalize_key
+from vault_profile import run_main
+from vault_store import write_vault_table
+
+
 ASSETS_DIR = Path("/home/hackathon/socar_hackathon_deciders/caspian_hackathon_assets")
 OUT_DIR = Path("/home/hackathon/socar_hackathon_deciders/processed_data/raw_vault/hubs")
 
+def hub_key_col(bk_col: str) -> str:
+    # well_id -> well_hk
+    return bk_col.removesuffix("_id") + "_hk"
+
 def build_hub(csv_path: Path, bk_col: str) -> pd.DataFrame:
     if not csv_path.exists():
         raise FileNotFoundError(f"Missing file: {csv_path}")
@@ -20,10 +29,10 @@ def build_hub(csv_path: Path, bk_col: str) -> pd.DataFrame:
         )
 
     hub = df[[bk_col]].copy()
-    hub[bk_col] = hub[bk_col].astype("string").str.strip()
+    hub[bk_col] = normalize_key(hub[bk_col])
     hub = hub.dropna(subset=[bk_col])
-    hub = hub[hub[bk_col] != ""]
     hub = hub.drop_duplicates(subset=[bk_col])
+    hub.insert(0, hub_key_col(bk_col), hash_key(hub, [bk_col]))
 
     hub["load_dts"] = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
     hub["record_source"] = csv_path.name
@@ -33,20 +42,19 @@ def main():
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
     specs = [
-        (ASSETS_DIR / "master_sensors.csv", "sensor_id", "hub_sensor.csv"),
-        (ASSETS_DIR / "master_surveys.csv", "survey_type_id", "hub_survey_type.csv"),
-        (ASSETS_DIR / "master_wells.csv", "well_id", "hub_well.csv"),
+        (ASSETS_DIR / "master_sensors.csv", "sensor_id", "hub_sensor"),
+        (ASSETS_DIR / "master_surveys.csv", "survey_type_id", "hub_survey_type"),
+        (ASSETS_DIR / "master_wells.csv", "well_id", "hub_well"),
     ]
 
     for src, bk, out_name in specs:
         print(f"Building {out_name} from {src}")
         hub = build_hub(src, bk)
-        out_path = OUT_DIR / out_name
-        hub.to_csv(out_path, index=False)
+        write_vault_table(hub, OUT_DIR / out_name)
         print(f"rows: {len(hub)}")
 
     print("Hubs created in:", OUT_DIR)
 
 if __name__ == "__main__":
-    main()
+    run_main("build_hubs", main)
 
@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 
-import pandas as pd
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
+from functools import partial
 from pathlib import Path
-import glob
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from vault_hash import hash_key, normalize_key
+from vault_store import write_vault_table
+from vault_profile import profile_worker, run_main
 
 # Project root (important: makes paths robust)
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -17,102 +27,179 @@ WELLS_CSV   = "/home/hackathon/socar_hackathon_deciders/caspian_hackathon_assets
 SGX_DIR = PROJECT_ROOT / "processed_data/sgx_parquet"
 RECOVERED_DIR = PROJECT_ROOT / "processed_data/parquet_recovered"
 
-PARQUET_FILES = (
-    list(SGX_DIR.glob("*.parquet")) +
-    list(RECOVERED_DIR.glob("*.parquet"))
-)
-
-if not PARQUET_FILES:
-    raise FileNotFoundError("No parquet files found in sgx_parquet or parquet_recovered")
-
-print("Parquet files found:", [p.name for p in PARQUET_FILES])
-
 # OUTPUT
 LINK_DIR = PROJECT_ROOT / "processed_data/raw_vault/links"
-LINK_DIR.mkdir(parents=True, exist_ok=True)
-
-# LOAD MASTER HUB KEYS
-df_sensors = pd.read_csv(SENSORS_CSV)
-df_surveys = pd.read_csv(SURVEYS_CSV)
-df_wells   = pd.read_csv(WELLS_CSV)
 
 SENSOR_BK = "sensor_id"
 SURVEY_BK = "survey_type_id"
 WELL_BK   = "well_id"
 
-valid_sensors = set(df_sensors[SENSOR_BK].astype("string").str.strip().dropna())
-valid_surveys = set(df_surveys[SURVEY_BK].astype("string").str.strip().dropna())
-valid_wells   = set(df_wells[WELL_BK].astype("string").str.strip().dropna())
-
-# HELPERS
-def first_existing_col(df, candidates):
-    for c in candidates:
-        if c in df.columns:
-            return c
-    return None
-
-def clean_series(s):
-    return s.astype("string").str.strip()
-
-def build_link_from_parquet(df, left_col, right_col, record_source):
-    link = df[[left_col, right_col]].copy()
-    link[left_col] = clean_series(link[left_col])
-    link[right_col] = clean_series(link[right_col])
-
-    link = link.dropna(subset=[left_col, right_col])
-    link = link[(link[left_col] != "") & (link[right_col] != "")]
-    link = link.drop_duplicates(subset=[left_col, right_col])
-
-    link["load_dts"] = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
-    link["record_source"] = record_source
-    return link
-
 # COLUMN CANDIDATES
 SENSOR_COL_CANDIDATES = ["sensor_id", "sensorid", "sensor", "sid"]
 WELL_COL_CANDIDATES   = ["well_id", "wellid", "well", "wid"]
 SURVEY_COL_CANDIDATES = ["survey_type_id", "survey_id", "surveyid", "survey", "survey_type"]
 
-# BUILD LINKS
-all_sensor_well = []
-all_survey_well = []
-all_sensor_survey = []
-
-for fp in PARQUET_FILES:
-    dfp = pd.read_parquet(fp)
-    src = fp.name
-
-    sensor_col = first_existing_col(dfp, SENSOR_COL_CANDIDATES)
-    well_col   = first_existing_col(dfp, WELL_COL_CANDIDATES)
-    survey_col = first_existing_col(dfp, SURVEY_COL_CANDIDATES)
-
-    if sensor_col and well_col:
-        l = build_link_from_parquet(dfp, sensor_col, well_col, src)
-        l = l[l[sensor_col].isin(valid_sensors) & l[well_col].isin(valid_wells)]
-        l = l.rename(columns={sensor_col: SENSOR_BK, well_col: WELL_BK})
-        all_sensor_well.append(l)
-
-    if survey_col and well_col:
-        l = build_link_from_parquet(dfp, survey_col, well_col, src)
-        l = l[l[survey_col].isin(valid_surveys) & l[well_col].isin(valid_wells)]
-        l = l.rename(columns={survey_col: SURVEY_BK, well_col: WELL_BK})
-        all_survey_well.append(l)
-
-    if sensor_col and survey_col:
-        l = build_link_from_parquet(dfp, sensor_col, survey_col, src)
-        l = l[l[sensor_col].isin(valid_sensors) & l[survey_col].isin(valid_surveys)]
-        l = l.rename(columns={sensor_col: SENSOR_BK, survey_col: SURVEY_BK})
-        all_sensor_survey.append(l)
-
-# SAVE LINKS
-def save_link(all_parts, out_path):
-    if not all_parts:
-        print(f"Skipped {out_path.name} (no data)")
-        return
-    link = pd.concat(all_parts, ignore_index=True).drop_duplicates()
-    link.to_csv(out_path, index=False)
-    print(f"Saved {out_path.name}: {len(link)} rows")
-
-save_link(all_sensor_well, LINK_DIR / "link_sensor_well.csv")
-save_link(all_survey_well, LINK_DIR / "link_survey_type_well.csv")
-save_link(all_sensor_survey, LINK_DIR / "link_sensor_survey_type.csv")
+# business key -> (master csv, column candidates in the parquet files)
+HUBS = {
+    SENSOR_BK: (SENSORS_CSV, SENSOR_COL_CANDIDATES),
+    SURVEY_BK: (SURVEYS_CSV, SURVEY_COL_CANDIDATES),
+    WELL_BK:   (WELLS_CSV, WELL_COL_CANDIDATES),
+}
+
+# link table -> (hash key column, left business key, right business key)
+LINKS = {
+    "link_sensor_well":        ("sensor_well_hk", SENSOR_BK, WELL_BK),
+    "link_survey_type_well":   ("survey_type_well_hk", SURVEY_BK, WELL_BK),
+    "link_sensor_survey_type": ("sensor_survey_type_hk", SENSOR_BK, SURVEY_BK),
+}
+
+DEFAULT_WORKERS = 4
+
+# HELPERS
+def first_existing_col(columns, candidates):
+    for c in candidates:
+        if c in columns:
+            return c
+    return None
 
+def load_master_keys(csv_path, bk_col: str) -> np.ndarray:
+    """
+    Sorted distinct normalized business keys of a master file.
+    """
+    keys = normalize_key(pd.read_csv(csv_path, usecols=[bk_col])[bk_col]).dropna().unique()
+    return np.sort(np.asarray(keys, dtype=object))
+
+def key_codes(values: pd.Series, master: np.ndarray) -> np.ndarray:
+    """
+    Position of each (normalized) value in `master`, -1 if null / blank / unknown.
+    Only the distinct raw values are normalized and looked up.
+    """
+    codes, uniques = pd.factorize(values)
+    keys = normalize_key(pd.Series(uniques, dtype=object))
+    # trailing -1 is picked by code -1 (null)
+    positions = np.append(pd.Index(master).get_indexer(keys.fillna("")), -1)
+    return positions[codes]
+
+def resolve_key_columns(names) -> dict:
+    """
+    Business key -> source column (first of its *_COL_CANDIDATES present), or None.
+    """
+    return {bk: first_existing_col(names, HUBS[bk][1]) for bk in HUBS}
+
+def link_pairs(df: pd.DataFrame, resolved: dict, masters: dict) -> dict:
+    """
+    Distinct pair codes per link of the rows of `df` (see file_links).
+    """
+    codes = {bk: key_codes(df[col], masters[bk]) for bk, col in resolved.items() if col}
+
+    pairs = {}
+    for link, (_, left, right) in LINKS.items():
+        if left not in codes or right not in codes:
+            continue
+        l, r = codes[left], codes[right]
+        both = (l >= 0) & (r >= 0)
+        pairs[link] = np.unique(l[both].astype(np.int64) * len(masters[right]) + r[both])
+    return pairs
+
+@profile_worker("build_links")
+def file_links(fp: Path, masters: dict) -> dict:
+    """
+    Distinct link pairs of one parquet file, as int64 pair codes per link
+    (left position * len(right master) + right position). Only the key
+    columns resolved from the *_COL_CANDIDATES are read.
+    """
+    t0 = time.perf_counter()
+    resolved = resolve_key_columns(pq.read_schema(fp).names)
+    columns = sorted({c for c in resolved.values() if c})
+
+    df = pq.read_table(fp, columns=columns).to_pandas() if columns else pd.DataFrame()
+    pairs = link_pairs(df, resolved, masters)
+
+    return {
+        "file": fp.name,
+        "rows": len(df),
+        "columns": columns,
+        "pairs": pairs,
+        "seconds": time.perf_counter() - t0,
+    }
+
+def link_frame(link: str, results: list[dict], masters: dict, load_dts: str) -> pd.DataFrame:
+    """
+    Decode the pair codes of every file into link rows: one row per link hash key and source.
+    """
+    hk_col, left, right = LINKS[link]
+    parts = []
+    for res in results:
+        codes = res["pairs"].get(link)
+        if codes is None or not len(codes):
+            continue
+        l, r = np.divmod(codes, len(masters[right]))
+        parts.append(pd.DataFrame({
+            left: pd.array(masters[left][l], dtype="string"),
+            right: pd.array(masters[right][r], dtype="string"),
+            "record_source": res["file"],
+        }))
+    if not parts:
+        return pd.DataFrame()
+
+    frame = pd.concat(parts, ignore_index=True)
+    frame.insert(0, hk_col, hash_key(frame, [left, right]))
+    frame.insert(3, "load_dts", load_dts)
+    return frame
+
+def build_links(parquet_files: list[Path], masters: dict, workers: int = 1) -> tuple[dict, list[dict]]:
+    """
+    Build every link from `parquet_files`. Returns ({link name: frame}, per-file results).
+    """
+    work = partial(file_links, masters=masters)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(work, parquet_files))
+    else:
+        results = [work(fp) for fp in parquet_files]
+
+    load_dts = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+    return {link: link_frame(link, results, masters, load_dts) for link in LINKS}, results
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Read parquet files in N worker processes")
+    args = ap.parse_args()
+
+    parquet_files = sorted(list(SGX_DIR.glob("*.parquet")) + list(RECOVERED_DIR.glob("*.parquet")))
+    if not parquet_files:
+        raise FileNotFoundError("No parquet files found in sgx_parquet or parquet_recovered")
+
+    print("Parquet files found:", [p.name for p in parquet_files])
+
+    t0 = time.perf_counter()
+    masters = {bk: load_master_keys(csv_path, bk) for bk, (csv_path, _) in HUBS.items()}
+    t_masters = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    links, results = build_links(parquet_files, masters, args.workers)
+    t_build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    LINK_DIR.mkdir(parents=True, exist_ok=True)
+    for link, frame in links.items():
+        if frame.empty:
+            print(f"Skipped {link} (no data)")
+            continue
+        write_vault_table(frame, LINK_DIR / link)
+        print(f"Saved {link}: {len(frame)} rows")
+    t_write = time.perf_counter() - t0
+
+    print("\nPer file:")
+    for res in results:
+        counts = ", ".join(f"{link}={len(p)}" for link, p in res["pairs"].items()) or "no links"
+        print(f"- {res['file']}: {res['rows']} rows, columns {res['columns']}, {counts} ({res['seconds']:.2f}s)")
+
+    total_rows = sum(r["rows"] for r in results)
+    print(
+        f"\nRead {len(results)} files, {total_rows} rows: masters {t_masters:.2f}s, "
+        f"links {t_build:.2f}s, write {t_write:.2f}s (workers={max(args.workers, 1)})"
+    )
+
+if __name__ == "__main__":
+    run_main("build_links", main)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Raw assets to raw vault in one process, without the intermediate files of the
+script chain (recover_parquet -> decode_sgx -> add_metadata_to_parquet ->
+build_hubs / build_links / build_sat_link_sensor_well_readings).
+
+Every source file is read once and streamed through as Arrow batches:
+
+    .parquet  open_recovered (the file, or its valid prefix read in place)
+    .sgx      decode_batches -> with_metadata
+      -> validation (rows of wells missing from the master are rejected, as in the DAG)
+      -> link pair codes and satellite rows of the batch
+
+Hubs come from the master files; links are written once all files are read,
+from the distinct key pairs of each file. Satellite rows (distinct per file,
+as in the satellite builder's full build) and reject samples are written after
+each file to staging tables that replace the vault's once every file is read,
+so memory is bounded by the largest file rather than the dataset.
+Record sources and hash keys are the ones the chain produces.
+--intermediate-dir also writes the recovered / decoded files the chain would
+have left in processed_data, for auditing.
+"""
+import argparse
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import build_hubs
+import build_links
+import build_sat_link_sensor_well_readings as build_sat
+import dags_path  # noqa: F401
+from add_metadata_to_parquet import extract_year, with_metadata
+from decode_sgx import DEFAULT_BATCH_SIZE, decode_batches, output_path
+from raw_vault.config import REJECT_SAMPLE_LIMIT
+from raw_vault.refcache import normalize_keys
+from raw_vault.rules import Rule, evaluate_rules
+from raw_vault.utils import sha256_of_file
+from recover_parquet import open_recovered
+from vault_profile import run_main
+from vault_store import write_vault_table
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+VAULT_DIR = PROJECT_ROOT / "processed_data/raw_vault"
+# per-file output while a build runs (not under hubs/ links/ sats/, which the loader reads)
+STAGING_DIR = ".staging"
+
+# business key -> (master file, hub table), as in build_hubs
+MASTERS = {
+    "sensor_id": ("master_sensors.csv", "hub_sensor"),
+    "survey_type_id": ("master_surveys.csv", "hub_survey_type"),
+    "well_id": ("master_wells.csv", "hub_well"),
+}
+
+
+def well_must_exist(master_wells: np.ndarray) -> Rule:
+    """
+    The DAG's well_must_exist rule, checked against the well master (which
+    raw_vault.hub_well is built from) instead of the database.
+    """
+    known = pa.array(master_wells, pa.string())
+
+    def check(table: pa.Table, _conn):
+        if "well_id" not in table.column_names:
+            return None
+        wells = normalize_keys(table.column("well_id"))
+        present = pc.fill_null(pc.not_equal(wells, ""), False)
+        return pc.and_(pc.invert(pc.is_in(wells, value_set=known)), present)
+
+    return Rule("well_must_exist", "well_id not found in master_wells.csv", check)
+
+
+def open_source(src: Path, data_dir: Path, batch_size: int):
+    """
+    (record_source, path under the intermediate dir, Arrow tables) of one raw file.
+    record_source is the name of the file the chain would have written.
+    """
+    if src.suffix == ".sgx":
+        dst = output_path(src, data_dir, Path("sgx_parquet"))
+        year = extract_year(dst.name)
+        return dst.name, dst, (with_metadata(t, year) for t in decode_batches(src, batch_size))
+
+    pf = open_recovered(src)
+    if pf is None:
+        raise ValueError("no valid parquet footer")
+    batches = (pa.Table.from_batches([b]) for b in pf.iter_batches(batch_size))
+    return src.name, Path("parquet_recovered") / src.relative_to(data_dir), batches
+
+
+def process_file(src: Path, data_dir: Path, masters: dict, rules: list[Rule], load_dts: str,
+                 batch_size: int, intermediate_dir: Path | None) -> dict:
+    """
+    Stream one raw file through validation, link and satellite emission. Raises
+    if the file cannot be read; the result's "skipped" is set when it cannot
+    feed the satellite (as read_part reports it).
+    """
+    t0 = time.perf_counter()
+    record_source, rel, tables = open_source(src, data_dir, batch_size)
+    checksum = sha256_of_file(src)
+    result = {"file": record_source, "rows": 0, "rejected": 0, "columns": [], "pairs": {},
+              "sat": None, "sat_rows_read": 0, "rejects": [], "skipped": None}
+    pairs = {link: [] for link in build_links.LINKS}
+    sat_parts = []
+    resolved = None
+    writer = None
+    try:
+        for table in tables:
+            if intermediate_dir is not None:
+                if writer is None:
+                    dst = intermediate_dir / rel
+                    dst.parent.mkdir(parents=True, exist_ok=True)
+                    writer = pq.ParquetWriter(dst, table.schema)
+                writer.write_table(table)
+            result["rows"] += table.num_rows
+
+            checked = evaluate_rules(table, record_source, None, rules)
+            result["rejected"] += sum(checked.counts.values())
+            kept = sum(len(r) for r in result["rejects"])
+            if len(checked.rejected) and kept < REJECT_SAMPLE_LIMIT:
+                result["rejects"].append(checked.rejected.head(REJECT_SAMPLE_LIMIT - kept))
+
+            if resolved is None:
+                resolved = build_links.resolve_key_columns(table.column_names)
+                result["columns"] = sorted({c for c in resolved.values() if c})
+            df = checked.valid.to_pandas()
+            for link, codes in build_links.link_pairs(df, resolved, masters).items():
+                pairs[link].append(codes)
+
+            # normalizes the key columns of df in place: after the links
+            sat, reason = build_sat.satellite_rows(df, record_source, checksum, load_dts)
+            if sat is None:
+                result["skipped"] = reason
+            else:
+                sat_parts.append(sat)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if sat_parts:
+        sat = pd.concat(sat_parts, ignore_index=True)
+        result["sat_rows_read"] = len(sat)
+        # record_source is part of every row: exact duplicates only occur within a file
+        result["sat"], _ = build_sat.distinct_rows(sat)
+
+    result["pairs"] = {link: np.unique(np.concatenate(codes)) for link, codes in pairs.items() if codes}
+    result["seconds"] = time.perf_counter() - t0
+    return result
+
+
+def replace_table(staging: Path, table: Path) -> bool:
+    """
+    Move a staged table over `table`. False (and `table` left alone) if nothing was staged.
+    """
+    if not staging.exists():
+        return False
+    shutil.rmtree(table, ignore_errors=True)
+    table.parent.mkdir(parents=True, exist_ok=True)
+    staging.replace(table)
+    return True
+
+
+def build_raw_vault(
+    data_dir: Path,
+    masters_dir: Path,
+    vault_dir: Path = VAULT_DIR,
+    intermediate_dir: Path | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    validate: bool = True,
+) -> dict:
+    """
+    Build hubs, links and the satellite (full build) under vault_dir from the
+    raw .sgx / .parquet files of data_dir. Returns run statistics.
+    """
+    t_start = time.perf_counter()
+    load_dts = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+    for bk, (csv_name, hub_name) in MASTERS.items():
+        hub = build_hubs.build_hub(masters_dir / csv_name, bk)
+        write_vault_table(hub, vault_dir / "hubs" / hub_name)
+        print(f"Saved {hub_name}: {len(hub)} rows")
+
+    masters = {bk: build_links.load_master_keys(masters_dir / csv_name, bk) for bk, (csv_name, _) in MASTERS.items()}
+    rules = [well_must_exist(masters["well_id"])] if validate else []
+
+    sat_table = vault_dir / "sats" / build_sat.OUT_SAT.name
+    rejects_table = vault_dir / "rejects" / "rejected_records"
+    staging = vault_dir / STAGING_DIR
+    shutil.rmtree(staging, ignore_errors=True)
+    sat_staging, rejects_staging = staging / "sats" / sat_table.name, staging / "rejects" / rejects_table.name
+
+    sources = sorted(data_dir.rglob("*.sgx")) + sorted(data_dir.rglob("*.parquet"))
+    results, unreadable = [], []
+    sat_read = sat_written = 0
+    for src in sources:
+        try:
+            res = process_file(src, data_dir, masters, rules, load_dts, batch_size, intermediate_dir)
+        except Exception as e:
+            unreadable.append((src.relative_to(data_dir).as_posix(), f"{type(e).__name__}: {e}"))
+            continue
+        # the file's rows are written now and not kept for the rest of the run
+        sat, rejects = res.pop("sat"), res.pop("rejects")
+        if sat is not None:
+            sat_read += res["sat_rows_read"]
+            sat_written += write_vault_table(sat, sat_staging, append=True)
+        if rejects:
+            write_vault_table(pd.concat(rejects, ignore_index=True), rejects_staging, append=True)
+        results.append(res)
+        counts = ", ".join(f"{link}={len(p)}" for link, p in res["pairs"].items()) or "no links"
+        print(f"- {res['file']}: {res['rows']} rows, {res['rejected']} rejected, {counts} ({res['seconds']:.2f}s)")
+
+    link_rows = 0
+    for link in build_links.LINKS:
+        frame = build_links.link_frame(link, results, masters, load_dts)
+        if frame.empty:
+            print(f"Skipped {link} (no data)")
+            continue
+        link_rows += write_vault_table(frame, vault_dir / "links" / link)
+        print(f"Saved {link}: {len(frame)} rows")
+
+    if replace_table(sat_staging, sat_table):
+        # this is a full build: the satellite builder's next --incremental run starts over
+        for state in (build_sat.STATE_FILE, build_sat.LATEST_FILE):
+            (sat_table.parent / state.name).unlink(missing_ok=True)
+        print(f"Saved {sat_table.name}: {sat_written} of {sat_read} rows")
+    else:
+        print("No satellite data created. All files were skipped.")
+    replace_table(rejects_staging, rejects_table)
+    shutil.rmtree(staging, ignore_errors=True)
+
+    build_sat.print_skipped([(res["file"], res["skipped"]) for res in results if res["skipped"]])
+    if unreadable:
+        print("\nUnreadable source files:")
+        for name, reason in unreadable:
+            print(f"- {name}: {reason}")
+
+    return {
+        "files": len(results),
+        "unreadable": len(unreadable),
+        "bytes": sum(p.stat().st_size for p in sources),
+        "rows": sum(res["rows"] for res in results),
+        "rejected": sum(res["rejected"] for res in results),
+        "link_rows": link_rows,
+        "sat_rows_read": sat_read,
+        "sat_rows_written": sat_written,
+        "seconds": time.perf_counter() - t_start,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build the raw vault from raw .sgx / .parquet files in one pass.")
+    ap.add_argument("--data-dir", required=True, help="Raw .sgx and (corrupted) .parquet files")
+    ap.add_argument("--masters-dir", default=str(build_hubs.ASSETS_DIR), help="Directory of the master_*.csv files")
+    ap.add_argument("--vault-dir", default=str(VAULT_DIR), help="Output root (hubs/, links/, sats/, rejects/)")
+    ap.add_argument("--intermediate-dir",
+                    help="Also write the decoded / recovered parquet here (sgx_parquet/, parquet_recovered/)")
+    ap.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per Arrow batch")
+    ap.add_argument("--no-validate", action="store_true",
+                    help="Keep rows of unknown wells (same satellite as the script chain)")
+    args = ap.parse_args()
+
+    stats = build_raw_vault(
+        Path(args.data_dir).resolve(),
+        Path(args.masters_dir),
+        Path(args.vault_dir),
+        Path(args.intermediate_dir) if args.intermediate_dir else None,
+        args.batch_size,
+        validate=not args.no_validate,
+    )
+    print(
+        f"\nRead {stats['files']} files ({stats['bytes'] / 1e6:.1f} MB, {stats['unreadable']} unreadable), "
+        f"{stats['rows']} rows, {stats['rejected']} rejected: {stats['link_rows']} link rows, "
+        f"{stats['sat_rows_written']} satellite rows in {stats['seconds']:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    run_main("build_raw_vault", main)
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 
+import argparse
+import json
 import pandas as pd
 from datetime import datetime, timezone
 from pathlib import Path
 import hashlib
 
+from vault_hash import hash_diff, hash_key, normalize_key
+from vault_store import write_vault_table
+from vault_profile import run_main
+
 # Project root (robust paths)
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
@@ -14,9 +20,14 @@ RECOVERED_DIR = PROJECT_ROOT / "processed_data/parquet_recovered"
 OUT_DIR = PROJECT_ROOT / "processed_data/raw_vault/sats"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-OUT_SAT = OUT_DIR / "sat_link_sensor_well_readings.csv"
+OUT_SAT = OUT_DIR / "sat_link_sensor_well_readings"
+
+# Incremental state: checksum per source file, latest hashdiff per parent key
+STATE_FILE = OUT_DIR / "sat_link_sensor_well_readings.state.json"
+LATEST_FILE = OUT_DIR / "sat_link_sensor_well_readings.latest.parquet"
 
 PARENT_KEYS = ["sensor_id", "well_id"]
+PARENT_HK = "sensor_well_hk"
 EVENT_TS_COL = "timestamp"
 
 # Helpers
@@ -27,11 +38,108 @@ def sha256_of_file(path: Path) -> str:
             h.update(chunk)
     return h.hexdigest()
 
-def clean_str_series(s):
-    return s.astype("string").str.strip()
+def read_part(fp: Path, checksum: str, load_dts: str):
+    """
+    Satellite rows of one parquet file, or (None, reason) if it cannot feed the satellite.
+    """
+    return satellite_rows(pd.read_parquet(fp), fp.name, checksum, load_dts)
+
+def satellite_rows(df: pd.DataFrame, record_source: str, checksum: str, load_dts: str):
+    """
+    Satellite rows of a frame (a whole file or one batch of it), or (None, reason).
+    """
+    missing = [c for c in (PARENT_KEYS + [EVENT_TS_COL]) if c not in df.columns]
+    if missing:
+        return None, f"missing {missing}"
+
+    for k in PARENT_KEYS:
+        df[k] = normalize_key(df[k])
+
+    df = df.dropna(subset=PARENT_KEYS + [EVENT_TS_COL])
+
+    payload_cols = [c for c in df.columns if c not in PARENT_KEYS]
+
+    sat = df[PARENT_KEYS + payload_cols].copy()
+    sat.insert(0, PARENT_HK, hash_key(sat, PARENT_KEYS))
+    sat["hashdiff"] = hash_diff(sat, payload_cols)
+
+    sat["load_dts"] = load_dts
+    sat["record_source"] = record_source
+    sat["source_file_checksum"] = checksum
+    return sat, None
+
+def empty_latest() -> pd.DataFrame:
+    return pd.DataFrame({PARENT_HK: pd.Series(dtype="string"), "hashdiff": pd.Series(dtype="string")})
+
+def load_state() -> tuple[dict, pd.DataFrame]:
+    if not STATE_FILE.exists() or not LATEST_FILE.exists() or not OUT_SAT.exists():
+        return {}, empty_latest()
+    latest = pd.read_parquet(LATEST_FILE)
+    if not pd.api.types.is_string_dtype(latest["hashdiff"]):
+        # written before hashdiffs were MD5 hex: the satellite has to be rebuilt
+        print("Incremental state has old-style hashdiffs: ignoring it.")
+        return {}, empty_latest()
+    files = json.loads(STATE_FILE.read_text())["files"]
+    return files, latest
+
+def save_state(files: dict, latest: pd.DataFrame) -> None:
+    tmp = LATEST_FILE.with_suffix(".tmp")
+    latest.to_parquet(tmp, index=False)
+    tmp.replace(LATEST_FILE)
+    tmp = STATE_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"files": files}, indent=2, sort_keys=True))
+    tmp.replace(STATE_FILE)
+
+def event_order(sat: pd.DataFrame) -> pd.DataFrame:
+    return sat.sort_values([PARENT_HK, EVENT_TS_COL, "hashdiff", "record_source"], kind="stable")
+
+def distinct_rows(delta: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Full build: keep every distinct row, as the CSV build did (exact
+    duplicates can only come from the same source file). Returns (rows,
+    latest), latest being the hashdiff of the last row per parent key in
+    event-time order, which the next --incremental run compares against.
+    """
+    rows = delta.drop_duplicates(ignore_index=True)
+    last = event_order(rows).groupby(PARENT_HK, sort=False).tail(1)[[PARENT_HK, "hashdiff"]]
+    latest = last.reset_index(drop=True).astype({PARENT_HK: "string", "hashdiff": "string"})
+    return rows, latest
+
+def detect_changes(delta: pd.DataFrame, latest: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Keep the rows whose hashdiff differs from the previous row of the same
+    parent key: the previous row in event-time order within `delta`, or the
+    latest stored row for the first one. Returns (changed rows, updated latest).
+    Used by --incremental runs; a full build keeps every distinct row (distinct_rows).
+    """
+    delta = event_order(delta)
+    hashdiff = delta["hashdiff"].astype("string")
+
+    prev = hashdiff.groupby(delta[PARENT_HK], sort=False).shift()
+    first = delta[PARENT_HK].ne(delta[PARENT_HK].shift()).fillna(True).to_numpy(dtype=bool)
+    stored = latest.set_index(PARENT_HK)["hashdiff"].astype("string")
+    prev[first] = delta.loc[first, PARENT_HK].map(stored).astype("string")
+
+    changed = delta[hashdiff.ne(prev).fillna(True).to_numpy()]
+
+    last = changed.groupby(PARENT_HK, sort=False).tail(1)[[PARENT_HK, "hashdiff"]]
+    latest = pd.concat([latest, last], ignore_index=True).drop_duplicates(subset=[PARENT_HK], keep="last")
+    latest = latest.astype({PARENT_HK: "string", "hashdiff": "string"})
+    return changed, latest
+
+def print_skipped(skipped):
+    if skipped:
+        print("\n⚠️Skipped files (showing up to 20):")
+        for name, reason in skipped[:20]:
+            print(f"- {name}: {reason}")
 
 # Main
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--incremental", action="store_true",
+                    help="Only read new/changed source files and append the changed rows")
+    args = ap.parse_args()
+
     parquet_files = sorted(list(SGX_DIR.glob("*.parquet")) + list(RECOVERED_DIR.glob("*.parquet")))
 
     if not parquet_files:
@@ -39,57 +147,58 @@ def main():
 
     print("Parquet files found:", [p.name for p in parquet_files])
 
+    if args.incremental:
+        known_files, latest = load_state()
+        if not known_files:
+            print("No incremental state found: building the full satellite.")
+    else:
+        known_files, latest = {}, empty_latest()
+    full_build = not known_files
+
     parts = []
     load_dts = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
     skipped = []
+    files = dict(known_files)
 
     for fp in parquet_files:
-        df = pd.read_parquet(fp)
-        src = fp.name
-
-        missing = [c for c in (PARENT_KEYS + [EVENT_TS_COL]) if c not in df.columns]
-        if missing:
-            skipped.append((src, f"missing {missing}"))
+        checksum = sha256_of_file(fp)
+        if known_files.get(fp.name) == checksum:
             continue
 
-        for k in PARENT_KEYS:
-            df[k] = clean_str_series(df[k])
-
-        df = df.dropna(subset=PARENT_KEYS + [EVENT_TS_COL])
-        for k in PARENT_KEYS:
-            df = df[df[k] != ""]
-
-        payload_cols = [c for c in df.columns if c not in PARENT_KEYS]
-
-        sat = df[PARENT_KEYS + payload_cols].copy()
-
-        sat["load_dts"] = load_dts
-        sat["record_source"] = src
-        sat["source_file_checksum"] = sha256_of_file(fp)
-
+        sat, reason = read_part(fp, checksum, load_dts)
+        files[fp.name] = checksum
+        if sat is None:
+            skipped.append((fp.name, reason))
+            continue
         parts.append(sat)
 
     if not parts:
-        print("No satellite data created. All files were skipped.")
-        if skipped:
-            print("\nSkipped files:")
-            for name, reason in skipped[:20]:
-                print(f"- {name}: {reason}")
+        if full_build:
+            print("No satellite data created. All files were skipped.")
+        else:
+            print("No new or changed source files.")
+            save_state(files, latest)
+        print_skipped(skipped)
         return
 
-    sat_all = pd.concat(parts, ignore_index=True).drop_duplicates()
-    sat_all.to_csv(OUT_SAT, index=False)
+    delta = pd.concat(parts, ignore_index=True)
+    if full_build:
+        changed, latest = distinct_rows(delta)
+    else:
+        changed, latest = detect_changes(delta, latest)
 
-    print(f"Saved satellite: {OUT_SAT}")
-    print("Rows:", len(sat_all))
-    print("Columns:", len(sat_all.columns))
+    # a full build replaces the dataset, an incremental run adds files for this load
+    write_vault_table(changed, OUT_SAT, append=not full_build)
+    save_state(files, latest)
 
-    if skipped:
-        print("\n⚠️Skipped files (showing up to 20):")
-        for name, reason in skipped[:20]:
-            print(f"- {name}: {reason}")
+    print(f"Saved satellite: {OUT_SAT} ({'full build' if full_build else 'appended'})")
+    print("Source files read:", len(parts) + len(skipped))
+    print("Rows read:", len(delta))
+    print("Rows written:", len(changed))
+    print("Columns:", len(changed.columns))
 
-if __name__ == "__main__":
-    main()
+    print_skipped(skipped)
 
+if __name__ == "__main__":
+    run_main("build_sat_link_sensor_well_readings", main)
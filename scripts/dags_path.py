@@ -0,0 +1,13 @@
+"""
+Puts the DAG package (dags/raw_vault) on sys.path for the scripts that reuse
+its loaders, rules and schema helpers. Import it before raw_vault:
+
+    import dags_path  # noqa: F401
+    from raw_vault.bulk import copy_binary
+"""
+import sys
+from pathlib import Path
+
+DAGS_DIR = Path(__file__).resolve().parents[1] / "dags"
+if str(DAGS_DIR) not in sys.path:
+    sys.path.insert(0, str(DAGS_DIR))
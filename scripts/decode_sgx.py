@@ -1,17 +1,147 @@
 #!/usr/bin/env python3
 import argparse
 import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
+from typing import Iterator
 
+import numpy as np
 import pyarrow as pa
 import pyarrow.parquet as pq
 
-HEADER_STRUCT = struct.Struct("<8sII") 
-RECORD_STRUCT = struct.Struct("<IffB") 
+from vault_profile import profile_worker, run_main
+
+HEADER_STRUCT = struct.Struct("<8sII")
+RECORD_STRUCT = struct.Struct("<IffB")
 MAGIC = b"CPETRO01"
 
+DEFAULT_BATCH_SIZE = 262_144
+DEFAULT_ROW_GROUP_SIZE = 1_048_576
+
+# Same layout as RECORD_STRUCT: packed (no padding), little-endian, 13 bytes per trace.
+RECORD_DTYPE = np.dtype(
+    [
+        ("well_id", "<u4"),
+        ("depth_ft", "<f4"),
+        ("amplitude", "<f4"),
+        ("quality_flag", "u1"),
+    ]
+)
+assert RECORD_DTYPE.itemsize == RECORD_STRUCT.size
+
+# Output column types of the original list-based decoder (Python int / float).
+COLUMN_TYPES = {
+    "well_id": np.int64,
+    "depth_ft": np.float64,
+    "amplitude": np.float64,
+    "quality_flag": np.int64,
+}
+
+
+def read_header(path: Path) -> tuple[int, int]:
+    """
+    Validate magic and file size, return (survey_type_id, trace_count).
+    """
+    file_size = path.stat().st_size
+    if file_size < HEADER_STRUCT.size:
+        raise ValueError("File too small")
+
+    with path.open("rb") as f:
+        head = f.read(HEADER_STRUCT.size)
+
+    magic, survey_type_id, trace_count = HEADER_STRUCT.unpack(head)
+    if magic != MAGIC:
+        raise ValueError(f"Bad magic: {magic!r}")
+
+    expected = HEADER_STRUCT.size + trace_count * RECORD_STRUCT.size
+    if file_size != expected:
+        raise ValueError(f"Size mismatch: got {file_size}, expected {expected}")
+
+    return survey_type_id, trace_count
+
+
+def map_records(path: Path, trace_count: int, start: int = 0, count: int | None = None) -> np.ndarray:
+    """
+    Memory-map trace records [start, start + count) as a structured array (no copy).
+    """
+    if count is None:
+        count = trace_count - start
+    if count <= 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+
+    offset = HEADER_STRUCT.size + start * RECORD_DTYPE.itemsize
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=offset, shape=(count,))
+
+
+def records_to_table(records: np.ndarray, survey_type_id: int) -> pa.Table:
+    columns = {"survey_type_id": pa.array(np.full(len(records), survey_type_id, dtype=np.int64))}
+    for name, dtype in COLUMN_TYPES.items():
+        columns[name] = pa.array(records[name].astype(dtype))
+    return pa.table(columns)
+
 
 def decode_one(path: Path) -> pa.Table:
+    survey_type_id, trace_count = read_header(path)
+    records = map_records(path, trace_count)
+    return records_to_table(records, survey_type_id)
+
+
+def decode_batches(path: Path, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[pa.Table]:
+    """
+    Decoded tables of at most batch_size records each, read through the memory map.
+    """
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+    survey_type_id, trace_count = read_header(path)
+    for start in range(0, trace_count, batch_size):
+        records = map_records(path, trace_count, start, min(batch_size, trace_count - start))
+        yield records_to_table(records, survey_type_id)
+
+
+def decode_one_streaming(
+    path: Path,
+    dst: Path,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> int:
+    """
+    Decode `path` into `dst` batch by batch through a ParquetWriter.
+    Peak memory is bounded by batch_size + row_group_size records, not trace_count.
+    Returns the number of rows written.
+    """
+    if batch_size <= 0 or row_group_size <= 0:
+        raise ValueError("batch_size and row_group_size must be positive")
+
+    survey_type_id, trace_count = read_header(path)
+    schema = records_to_table(map_records(path, 0), survey_type_id).schema
+
+    pending = []
+    pending_rows = 0
+    with pq.ParquetWriter(dst, schema) as writer:
+        for batch in decode_batches(path, batch_size):
+            pending.append(batch)
+            pending_rows += batch.num_rows
+
+            if pending_rows >= row_group_size:
+                buffered = pa.concat_tables(pending)
+                full = (pending_rows // row_group_size) * row_group_size
+                writer.write_table(buffered.slice(0, full), row_group_size=row_group_size)
+                rest = buffered.slice(full)
+                pending = [rest] if rest.num_rows else []
+                pending_rows = rest.num_rows
+
+        if pending_rows:
+            writer.write_table(pa.concat_tables(pending), row_group_size=row_group_size)
+
+    return trace_count
+
+
+def decode_one_loop(path: Path) -> pa.Table:
+    """
+    Reference per-record decoder, kept for benchmarks and output comparison.
+    """
     data = path.read_bytes()
     if len(data) < HEADER_STRUCT.size:
         raise ValueError("File too small")
@@ -49,35 +179,101 @@ def decode_one(path: Path) -> pa.Table:
     )
 
 
+def output_path(src: Path, data_dir: Path, out_dir: Path) -> Path:
+    rel = src.relative_to(data_dir)
+    # Keep filenames safe (avoid nested folders issues)
+    safe_base = rel.as_posix().replace("/", "_")
+    safe_stem = Path(safe_base).stem
+    return out_dir / f"{safe_stem}_decoded.parquet"
+
+
+@profile_worker("decode_sgx")
+def decode_file(
+    src: Path,
+    data_dir: Path,
+    out_dir: Path,
+    stream: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> dict:
+    """
+    Decode one file to parquet. Never raises: failures are returned in "error"
+    so one bad file cannot take down the others (safe to run in a worker process).
+    """
+    dst = output_path(src, data_dir, out_dir)
+    result = {
+        "file": src.relative_to(data_dir).as_posix(),
+        "dst": dst.name,
+        "rows": 0,
+        "bytes": 0,
+        "seconds": 0.0,
+        "error": None,
+    }
+    t0 = time.perf_counter()
+    try:
+        result["bytes"] = src.stat().st_size
+        if stream:
+            result["rows"] = decode_one_streaming(src, dst, batch_size, row_group_size)
+        else:
+            table = decode_one(src)
+            pq.write_table(table, dst)
+            result["rows"] = table.num_rows
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - t0
+    return result
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--data-dir", required=True)
     ap.add_argument("--out-dir", default="processed_data/sgx_parquet")
+    ap.add_argument("--stream", action="store_true", help="Write row groups batch by batch (bounded memory)")
+    ap.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Trace records read per batch")
+    ap.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE, help="Rows per parquet row group")
+    ap.add_argument("--workers", type=int, default=1, help="Decode files in N worker processes")
     args = ap.parse_args()
 
     data_dir = Path(args.data_dir).resolve()
     out_dir = Path(args.out_dir).resolve()
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    sgx_files = list(data_dir.rglob("*.sgx"))
+    sgx_files = sorted(data_dir.rglob("*.sgx"))
     if not sgx_files:
         print(f"No .sgx files found under {data_dir}")
         return
 
-    for src in sgx_files:
-        rel = src.relative_to(data_dir)
-        try:
-            table = decode_one(src)
-            # Keep filenames safe (avoid nested folders issues)
-            safe_base = rel.as_posix().replace("/", "_")
-            safe_stem = Path(safe_base).stem
-            dst = out_dir / f"{safe_stem}_decoded.parquet"
-            pq.write_table(table, dst)
-            print(f"{rel} -> {dst.name}")
-        except Exception as e:
-            print(f"{rel}: {e}")
+    work = partial(
+        decode_file,
+        data_dir=data_dir,
+        out_dir=out_dir,
+        stream=args.stream,
+        batch_size=args.batch_size,
+        row_group_size=args.row_group_size,
+    )
 
+    t0 = time.perf_counter()
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(work, sgx_files))
+    else:
+        results = [work(src) for src in sgx_files]
+    elapsed = time.perf_counter() - t0
 
-if __name__ == "__main__":
-    main()
+    for r in results:
+        if r["error"]:
+            print(f"{r['file']}: {r['error']}")
+        else:
+            print(f"{r['file']} -> {r['dst']} ({r['rows']} rows, {r['seconds']:.2f}s)")
+
+    ok = [r for r in results if not r["error"]]
+    total_rows = sum(r["rows"] for r in ok)
+    total_mb = sum(r["bytes"] for r in ok) / 1e6
+    print(
+        f"\nDecoded {len(ok)}/{len(results)} files, {total_rows} rows, "
+        f"{total_mb:.1f} MB in {elapsed:.2f}s (workers={max(args.workers, 1)})"
+    )
 
+
+if __name__ == "__main__":
+    run_main("decode_sgx", main)
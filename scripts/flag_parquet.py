@@ -3,6 +3,10 @@ import argparse
 import re
 from pathlib import Path
 
+from recover_parquet import read_trailing_junk
+from vault_profile import run_main
+
+
 PRINTABLE_RE = re.compile(rb"[ -~]{6,}") 
 
 
@@ -29,12 +33,7 @@ def main():
     found = []
 
     for p in parquet_files:
-        data = p.read_bytes()
-        last_par1 = data.rfind(b"PAR1")
-        if last_par1 == -1:
-            continue
-
-        junk = data[last_par1 + 4 :]
+        junk = read_trailing_junk(p)
         if not junk:
             continue
 
@@ -53,5 +52,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    run_main("flag_parquet", main)
 
@@ -1,19 +1,58 @@
 #!/usr/bin/env python3
-
+"""
+Load a satellite CSV (the format the vault builders wrote before the Parquet
+vault) into PostgreSQL with the same column types and binary COPY as
+load_vault_to_postgres.py, which loads the current Parquet vault.
+"""
 import csv
 import argparse
 from pathlib import Path
+
+import pandas as pd
 import psycopg2
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+import dags_path  # noqa: F401
+from load_vault_to_postgres import SESSION_OPTIONS
+from raw_vault.bulk import copy_binary, create_table_sql, quote_ident
+from raw_vault.schema import satellite_arrow_schema
+from vault_profile import run_main
+
+CSV_BLOCK_BYTES = 16 << 20
+
+
+def csv_reader(csv_path: Path) -> pa.RecordBatchReader:
+    """
+    The CSV as Arrow batches: the satellite columns with their SAT_COLUMNS
+    types, every other column (hash keys, hashdiff, checksums) as text.
+    Timestamps with or without an offset are read, naive ones as UTC.
+    """
+    with csv_path.open("r", newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f))
+    schema = satellite_arrow_schema(pa.schema([(c, pa.string()) for c in header]))
+
+    raw = pacsv.open_csv(
+        csv_path,
+        read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_BYTES),
+        convert_options=pacsv.ConvertOptions(column_types={c: pa.string() for c in header}, strings_can_be_null=True),
+    )
+
+    def column(col: pa.Array, t: pa.DataType) -> pa.Array:
+        if pa.types.is_timestamp(t):
+            return pa.array(pd.to_datetime(col.to_pandas(), utc=True, format="ISO8601"), type=t)
+        if pa.types.is_integer(t):
+            # pandas-written CSVs have 1.0 for ints of columns with nulls
+            return pc.cast(pc.cast(col, pa.float64()), t)
+        return pc.cast(col, t)
+
+    def batches():
+        for batch in raw:
+            yield pa.RecordBatch.from_arrays([column(c, f.type) for c, f in zip(batch.columns, schema)], schema=schema)
 
-def quote_ident(name: str) -> str:
-    return '"' + name.replace('"', '""') + '"'
+    return pa.RecordBatchReader.from_batches(schema, batches())
 
-def infer_type(col: str) -> str:
-    c = col.lower()
-    # Treat common datetime columns as timestamptz
-    if c in {"load_dts", "timestamp"} or c.endswith("_dts"):
-        return "timestamptz"
-    return "text"
 
 def main():
     ap = argparse.ArgumentParser(description="Create table from satellite CSV header and load via COPY.")
@@ -28,39 +67,21 @@ def main():
     if not csv_path.exists():
         raise FileNotFoundError(f"CSV not found: {csv_path}")
 
-    # Read header
-    with csv_path.open("r", newline="", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        header = next(reader)
-
-    schema_q = quote_ident(args.schema)
-    table_q = quote_ident(args.table)
-    full_name = f"{schema_q}.{table_q}"
-
-    col_defs = ",\n  ".join(f"{quote_ident(c)} {infer_type(c)}" for c in header)
-    create_sql = f"CREATE TABLE IF NOT EXISTS {full_name} (\n  {col_defs}\n);"
-
-    conn = psycopg2.connect(args.dsn)
-    conn.autocommit = True
-    cur = conn.cursor()
-
-    cur.execute(f"CREATE SCHEMA IF NOT EXISTS {schema_q};")
-    cur.execute(create_sql)
+    reader = csv_reader(csv_path)
+    full_name = f"{quote_ident(args.schema)}.{quote_ident(args.table)}"
 
-    if args.truncate:
-        cur.execute(f"TRUNCATE TABLE {full_name};")
+    conn = psycopg2.connect(args.dsn, options=SESSION_OPTIONS)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {quote_ident(args.schema)};")
+            cur.execute(create_table_sql(full_name, reader.schema))
+            if args.truncate:
+                cur.execute(f"TRUNCATE TABLE {full_name};")
+            rows = copy_binary(cur, full_name, reader)
+    finally:
+        conn.close()
 
-    cols_list = ", ".join(quote_ident(c) for c in header)
-    copy_sql = f"COPY {full_name} ({cols_list}) FROM STDIN WITH (FORMAT csv, HEADER true);"
-
-    with csv_path.open("r", encoding="utf-8") as f:
-        cur.copy_expert(copy_sql, f)
-
-    cur.close()
-    conn.close()
-
-    print(f"Loaded {csv_path} into {args.schema}.{args.table}")
+    print(f"Loaded {csv_path} into {args.schema}.{args.table} ({rows} rows)")
 
 if __name__ == "__main__":
-    main()
-
+    run_main("load_satellite_csv_to_postgres", main)
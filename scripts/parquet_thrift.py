@@ -0,0 +1,196 @@
+"""
+Minimal Thrift compact-protocol codec, enough to read and rewrite parquet
+page headers and footers (FileMetaData) without a thrift dependency.
+
+Structs decode to {field_id: (type, value)} so they can be re-encoded unchanged:
+- lists/sets are (element_type, [values])
+- maps are (key_type, value_type, [(k, v), ...])
+- booleans are (TRUE, bool)
+"""
+import struct
+
+STOP, TRUE, FALSE, BYTE, I16, I32, I64, DOUBLE, BINARY, LIST, SET, MAP, STRUCT = range(13)
+INT_TYPES = (I16, I32, I64)
+
+MAX_DEPTH = 32
+
+
+class ThriftError(ValueError):
+    pass
+
+
+class CompactReader:
+    def __init__(self, buf, pos: int = 0, end: int | None = None):
+        self.buf = buf
+        self.pos = pos
+        self.end = len(buf) if end is None else end
+
+    def _byte(self) -> int:
+        if self.pos >= self.end:
+            raise ThriftError("unexpected end of data")
+        b = self.buf[self.pos]
+        self.pos += 1
+        return b
+
+    def _bytes(self, n: int) -> bytes:
+        if n < 0 or self.pos + n > self.end:
+            raise ThriftError("binary out of bounds")
+        b = bytes(self.buf[self.pos : self.pos + n])
+        self.pos += n
+        return b
+
+    def varint(self) -> int:
+        result = shift = 0
+        while True:
+            b = self._byte()
+            result |= (b & 0x7F) << shift
+            if not b & 0x80:
+                return result
+            shift += 7
+            if shift > 63:
+                raise ThriftError("varint too long")
+
+    def zigzag(self) -> int:
+        n = self.varint()
+        return (n >> 1) ^ -(n & 1)
+
+    def read_struct(self, depth: int = 0) -> dict:
+        if depth > MAX_DEPTH:
+            raise ThriftError("struct nesting too deep")
+        fields = {}
+        last = 0
+        while True:
+            header = self._byte()
+            if header == STOP:
+                return fields
+            ttype = header & 0x0F
+            delta = header >> 4
+            fid = last + delta if delta else self.zigzag()
+            last = fid
+            if ttype in (TRUE, FALSE):
+                fields[fid] = (TRUE, ttype == TRUE)
+            else:
+                fields[fid] = (ttype, self.read_value(ttype, depth + 1))
+
+    def read_value(self, ttype: int, depth: int):
+        if ttype == BYTE:
+            b = self._byte()
+            return b - 256 if b > 127 else b
+        if ttype in INT_TYPES:
+            return self.zigzag()
+        if ttype == DOUBLE:
+            return struct.unpack("<d", self._bytes(8))[0]
+        if ttype == BINARY:
+            return self._bytes(self.varint())
+        if ttype in (LIST, SET):
+            header = self._byte()
+            size, etype = header >> 4, header & 0x0F
+            if size == 15:
+                size = self.varint()
+            # every element takes at least one byte: cheap guard against garbage sizes
+            if size > self.end - self.pos:
+                raise ThriftError("list size out of bounds")
+            if etype in (TRUE, FALSE):
+                return (TRUE, [self._byte() == TRUE for _ in range(size)])
+            return (etype, [self.read_value(etype, depth + 1) for _ in range(size)])
+        if ttype == MAP:
+            size = self.varint()
+            if size == 0:
+                return (STOP, STOP, [])
+            if 2 * size > self.end - self.pos:
+                raise ThriftError("map size out of bounds")
+            kv = self._byte()
+            ktype, vtype = kv >> 4, kv & 0x0F
+            items = [(self.read_value(ktype, depth + 1), self.read_value(vtype, depth + 1)) for _ in range(size)]
+            return (ktype, vtype, items)
+        if ttype == STRUCT:
+            return self.read_struct(depth)
+        raise ThriftError(f"unknown thrift type {ttype}")
+
+
+class CompactWriter:
+    def __init__(self):
+        self.out = bytearray()
+
+    def varint(self, n: int) -> None:
+        while n >= 0x80:
+            self.out.append((n & 0x7F) | 0x80)
+            n >>= 7
+        self.out.append(n)
+
+    def zigzag(self, n: int) -> None:
+        self.varint((n << 1) ^ (n >> 63))
+
+    def write_struct(self, fields: dict) -> None:
+        last = 0
+        for fid in sorted(fields):
+            ttype, value = fields[fid]
+            if ttype in (TRUE, FALSE):
+                ttype = TRUE if value else FALSE
+            delta = fid - last
+            if 0 < delta <= 15:
+                self.out.append((delta << 4) | ttype)
+            else:
+                self.out.append(ttype)
+                self.zigzag(fid)
+            last = fid
+            if ttype not in (TRUE, FALSE):
+                self.write_value(ttype, value)
+        self.out.append(STOP)
+
+    def write_value(self, ttype: int, value) -> None:
+        if ttype == BYTE:
+            self.out.append(value & 0xFF)
+        elif ttype in INT_TYPES:
+            self.zigzag(value)
+        elif ttype == DOUBLE:
+            self.out += struct.pack("<d", value)
+        elif ttype == BINARY:
+            self.varint(len(value))
+            self.out += value
+        elif ttype in (LIST, SET):
+            etype, items = value
+            if len(items) < 15:
+                self.out.append((len(items) << 4) | etype)
+            else:
+                self.out.append(0xF0 | etype)
+                self.varint(len(items))
+            for item in items:
+                if etype in (TRUE, FALSE):
+                    self.out.append(TRUE if item else FALSE)
+                else:
+                    self.write_value(etype, item)
+        elif ttype == MAP:
+            ktype, vtype, items = value
+            self.varint(len(items))
+            if items:
+                self.out.append((ktype << 4) | vtype)
+                for k, v in items:
+                    self.write_value(ktype, k)
+                    self.write_value(vtype, v)
+        elif ttype == STRUCT:
+            self.write_struct(value)
+        else:
+            raise ThriftError(f"unknown thrift type {ttype}")
+
+
+def read_struct_at(buf, pos: int = 0, end: int | None = None) -> tuple[dict, int]:
+    """
+    Decode one struct starting at `pos`. Returns (fields, position after the struct).
+    """
+    reader = CompactReader(buf, pos, end)
+    return reader.read_struct(), reader.pos
+
+
+def encode_struct(fields: dict) -> bytes:
+    writer = CompactWriter()
+    writer.write_struct(fields)
+    return bytes(writer.out)
+
+
+def int_field(fields: dict, fid: int) -> int | None:
+    """
+    Value of an integer field, or None if it is absent or has another type.
+    """
+    ttype, value = fields.get(fid, (None, None))
+    return value if ttype in INT_TYPES else None
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Summarize the profiles written by vault_profile.py (scripts) and
+raw_vault.profiling (DAG tasks) under RAW_VAULT_PROFILE=1 or --profile: the hottest functions across all matching runs (worker processes
+included), plus wall time, peak traced memory and Arrow memory pool peak per
+run and the largest allocation sites.
+
+    python scripts/profile_summary.py --name decode_sgx --sort tottime --top 30
+"""
+import argparse
+import json
+import pstats
+from collections import defaultdict
+from pathlib import Path
+
+from vault_profile import PROFILE_DIR
+
+SORT_KEYS = ("cumtime", "tottime", "calls")
+
+
+def _function_label(func: tuple) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        return name  # builtins
+    parts = Path(filename).parts
+    return f"{'/'.join(parts[-2:])}:{lineno}({name})"
+
+
+def hottest_functions(profiles: list[Path]) -> list[dict]:
+    """
+    Per function, summed over the profiles: calls, own time, cumulative time
+    and the number of runs it appears in.
+    """
+    totals = defaultdict(lambda: {"calls": 0, "tottime": 0.0, "cumtime": 0.0, "runs": 0})
+    for path in profiles:
+        for func, (_, ncalls, tottime, cumtime, _) in pstats.Stats(str(path)).stats.items():
+            t = totals[func]
+            t["calls"] += ncalls
+            t["tottime"] += tottime
+            t["cumtime"] += cumtime
+            t["runs"] += 1
+    return [{"function": _function_label(f), **t} for f, t in totals.items()]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Summarize raw vault profiles across runs.")
+    ap.add_argument("--dir", default=str(PROFILE_DIR), help="Profile directory (RAW_VAULT_PROFILE_DIR)")
+    ap.add_argument("--name", help="Only profiles of this script / task (e.g. decode_sgx, t_process)")
+    ap.add_argument("--run", help="Only profiles whose run id contains this string")
+    ap.add_argument("--sort", choices=SORT_KEYS, default="cumtime")
+    ap.add_argument("--top", type=int, default=25)
+    args = ap.parse_args()
+
+    profile_dir = Path(args.dir)
+    profiles = sorted(profile_dir.glob(f"{args.name or '*'}__*.prof"))
+    if args.run:
+        profiles = [p for p in profiles if args.run in p.stem.split("__")[1]]
+    if not profiles:
+        print(f"No profiles found under {profile_dir}")
+        return
+
+    print(f"{'run':<70} {'status':>7} {'calls':>6} {'seconds':>9} {'peak MB':>9} {'arrow MB':>9}")
+    sites = defaultdict(int)
+    for p in profiles:
+        meta_path = p.with_suffix(".json")
+        if not meta_path.exists():
+            print(f"{p.stem:<70} {'?':>7}")
+            continue
+        meta = json.loads(meta_path.read_text())
+        # calls: worker processes (profile_worker) write one profile over all their calls
+        arrow = meta.get("arrow_peak_bytes")
+        print(f"{p.stem:<70} {meta['status']:>7} {meta.get('calls', ''):>6} {meta['seconds']:>9.2f} "
+              f"{meta['peak_bytes'] / 1e6:>9.1f} {'?' if arrow is None else f'{arrow / 1e6:.1f}':>9}")
+        for s in meta["top_allocations"]:
+            sites[s["site"]] = max(sites[s["site"]], s["bytes"])
+
+    rows = sorted(hottest_functions(profiles), key=lambda r: r[args.sort], reverse=True)[: args.top]
+    print(f"\nHottest functions over {len(profiles)} run(s), by {args.sort}:")
+    print(f"{'cumtime':>10} {'tottime':>10} {'calls':>12} {'runs':>5}  function")
+    for r in rows:
+        print(f"{r['cumtime']:>10.3f} {r['tottime']:>10.3f} {r['calls']:>12} {r['runs']:>5}  {r['function']}")
+
+    if sites:
+        print("\nLargest allocation sites (max over runs, held at the end of the run):")
+        for site, size in sorted(sites.items(), key=lambda kv: kv[1], reverse=True)[: args.top]:
+            print(f"{size / 1e6:>10.2f} MB  {site}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,23 @@
 #!/usr/bin/env python3
 import argparse
+import json
+import mmap
+import os
 import shutil
 from pathlib import Path
+from typing import Iterator
 
+import pyarrow as pa
 import pyarrow.parquet as pq
 
+import parquet_thrift as pt
+from vault_profile import run_main
+
+MAGIC = b"PAR1"
+# Smallest possible parquet file: leading magic + 4-byte footer length + trailing magic.
+MIN_FILE_SIZE = 12
+COPY_CHUNK = 8 * 1024 * 1024
+
 
 def is_readable_parquet(path: Path) -> bool:
     try:
@@ -14,24 +27,534 @@ def is_readable_parquet(path: Path) -> bool:
         return False
 
 
-def recover_one(src: Path, dst: Path) -> bool:
-    data = src.read_bytes()
-    last_par1 = data.rfind(b"PAR1")
-    if last_par1 == -1:
+def iter_footer_ends(path: Path) -> Iterator[int]:
+    """
+    Scan backward from EOF through an mmap and yield candidate file lengths:
+    positions just after a PAR1 whose preceding footer-length field fits in the file.
+    Only the tail pages that are actually scanned get read from disk.
+    """
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size < MIN_FILE_SIZE:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # the leading magic is not checked: readers only need the footer
+            pos = mm.rfind(MAGIC, 4)
+            while pos >= 8:
+                footer_len = int.from_bytes(mm[pos - 4 : pos], "little")
+                # footer must sit between the leading magic and the length field
+                if 0 < footer_len <= pos - 8:
+                    yield pos + 4
+                pos = mm.rfind(MAGIC, 4, pos + 3)
+
+
+def footer_is_valid(path: Path, end: int) -> bool:
+    """
+    Parse the footer of path[:end] without copying the file (zero-copy mmap slice).
+    """
+    try:
+        with pa.memory_map(str(path)) as f:
+            pq.read_metadata(pa.BufferReader(f.read_buffer(end)))
+        return True
+    except Exception:
         return False
 
-    clean = data[: last_par1 + 4]
+
+def find_footer_end(path: Path) -> int | None:
+    """
+    Length of the longest valid parquet prefix of `path`, or None.
+    """
+    for end in iter_footer_ends(path):
+        if footer_is_valid(path, end):
+            return end
+    return None
+
+
+def open_recovered(path: Path) -> pq.ParquetFile | None:
+    """
+    The readable part of `path` as a ParquetFile, read in place: the file itself
+    if readable, else its longest valid prefix (a zero-copy mmap slice). None if
+    nothing is recoverable.
+    """
+    if is_readable_parquet(path):
+        return pq.ParquetFile(str(path))
+    end = find_footer_end(path)
+    if end is None:
+        return None
+    with pa.memory_map(str(path)) as source:
+        # the buffer keeps the mapped region alive after the file is closed
+        buf = source.read_buffer(end)
+    return pq.ParquetFile(pa.BufferReader(buf))
+
+
+def read_trailing_junk(path: Path) -> bytes:
+    """
+    Bytes after the valid footer (or after the last PAR1 if no footer validates).
+    Only the tail of the file is read.
+    """
+    end = find_footer_end(path)
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if end is None:
+                last_par1 = mm.rfind(MAGIC)
+                if last_par1 == -1:
+                    return b""
+                end = last_par1 + 4
+            return mm[end:]
+
+
+def copy_prefix(src: Path, dst: Path, length: int) -> None:
+    """
+    Copy the first `length` bytes of src to dst. copy_file_range keeps the copy
+    in the kernel (and reflinks on filesystems that support it, e.g. btrfs/XFS);
+    falls back to a chunked copy elsewhere.
+    """
+    with src.open("rb") as fin, dst.open("wb") as fout:
+        copied = 0
+        try:
+            while copied < length:
+                n = os.copy_file_range(fin.fileno(), fout.fileno(), length - copied, copied, copied)
+                if n == 0:
+                    break
+                copied += n
+        except (AttributeError, OSError):
+            pass
+
+        fin.seek(copied)
+        fout.seek(copied)
+        while copied < length:
+            chunk = fin.read(min(COPY_CHUNK, length - copied))
+            if not chunk:
+                break
+            fout.write(chunk)
+            copied += len(chunk)
+        fout.truncate(copied)
+
+
+def recover_one(src: Path, dst: Path) -> bool:
+    end = find_footer_end(src)
+    if end is None:
+        return False
 
     dst.parent.mkdir(parents=True, exist_ok=True)
-    dst.write_bytes(clean)
+    copy_prefix(src, dst, end)
 
     return is_readable_parquet(dst)
 
 
+# Deep salvage: keep intact row groups when the footer or a row group is damaged.
+# Only thrift page headers are decoded; page payloads are never read.
+
+PAGE_DATA, PAGE_INDEX, PAGE_DICTIONARY, PAGE_DATA_V2 = 0, 1, 2, 3
+# PageHeader field holding the type-specific header for each page type
+PAGE_SUBHEADER = {PAGE_DATA: 5, PAGE_DICTIONARY: 7, PAGE_DATA_V2: 8}
+ENCODING_RLE = 3
+CODEC_UNCOMPRESSED = 0
+REPEATED = 2
+MAX_PAGE_HEADER = 1024 * 1024
+# Every PageHeader starts with field 1 (type, i32): compact field header 0x15
+PAGE_HEADER_LEAD = b"\x15"
+
+
+def read_page_header(mm, pos: int, limit: int) -> dict | None:
+    """
+    Parse a parquet PageHeader at `pos`; None if the bytes there are not a plausible header.
+    """
+    try:
+        fields, header_end = pt.read_struct_at(mm, pos, min(limit, pos + MAX_PAGE_HEADER))
+    except pt.ThriftError:
+        return None
+
+    page_type = pt.int_field(fields, 1)
+    uncompressed = pt.int_field(fields, 2)
+    compressed = pt.int_field(fields, 3)
+    if page_type not in PAGE_SUBHEADER or uncompressed is None or compressed is None:
+        return None
+    if uncompressed < 0 or compressed < 0 or header_end + compressed > limit:
+        return None
+
+    sub_type, sub = fields.get(PAGE_SUBHEADER[page_type], (None, None))
+    if sub_type != pt.STRUCT:
+        return None
+    num_values = pt.int_field(sub, 1)
+    if num_values is None or num_values < 0:
+        return None
+
+    if page_type == PAGE_DATA:
+        encodings = {pt.int_field(sub, fid) for fid in (2, 3, 4)}
+    elif page_type == PAGE_DICTIONARY:
+        encodings = {pt.int_field(sub, 2)}
+    else:
+        encodings = {pt.int_field(sub, 4), ENCODING_RLE}
+    encodings.discard(None)
+
+    header_size = header_end - pos
+    return {
+        "offset": pos,
+        "end": header_end + compressed,
+        "type": page_type,
+        "num_values": num_values if page_type != PAGE_DICTIONARY else 0,
+        "compressed_size": header_size + compressed,
+        "uncompressed_size": header_size + uncompressed,
+        "encodings": encodings,
+    }
+
+
+def read_footer(path: Path, end: int) -> dict:
+    """
+    Decode the raw FileMetaData of path[:end] (end = position after the trailing PAR1).
+    """
+    with path.open("rb") as f:
+        f.seek(end - 8)
+        footer_len = int.from_bytes(f.read(4), "little")
+        f.seek(end - 8 - footer_len)
+        footer = f.read(footer_len)
+    fields, _ = pt.read_struct_at(footer)
+    return fields
+
+
+def check_column_chunk(mm, meta: dict, file_end: int) -> str | None:
+    """
+    Walk the page headers of one column chunk. Returns None if intact, else the reason.
+    """
+    start = pt.int_field(meta, 11) or pt.int_field(meta, 9)
+    total = pt.int_field(meta, 7)
+    expected_values = pt.int_field(meta, 5)
+    if start is None or total is None or expected_values is None:
+        return "column metadata incomplete"
+
+    chunk_end = start + total
+    if start < 4 or chunk_end > file_end:
+        return "column chunk outside file"
+
+    pos = start
+    values = 0
+    while pos < chunk_end:
+        page = read_page_header(mm, pos, chunk_end)
+        if page is None:
+            return f"bad page header at offset {pos}"
+        values += page["num_values"]
+        pos = page["end"]
+
+    if values != expected_values:
+        return f"page value count {values} != column num_values {expected_values}"
+    return None
+
+
+def scan_column_chunks(mm, start: int, file_end: int, codec: int) -> tuple[list[dict], list[list[int]]]:
+    """
+    Scan [start, file_end) for runs of consecutive page headers.
+    A dictionary page (or resync after garbage) starts a new column chunk.
+    Returns (chunks, unparsed byte ranges).
+    """
+    chunks = []
+    skipped = []
+    current = None
+    synced = True
+    pos = start
+
+    while pos < file_end:
+        page = read_page_header(mm, pos, file_end)
+        if page is not None and codec == CODEC_UNCOMPRESSED and page["compressed_size"] != page["uncompressed_size"]:
+            page = None
+        # after garbage, require a second header right behind the first before trusting it
+        if page is not None and not synced and page["end"] < file_end:
+            if read_page_header(mm, page["end"], file_end) is None:
+                page = None
+
+        if page is None:
+            current = None
+            synced = False
+            nxt = mm.find(PAGE_HEADER_LEAD, pos + 1, file_end)
+            nxt = file_end if nxt == -1 else nxt
+            if skipped and skipped[-1][1] == pos:
+                skipped[-1][1] = nxt
+            else:
+                skipped.append([pos, nxt])
+            pos = nxt
+            continue
+
+        if current is None or page["type"] == PAGE_DICTIONARY:
+            current = {"pages": [], "dictionary_page_offset": None, "data_page_offset": None}
+            chunks.append(current)
+        if page["type"] == PAGE_DICTIONARY:
+            current["dictionary_page_offset"] = page["offset"]
+        elif current["data_page_offset"] is None:
+            current["data_page_offset"] = page["offset"]
+        current["pages"].append(page)
+        synced = True
+        pos = page["end"]
+
+    for c in chunks:
+        c["offset"] = c["pages"][0]["offset"]
+        c["end"] = c["pages"][-1]["end"]
+        c["num_values"] = sum(p["num_values"] for p in c["pages"])
+    return chunks, skipped
+
+
+def split_segments(chunks: list[dict]) -> list[list[dict]]:
+    """
+    Group chunks into runs that are back to back in the file (no damaged bytes between).
+    """
+    segments = []
+    for c in chunks:
+        if segments and segments[-1][-1]["end"] == c["offset"]:
+            segments[-1].append(c)
+        else:
+            segments.append([c])
+    return segments
+
+
+def segment_alignment(segment: list[dict], leaves: list[dict], is_last: bool) -> int | None:
+    """
+    Column index of the segment's first chunk, or None if it cannot be told apart.
+
+    Page headers carry no column identity, so: a segment starting right after the
+    leading magic starts at column 0; the last segment is anchored on the end of
+    the data (its last chunk is the last column); otherwise the dictionary-page
+    pattern of the schema must leave exactly one possibility.
+    """
+    n = len(leaves)
+    if segment[0]["offset"] == 4:
+        return 0
+
+    def fits(a: int) -> bool:
+        for k, c in enumerate(segment):
+            has_dict = c["dictionary_page_offset"] is not None
+            expected = leaves[(a + k) % n]["has_dict"]
+            # only the first chunk may have lost its head (dictionary page) to the damage
+            if has_dict != expected and not (k == 0 and expected):
+                return False
+        return True
+
+    candidates = [a for a in range(n) if fits(a)]
+    if is_last:
+        a = (-len(segment)) % n
+        return a if a in candidates else None
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def lost_entry(row_group: int | None, offset: int | None, end: int | None, rows: int | None, reason: str) -> dict:
+    """
+    One row_groups_lost entry of the salvage report, the same in every mode:
+    row_group is the index in the source footer (None when scanning without
+    one), offset / end the byte range of its column chunks.
+    """
+    return {"row_group": row_group, "offset": offset, "end": end, "rows": rows, "reason": reason}
+
+
+def assemble_row_groups(chunks: list[dict], leaves: list[dict]) -> tuple[list[dict], list[dict]]:
+    """
+    Turn scanned column chunks into RowGroup structs. Returns (row_groups, lost).
+    """
+    n = len(leaves)
+    kept, lost = [], []
+
+    def drop(part: list[dict], reason: str) -> None:
+        if part:
+            lost.append(lost_entry(None, part[0]["offset"], part[-1]["end"], max(c["num_values"] for c in part), reason))
+
+    segments = split_segments(chunks)
+    for si, segment in enumerate(segments):
+        a = segment_alignment(segment, leaves, si == len(segments) - 1)
+        if a is None:
+            drop(segment, "cannot align column chunks after damaged bytes")
+            continue
+
+        first = (n - a) % n
+        drop(segment[:first], "partial row group next to damaged bytes")
+        for i in range(first, len(segment), n):
+            group = segment[i : i + n]
+            if len(group) < n:
+                drop(group, "partial row group next to damaged bytes")
+            elif len({c["num_values"] for c in group}) != 1:
+                drop(group, "column chunks disagree on row count")
+            elif any((c["dictionary_page_offset"] is not None) != leaf["has_dict"] for c, leaf in zip(group, leaves)):
+                drop(group, "dictionary pages do not match the schema")
+            else:
+                kept.append(build_row_group(group, leaves, len(kept)))
+    return kept, lost
+
+
+def build_row_group(chunks: list[dict], leaves: list[dict], ordinal: int) -> dict:
+    columns = []
+    for chunk, leaf in zip(chunks, leaves):
+        encodings = sorted(set().union(*(p["encodings"] for p in chunk["pages"])))
+        meta = {
+            1: (pt.I32, leaf["type"]),
+            2: (pt.LIST, (pt.I32, encodings)),
+            3: (pt.LIST, (pt.BINARY, leaf["path"])),
+            4: (pt.I32, leaf["codec"]),
+            5: (pt.I64, chunk["num_values"]),
+            6: (pt.I64, sum(p["uncompressed_size"] for p in chunk["pages"])),
+            7: (pt.I64, chunk["end"] - chunk["offset"]),
+            9: (pt.I64, chunk["data_page_offset"]),
+        }
+        if chunk["dictionary_page_offset"] is not None:
+            meta[11] = (pt.I64, chunk["dictionary_page_offset"])
+        columns.append({2: (pt.I64, chunk["offset"]), 3: (pt.STRUCT, meta)})
+
+    return {
+        1: (pt.LIST, (pt.STRUCT, columns)),
+        2: (pt.I64, sum(c[3][1][6][1] for c in columns)),
+        3: (pt.I64, chunks[0]["num_values"]),
+        5: (pt.I64, chunks[0]["offset"]),
+        6: (pt.I64, chunks[-1]["end"] - chunks[0]["offset"]),
+        7: (pt.I16, ordinal),
+    }
+
+
+def strip_row_group(rg: dict, ordinal: int) -> dict:
+    """
+    Keep an existing RowGroup but drop references to page indexes / bloom filters,
+    which may sit in the damaged area.
+    """
+    columns = []
+    for cc in rg[1][1][1]:
+        cc = {fid: v for fid, v in cc.items() if fid in (1, 2, 3)}
+        meta = {fid: v for fid, v in cc[3][1].items() if fid not in (14, 15)}
+        cc[3] = (pt.STRUCT, meta)
+        columns.append(cc)
+    rg = dict(rg)
+    rg[1] = (pt.LIST, (pt.STRUCT, columns))
+    rg[7] = (pt.I16, ordinal)
+    return rg
+
+
+def row_group_span(rg: dict) -> tuple[int, int]:
+    starts, ends = [], []
+    for cc in rg[1][1][1]:
+        meta = cc[3][1]
+        start = pt.int_field(meta, 11) or pt.int_field(meta, 9)
+        starts.append(start)
+        ends.append(start + pt.int_field(meta, 7))
+    return min(starts), max(ends)
+
+
+def footer_lost_entry(rg: dict, row_group: int | None, reason: str) -> dict:
+    try:
+        offset, end = row_group_span(rg)
+    except (KeyError, IndexError, TypeError, ValueError):
+        offset = end = None  # the chunk metadata itself is what is damaged
+    return lost_entry(row_group, offset, end, pt.int_field(rg, 3), reason)
+
+
+def write_salvaged(src: Path, dst: Path, footer: dict, row_groups: list[dict]) -> None:
+    footer = {fid: v for fid, v in footer.items() if fid not in (8, 9)}  # no encryption info
+    footer[3] = (pt.I64, sum(pt.int_field(rg, 3) for rg in row_groups))
+    footer[4] = (pt.LIST, (pt.STRUCT, [strip_row_group(rg, i) for i, rg in enumerate(row_groups)]))
+    data_end = max((row_group_span(rg)[1] for rg in row_groups), default=4)
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    copy_prefix(src, dst, data_end)
+    encoded = pt.encode_struct(footer)
+    with dst.open("r+b") as f:
+        f.write(MAGIC)
+        f.seek(0, os.SEEK_END)
+        f.write(encoded)
+        f.write(len(encoded).to_bytes(4, "little"))
+        f.write(MAGIC)
+
+
+def schema_leaves(footer: dict) -> list[dict]:
+    """
+    Leaf columns (type, path, codec, dictionary use) of a footer, taken from its first row group.
+    """
+    schema = footer[2][1][1]
+    if any(pt.int_field(el, 3) == REPEATED for el in schema[1:]):
+        raise ValueError("nested/repeated schemas need an intact footer to salvage")
+    row_groups = footer.get(4, (None, (None, [])))[1][1]
+    if not row_groups:
+        raise ValueError("schema source has no row groups to take column metadata from")
+    leaves = []
+    for cc in row_groups[0][1][1][1]:
+        meta = cc[3][1]
+        leaves.append({"type": meta[1][1], "path": meta[3][1][1], "codec": meta[4][1], "has_dict": 11 in meta})
+    return leaves
+
+
+def salvage_one(src: Path, dst: Path, schema_from: Path | None = None, verify: bool = False) -> dict:
+    """
+    Rebuild a readable parquet file from the intact row groups of a damaged one.
+
+    With a parseable footer, each row group's page headers are walked and
+    damaged row groups are dropped. Without one, the file is scanned for page
+    headers and row groups are re-assembled using the schema of `schema_from`
+    (a readable file written with the same schema and settings).
+    Returns a report of what was recovered and lost.
+    """
+    report = {"source": str(src), "output": str(dst), "row_groups_lost": [], "unparsed_byte_ranges": []}
+    footer_end = find_footer_end(src)
+
+    with src.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if footer_end is not None:
+            report["mode"] = "footer"
+            footer = read_footer(src, footer_end)
+            data_end = footer_end - 8 - int.from_bytes(mm[footer_end - 8 : footer_end - 4], "little")
+            kept, kept_index = [], []
+            for i, rg in enumerate(footer.get(4, (None, (None, [])))[1][1]):
+                reason = None
+                for cc in rg[1][1][1]:
+                    reason = check_column_chunk(mm, cc[3][1], data_end)
+                    if reason:
+                        break
+                if reason:
+                    report["row_groups_lost"].append(footer_lost_entry(rg, i, reason))
+                else:
+                    kept.append(rg)
+                    kept_index.append(i)
+        else:
+            report["mode"] = "scan"
+            if schema_from is None:
+                raise ValueError("footer is damaged; pass a schema source (--schema-from)")
+            ref_end = find_footer_end(schema_from)
+            if ref_end is None:
+                raise ValueError(f"schema source is not a readable parquet file: {schema_from}")
+            footer = read_footer(schema_from, ref_end)
+            leaves = schema_leaves(footer)
+            codec = leaves[0]["codec"] if len({leaf["codec"] for leaf in leaves}) == 1 else None
+
+            chunks, skipped = scan_column_chunks(mm, 4, len(mm), codec)
+            report["unparsed_byte_ranges"] = skipped
+
+            kept, lost = assemble_row_groups(chunks, leaves)
+            kept_index = [None] * len(kept)
+            report["row_groups_lost"] = lost
+
+    write_salvaged(src, dst, footer, kept)
+
+    if verify:
+        # optional full decode of every kept row group (reads page payloads)
+        pf = pq.ParquetFile(str(dst))
+        bad = []
+        for i in range(pf.metadata.num_row_groups):
+            try:
+                pf.read_row_group(i)
+            except Exception as e:
+                bad.append((i, str(e)))
+        if bad:
+            for i, err in bad:
+                report["row_groups_lost"].append(footer_lost_entry(kept[i], kept_index[i], f"payload: {err}"))
+            kept = [rg for i, rg in enumerate(kept) if i not in {b for b, _ in bad}]
+            write_salvaged(src, dst, footer, kept)
+
+    report["row_groups_recovered"] = len(kept)
+    report["rows_recovered"] = sum(pt.int_field(rg, 3) for rg in kept)
+    # without a footer the lost fragments of one row group cannot be told apart
+    report["rows_lost"] = (
+        sum(lost["rows"] or 0 for lost in report["row_groups_lost"]) if report["mode"] == "footer" else None
+    )
+    return report
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--data-dir", required=True)
     ap.add_argument("--out-dir", default="processed_data/parquet_recovered")
+    ap.add_argument("--salvage", action="store_true", help="Rebuild files with damaged row groups or footers")
+    ap.add_argument("--schema-from", help="Readable parquet file with the same schema (for damaged footers)")
+    ap.add_argument("--verify", action="store_true", help="Also decode salvaged row groups (reads payloads)")
     args = ap.parse_args()
 
     data_dir = Path(args.data_dir).resolve()
@@ -45,7 +568,19 @@ def main():
 
     for src in parquet_files:
         rel = src.relative_to(data_dir)
-        dst = out_dir / rel.parent
+        dst = out_dir / rel
+
+        if args.salvage:
+            schema_from = Path(args.schema_from) if args.schema_from else None
+            try:
+                report = salvage_one(src, dst, schema_from, args.verify)
+            except Exception as e:
+                print(f"unrecoverable: {rel}: {e}")
+                continue
+            dst.with_name(dst.name + ".salvage.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+            lost = len(report["row_groups_lost"])
+            print(f"salvaged: {rel} ({report['row_groups_recovered']} row groups kept, {lost} lost)")
+            continue
 
         if is_readable_parquet(src):
             dst.parent.mkdir(parents=True, exist_ok=True)
@@ -55,11 +590,11 @@ def main():
 
         ok = recover_one(src, dst)
         if ok:
-            print(f"{rel}")
+            print(f"recovered: {rel}")
         else:
-            print(f"{rel}")
+            print(f"unrecoverable: {rel}")
 
 
 if __name__ == "__main__":
-    main()
+    run_main("recover_parquet", main)
 
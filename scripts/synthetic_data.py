@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Synthetic inputs shaped like caspian_hackathon_assets, at any scale.
+
+- master_wells.csv / master_sensors.csv / master_surveys.csv
+- legacy_survey_<year>_<survey type>_<n>.sgx files in the CPETRO01 format (see decode_sgx.py)
+- archive_batch_seismic_readings_<n>.parquet files with trailing junk after
+  the footer (what recover_parquet.py repairs); the junk may contain stray
+  PAR1 markers so the backward footer scan has to skip false candidates
+
+A small fraction of readings reference unknown wells, so the rule engine has
+rows to reject.
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from decode_sgx import HEADER_STRUCT, MAGIC, RECORD_DTYPE
+from vault_profile import run_main
+
+SURVEY_TYPE_IDS = (101, 102, 205)
+FIRST_SENSOR_ID = 100
+UNKNOWN_WELL_RATE = 0.01
+DEFAULT_ROW_GROUP_SIZE = 100_000
+
+
+def write_masters(out_dir: Path, wells: int = 50, sensors: int = 40) -> dict[str, Path]:
+    """
+    Master CSVs with the columns of the real ones. Returns {business key: path}.
+    """
+    rng = np.random.default_rng(0)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    frames = {
+        "well_id": ("master_wells.csv", pd.DataFrame({
+            "well_id": np.arange(1, wells + 1),
+            "well_name": [f"CASPIAN-{i:03d}" for i in range(1, wells + 1)],
+            "location_lat": rng.uniform(39, 42, wells),
+            "location_long": rng.uniform(49, 52, wells),
+            "operator": "CaspianPetro Legacy Div",
+            "spud_date": (pd.Timestamp("1990-01-01") + pd.to_timedelta(rng.integers(0, 3650, wells), unit="D")).date,
+        })),
+        "sensor_id": ("master_sensors.csv", pd.DataFrame({
+            "sensor_id": np.arange(FIRST_SENSOR_ID, FIRST_SENSOR_ID + sensors),
+            "sensor_type": rng.choice(["Accelerometer", "Geophone", "Hydrophone"], sensors),
+            "calibration_date": pd.Timestamp("2011-09-15"),
+        })),
+        "survey_type_id": ("master_surveys.csv", pd.DataFrame({
+            "survey_type_id": list(SURVEY_TYPE_IDS),
+            "survey_type": ["Acoustic_2D", "Acoustic_3D", "Seismic_Reflection"],
+        })),
+    }
+    paths = {}
+    for bk, (name, df) in frames.items():
+        paths[bk] = out_dir / name
+        df.to_csv(paths[bk], index=False)
+    return paths
+
+
+def _well_ids(rng, n: int, wells: int) -> np.ndarray:
+    ids = rng.integers(1, wells + 1, n)
+    unknown = rng.random(n) < UNKNOWN_WELL_RATE
+    ids[unknown] = wells + 1 + rng.integers(0, 1000, int(unknown.sum()))
+    return ids
+
+
+def write_synthetic_sgx(path: Path, trace_count: int, survey_type_id: int = 101, seed: int = 0,
+                        wells: int = 50) -> None:
+    rng = np.random.default_rng(seed)
+    records = np.empty(trace_count, dtype=RECORD_DTYPE)
+    records["well_id"] = _well_ids(rng, trace_count, wells)
+    records["depth_ft"] = rng.uniform(1000, 12000, trace_count)
+    records["amplitude"] = rng.normal(0, 10, trace_count)
+    records["quality_flag"] = rng.integers(0, 2, trace_count)
+
+    with path.open("wb") as f:
+        f.write(HEADER_STRUCT.pack(MAGIC, survey_type_id, trace_count))
+        f.write(records.tobytes())
+
+
+def synthetic_readings(n: int, seed: int = 0, wells: int = 50, sensors: int = 40) -> pa.Table:
+    """
+    Readings with the schema of archive_batch_seismic_readings*.parquet.
+    """
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("1995-01-01T00:00:00", "ns")
+    return pa.table({
+        "well_id": _well_ids(rng, n, wells),
+        "survey_type_id": rng.choice(SURVEY_TYPE_IDS, n).astype(np.int64),
+        "sensor_id": rng.integers(FIRST_SENSOR_ID, FIRST_SENSOR_ID + sensors, n),
+        "depth_ft": rng.uniform(1000, 12000, n),
+        "amplitude": rng.normal(0, 10, n),
+        "timestamp": start + rng.integers(0, 10 * 365 * 86_400, n).astype("timedelta64[s]"),
+        "quality_flag": rng.integers(0, 2, n),
+    })
+
+
+def write_corrupted_parquet(path: Path, rows: int, junk_bytes: int = 4096, seed: int = 0,
+                            row_group_size: int = DEFAULT_ROW_GROUP_SIZE, false_markers: int = 2) -> int:
+    """
+    A valid parquet file followed by `junk_bytes` random bytes containing
+    `false_markers` stray PAR1 markers. Returns the length of the valid prefix.
+    """
+    rng = np.random.default_rng(seed)
+    pq.write_table(synthetic_readings(rows, seed), path, row_group_size=row_group_size)
+    valid = path.stat().st_size
+
+    junk = bytearray(rng.integers(0, 256, junk_bytes, dtype=np.uint8).tobytes())
+    for pos in rng.integers(0, max(junk_bytes - 4, 1), false_markers if junk_bytes >= 4 else 0):
+        junk[pos:pos + 4] = b"PAR1"
+    with path.open("ab") as f:
+        f.write(junk)
+    return valid
+
+
+def generate(out_dir: Path, sgx_files: int, traces: int, parquet_files: int, rows: int,
+             junk_bytes: int = 4096, wells: int = 50, sensors: int = 40) -> dict:
+    """
+    Write a full synthetic asset directory. Returns the paths written.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    masters = write_masters(out_dir, wells, sensors)
+
+    sgx = []
+    for i in range(sgx_files):
+        # named like the real files: the survey year feeds add_metadata_to_parquet
+        survey_type_id = SURVEY_TYPE_IDS[i % len(SURVEY_TYPE_IDS)]
+        p = out_dir / f"legacy_survey_{1990 + i % 10}_{survey_type_id}_{i:03d}.sgx"
+        write_synthetic_sgx(p, traces, survey_type_id, seed=i, wells=wells)
+        sgx.append(p)
+
+    parquet = []
+    for i in range(parquet_files):
+        p = out_dir / f"archive_batch_seismic_readings_{i:03d}.parquet"
+        write_corrupted_parquet(p, rows, junk_bytes, seed=1000 + i)
+        parquet.append(p)
+
+    return {"masters": masters, "sgx": sgx, "parquet": parquet}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate synthetic SGX / corrupted parquet / master files.")
+    ap.add_argument("--out-dir", required=True)
+    ap.add_argument("--sgx-files", type=int, default=4)
+    ap.add_argument("--traces", type=int, default=1_000_000, help="Trace records per .sgx file")
+    ap.add_argument("--parquet-files", type=int, default=4)
+    ap.add_argument("--rows", type=int, default=1_000_000, help="Rows per parquet file")
+    ap.add_argument("--junk-bytes", type=int, default=4096, help="Trailing junk appended to each parquet file")
+    ap.add_argument("--wells", type=int, default=50)
+    ap.add_argument("--sensors", type=int, default=40)
+    args = ap.parse_args()
+
+    out = generate(Path(args.out_dir), args.sgx_files, args.traces, args.parquet_files, args.rows,
+                   args.junk_bytes, args.wells, args.sensors)
+    size_mb = sum(p.stat().st_size for p in out["sgx"] + out["parquet"]) / 1e6
+    print(f"Wrote {len(out['sgx'])} .sgx and {len(out['parquet'])} parquet files ({size_mb:.1f} MB) to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    run_main("synthetic_data", main)
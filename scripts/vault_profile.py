@@ -0,0 +1,228 @@
+"""
+cProfile + tracemalloc profiling for the scripts (the DAG tasks use
+raw_vault.profiling). Standalone: the scripts import it without the DAG package.
+
+- run_main(name, main): profiles main() when RAW_VAULT_PROFILE is set or
+  --profile is given
+- profile_worker(name): profiles a function run in worker processes; each
+  worker collects stats over its whole life and writes them once, at exit
+
+A profiled run writes <name>__<run>__<pid>.prof (pstats) and .json (wall
+time, peak traced memory, Arrow memory pool peak, top allocation sites) to
+RAW_VAULT_PROFILE_DIR (default <project>/profiles).
+"""
+import cProfile
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from multiprocessing import util as mp_util
+from pathlib import Path
+
+import pyarrow as pa
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+PROFILE_FLAG = "--profile"
+PROFILE_ENABLED = os.environ.get("RAW_VAULT_PROFILE", "").lower() in ("1", "true", "yes")
+PROFILE_DIR = Path(os.environ.get("RAW_VAULT_PROFILE_DIR", PROJECT_ROOT / "profiles"))
+PROFILE_TOP_ALLOCATIONS = int(os.environ.get("RAW_VAULT_PROFILE_TOP_ALLOCATIONS", "25"))
+# shared by a script and its worker processes (spawned ones read it from the environment)
+RUN_ID_ENV = "RAW_VAULT_RUN_ID"
+
+# (pid, profiler) of the profiled() block running, if any
+_active: tuple[int, cProfile.Profile] | None = None
+# set by run_main() for --profile
+_flag_enabled = False
+# profile_worker() state of this worker process: one profiler for its whole life
+_worker: dict | None = None
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+
+def run_id() -> str:
+    return os.environ.get("AIRFLOW_CTX_DAG_RUN_ID") or os.environ.setdefault(RUN_ID_ENV, f"process-{uuid.uuid4().hex}")
+
+
+def profile_stem(name: str) -> str:
+    """
+    <name>__<run>__<pid>: the run id made file-safe, the pid keeps a script's
+    worker processes (and parallel scripts) apart.
+    """
+    run = re.sub(r"[^A-Za-z0-9._-]+", "_", run_id())
+    return f"{name}__{run}__{os.getpid()}"
+
+
+def _allocation_sites(snapshot: tracemalloc.Snapshot, top: int) -> list[dict]:
+    # module code objects loaded by imports would otherwise top the list
+    # (dropped after grouping: filter_traces() is slow on large snapshots)
+    skip = {tracemalloc.__file__, cProfile.__file__,
+            "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>"}
+    stats = [s for s in snapshot.statistics("lineno") if s.traceback[0].filename not in skip]
+    return [
+        {"site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}", "bytes": s.size, "blocks": s.count}
+        for s in stats[:top]
+    ]
+
+
+def _is_enabled(enabled: bool | None) -> bool:
+    return (PROFILE_ENABLED or _flag_enabled) if enabled is None else enabled
+
+
+def _covered() -> bool:
+    """
+    True inside a profiled() block of this process. A forked worker inherits
+    its parent's active profiler: it is turned off here so the worker's own
+    profile is not mixed into a copy nobody writes out.
+    """
+    if _active is None:
+        return False
+    pid, profiler = _active
+    if pid == os.getpid():
+        return True
+    profiler.disable()
+    return False
+
+
+def _write_profile(out_dir: Path, stem: str, profiler: cProfile.Profile, meta: dict) -> None:
+    sites = _allocation_sites(tracemalloc.take_snapshot(), PROFILE_TOP_ALLOCATIONS)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(out_dir / f"{stem}.prof")
+    (out_dir / f"{stem}.json").write_text(json.dumps({
+        "run_id": run_id(),
+        "pid": os.getpid(),
+        **meta,
+        # the pool's high-water mark over the life of the process (a forked worker starts from its parent's)
+        "arrow_peak_bytes": pa.default_memory_pool().max_memory(),
+        "top_allocations": sites,
+    }, indent=2))
+
+
+@contextmanager
+def profiled(name: str, enabled: bool | None = None, out_dir: Path | None = None):
+    """
+    Profile the block when `enabled` (default: RAW_VAULT_PROFILE or --profile).
+    A block nested in another one of the same process is covered by the outer profile.
+    """
+    global _active
+    if not _is_enabled(enabled) or _covered():
+        yield
+        return
+
+    out_dir = Path(out_dir or PROFILE_DIR)
+    stem = profile_stem(name)
+    started = _utc_now_iso()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    t0 = time.perf_counter()
+    _active = (os.getpid(), profiler)
+    profiler.enable()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "failed"
+        raise
+    finally:
+        profiler.disable()
+        _active = None
+        seconds = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        _write_profile(out_dir, stem, profiler, {
+            "name": name,
+            "started_dts": started,
+            "status": status,
+            "seconds": round(seconds, 3),
+            "peak_bytes": peak,
+        })
+        if not tracing:
+            tracemalloc.stop()
+        print(f"profile {name}: {seconds:.2f}s, peak {peak / 1e6:.1f} MB traced, "
+              f"{pa.default_memory_pool().max_memory() / 1e6:.1f} MB arrow -> {out_dir / stem}.prof")
+
+
+def _write_worker_profile() -> None:
+    # multiprocessing finalizer: runs once when the worker process exits
+    w = _worker
+    if w is None or w["pid"] != os.getpid():
+        return
+    _write_profile(Path(PROFILE_DIR), w["stem"], w["profiler"], {
+        "name": w["name"],
+        "started_dts": w["started_dts"],
+        "status": w["status"],
+        "calls": w["calls"],
+        "seconds": round(w["seconds"], 3),
+        "peak_bytes": tracemalloc.get_traced_memory()[1],
+    })
+
+
+def _worker_state(name: str) -> dict:
+    global _worker
+    if _worker is None or _worker["pid"] != os.getpid():
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        _worker = {"pid": os.getpid(), "name": name, "profiler": cProfile.Profile(), "stem": profile_stem(name),
+                   "started_dts": _utc_now_iso(), "status": "ok", "calls": 0, "seconds": 0.0}
+        mp_util.Finalize(None, _write_worker_profile, exitpriority=10)
+    return _worker
+
+
+def profile_worker(name: str):
+    """
+    Decorator for functions run in worker processes (ProcessPoolExecutor).
+    When profiling is on, each worker process accumulates its calls in one
+    profiler and writes <name>__<run>__<pid> once, when the worker exits, so
+    the measured calls do not pay for writing profiles. Calls made inside a
+    profiled() block of the same process (e.g. --workers 1) are left to that block.
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _is_enabled(None) or _covered():
+                return func(*args, **kwargs)
+
+            w = _worker_state(name)
+            t0 = time.perf_counter()
+            w["profiler"].enable()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                w["status"] = "failed"
+                raise
+            finally:
+                w["profiler"].disable()
+                w["calls"] += 1
+                w["seconds"] += time.perf_counter() - t0
+        return wrapper
+    return decorate
+
+
+def run_main(name: str, main) -> None:
+    """
+    Script entry point: runs main() under profiled() when RAW_VAULT_PROFILE is
+    set or --profile is given. The flag is taken out of sys.argv before main()
+    parses its own arguments, so every script accepts it; it also turns on
+    profile_worker() in the script's worker processes.
+    """
+    global _flag_enabled
+    if PROFILE_FLAG in sys.argv[1:]:
+        sys.argv = [a for a in sys.argv if a != PROFILE_FLAG]
+        # forked workers inherit the flag, spawned ones read the environment
+        _flag_enabled = True
+        os.environ["RAW_VAULT_PROFILE"] = "1"
+    if _is_enabled(None):
+        run_id()  # fixed before the workers start, so they share it
+    with profiled(name):
+        main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Parquet storage for the raw vault outputs (hubs, links, satellites).
+
+Each vault table is a directory of hive-partitioned Parquet files, e.g.
+
+    processed_data/raw_vault/sats/sat_link_sensor_well_readings/
+        record_source=archive_batch_seismic_readings.parquet/part-20250101T000000-0.parquet
+
+- columns keep their types (timestamps, floats, ints); load_dts is a UTC timestamp
+- key columns (business keys, hash keys, record_source) are dictionary encoded
+- zstd compressed
+- appends add new files next to the existing ones, full builds replace the directory
+"""
+import shutil
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+COMPRESSION = "zstd"
+PARTITION_COLUMNS = ("record_source", "load_date")
+# string columns dictionary-encoded besides the partition column
+KEY_SUFFIXES = ("_id", "_hk")
+
+
+def key_columns(columns) -> list[str]:
+    return [c for c in columns if c.endswith(KEY_SUFFIXES) or c == "record_source"]
+
+
+def to_vault_arrow(df: pd.DataFrame) -> pa.Table:
+    """
+    Arrow table with vault column types: load_dts as timestamp (UTC), strings
+    as plain utf8 (so files from every load share one schema), the rest as inferred.
+    """
+    df = df.copy()
+    if "load_dts" in df.columns:
+        df["load_dts"] = pd.to_datetime(df["load_dts"], utc=True)
+    t = pa.Table.from_pandas(df, preserve_index=False)
+    schema = pa.schema([
+        f.with_type(pa.string()) if pa.types.is_large_string(f.type) else f for f in t.schema
+    ], metadata=t.schema.metadata)
+    return t.cast(schema)
+
+
+def write_vault_table(
+    df: pd.DataFrame,
+    table_dir: Path,
+    partition_by: str = "record_source",
+    append: bool = False,
+    batch_id: str | None = None,
+) -> int:
+    """
+    Write `df` as a partitioned Parquet dataset under `table_dir`.
+    partition_by is "record_source" or "load_date" (the date part of load_dts).
+    append=False replaces the whole table; append=True adds files named
+    after `batch_id` (default: the rows' load_dts plus a random suffix) so
+    earlier loads are kept.
+    Returns the number of rows written.
+    """
+    if partition_by not in PARTITION_COLUMNS:
+        raise ValueError(f"partition_by must be one of {PARTITION_COLUMNS}")
+
+    table_dir = Path(table_dir)
+    if not append and table_dir.exists():
+        shutil.rmtree(table_dir)
+    table_dir.mkdir(parents=True, exist_ok=True)
+
+    t = to_vault_arrow(df)
+    if partition_by == "load_date":
+        if "load_dts" not in t.column_names:
+            raise ValueError("partition_by='load_date' needs a load_dts column")
+        t = t.append_column("load_date", pc.strftime(t.column("load_dts"), format="%Y-%m-%d"))
+
+    if batch_id is None:
+        stamp = pd.Timestamp(df["load_dts"].iloc[0]).strftime("%Y%m%dT%H%M%S") if "load_dts" in df.columns and len(df) else "load"
+        batch_id = f"{stamp}-{uuid.uuid4().hex[:8]}"
+
+    ds.write_dataset(
+        t,
+        table_dir,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([(partition_by, pa.string())]), flavor="hive"),
+        basename_template=f"part-{batch_id}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        file_options=ds.ParquetFileFormat().make_write_options(
+            compression=COMPRESSION,
+            use_dictionary=key_columns(t.column_names),
+        ),
+    )
+    return t.num_rows
+
+
+def vault_dataset(table_dir: Path) -> ds.Dataset:
+    """
+    The table as a pyarrow dataset. Files written by different loads may carry
+    different column sets; the dataset schema is their union.
+    """
+    table_dir = Path(table_dir)
+    # partition directories can end in .parquet too (record_source=<file>.parquet)
+    files = sorted(p for p in table_dir.rglob("*.parquet") if p.is_file())
+    if not files:
+        raise FileNotFoundError(f"No parquet files under {table_dir}")
+
+    partition_cols = [part.split("=", 1)[0] for part in files[0].relative_to(table_dir).parts[:-1]]
+    partition_schema = pa.schema([(c, pa.string()) for c in partition_cols])
+    schema = pa.unify_schemas([pq.read_schema(f) for f in files] + [partition_schema])
+    return ds.dataset(
+        [str(f) for f in files],
+        schema=schema,
+        format="parquet",
+        partitioning=ds.partitioning(partition_schema, flavor="hive"),
+        partition_base_dir=str(table_dir),
+    )
+
+
+def read_vault_table(table_dir: Path, columns: list[str] | None = None, filters=None) -> pa.Table:
+    """
+    Read a vault table. `filters` is a pyarrow expression or a list of
+    (column, op, value) tuples as in pyarrow.parquet.read_table; conditions
+    on the partition column skip whole directories.
+    """
+    if filters is not None and not isinstance(filters, ds.Expression):
+        filters = pq.filters_to_expression(filters)
+    return vault_dataset(table_dir).to_table(columns=columns, filter=filters)
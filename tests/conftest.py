@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+# the DAG package and the scripts import as they do under Airflow / from scripts/
+for path in (PROJECT_ROOT / "dags", PROJECT_ROOT / "scripts"):
+    sys.path.insert(0, str(path))
@@ -0,0 +1,175 @@
+import struct
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from raw_vault.bulk import (
+    PGCOPY_HEADER, PGCOPY_TRAILER, binary_copy_chunks, cast_reader, copy_binary, encode_binary_rows, pg_column_type,
+)
+from raw_vault.schema import SAT_COLUMNS, satellite_arrow_schema
+
+PG_EPOCH = datetime(2000, 1, 1)
+PG_EPOCH_DATE = date(2000, 1, 1)
+
+
+def _decode_value(pg: str, raw: bytes):
+    if pg == "boolean":
+        return raw == b"\x01"
+    if pg in ("smallint", "integer", "bigint"):
+        return int.from_bytes(raw, "big", signed=True)
+    if pg == "real":
+        return struct.unpack(">f", raw)[0]
+    if pg == "double precision":
+        return struct.unpack(">d", raw)[0]
+    if pg == "timestamp":
+        return PG_EPOCH + timedelta(microseconds=int.from_bytes(raw, "big", signed=True))
+    if pg == "timestamptz":
+        us = int.from_bytes(raw, "big", signed=True)
+        return (PG_EPOCH + timedelta(microseconds=us)).replace(tzinfo=timezone.utc)
+    if pg == "numeric":
+        ndigits, weight, sign, _ = struct.unpack(">hhHh", raw[:8])
+        digits = struct.unpack(f">{ndigits}h", raw[8:])
+        value = sum(d * 10000 ** (weight - i) for i, d in enumerate(digits))
+        return -value if sign == 0x4000 else value
+    if pg == "date":
+        return PG_EPOCH_DATE + timedelta(days=int.from_bytes(raw, "big", signed=True))
+    return raw.decode("utf-8")
+
+
+def parse_pgcopy(data: bytes, types: list[str]) -> list[tuple]:
+    """
+    Rows of a binary COPY stream, decoded with the PostgreSQL type of each column.
+    """
+    assert data.startswith(PGCOPY_HEADER)
+    assert data.endswith(PGCOPY_TRAILER)
+    pos, rows = len(PGCOPY_HEADER), []
+    while True:
+        (fields,) = struct.unpack_from(">h", data, pos)
+        pos += 2
+        if fields == -1:
+            break
+        assert fields == len(types)
+        row = []
+        for pg in types:
+            (size,) = struct.unpack_from(">i", data, pos)
+            pos += 4
+            if size == -1:
+                row.append(None)
+                continue
+            row.append(_decode_value(pg, data[pos:pos + size]))
+            pos += size
+        rows.append(tuple(row))
+    assert pos == len(data)
+    return rows
+
+
+def _round_trip(table: pa.Table) -> list[tuple]:
+    types = [pg_column_type(f.type) for f in table.schema]
+    return parse_pgcopy(b"".join(binary_copy_chunks(table.to_batches(max_chunksize=2))), types)
+
+
+TS = [datetime(2023, 5, 17, 8, 30, 15, 123456), None, datetime(1999, 12, 31, 23, 59, 59)]
+
+CASES = [
+    (pa.array([True, None, False]), "boolean", [True, None, False]),
+    (pa.array([-128, None, 127], pa.int8()), "smallint", [-128, None, 127]),
+    (pa.array([-32768, None, 32767], pa.int16()), "smallint", [-32768, None, 32767]),
+    (pa.array([0, None, 255], pa.uint8()), "smallint", [0, None, 255]),
+    (pa.array([-2**31, None, 2**31 - 1], pa.int32()), "integer", [-2**31, None, 2**31 - 1]),
+    (pa.array([0, None, 65535], pa.uint16()), "integer", [0, None, 65535]),
+    (pa.array([-2**63, None, 2**63 - 1], pa.int64()), "bigint", [-2**63, None, 2**63 - 1]),
+    (pa.array([0, None, 2**32 - 1], pa.uint32()), "bigint", [0, None, 2**32 - 1]),
+    (pa.array([0, None, 2**64 - 1], pa.uint64()), "numeric", [0, None, 2**64 - 1]),
+    (pa.array(np.array([1.5, -2.25, 0], np.float16), pa.float16()), "real", [1.5, -2.25, 0.0]),
+    (pa.array([1.5, None, -2.25], pa.float32()), "real", [1.5, None, -2.25]),
+    (pa.array([1.1, None, -1e300], pa.float64()), "double precision", [1.1, None, -1e300]),
+    (pa.array(TS, pa.timestamp("us")), "timestamp", TS),
+    (pa.array(TS, pa.timestamp("ms")), "timestamp",
+     [TS[0].replace(microsecond=123000), None, TS[2]]),
+    (pa.array(TS, pa.timestamp("us", "UTC")), "timestamptz",
+     [t and t.replace(tzinfo=timezone.utc) for t in TS]),
+    (pa.array([date(2024, 2, 29), None, date(1970, 1, 1)], pa.date32()), "date",
+     [date(2024, 2, 29), None, date(1970, 1, 1)]),
+    (pa.array([date(2024, 2, 29), None, date(1970, 1, 1)], pa.date64()), "date",
+     [date(2024, 2, 29), None, date(1970, 1, 1)]),
+    (pa.array(["well", None, ""]), "text", ["well", None, ""]),
+    (pa.array(["ü€", None, "x" * 300], pa.large_string()), "text", ["ü€", None, "x" * 300]),
+    (pa.array(["a", None, "a"]).dictionary_encode(), "text", ["a", None, "a"]),
+    (pa.array([Decimal("1.25"), None, Decimal("-3.50")], pa.decimal128(5, 2)), "text", ["1.25", None, "-3.50"]),
+]
+
+
+@pytest.mark.parametrize("arr, pg, expected", CASES, ids=[str(c[0].type) for c in CASES])
+def test_binary_copy_round_trip(arr, pg, expected):
+    assert pg_column_type(arr.type) == pg
+    rows = _round_trip(pa.table({"v": arr}))
+    assert [r[0] for r in rows] == expected
+
+
+def test_binary_copy_round_trip_all_types_in_one_row():
+    table = pa.table({f"c{i}": arr for i, (arr, _, _) in enumerate(CASES)})
+    rows = _round_trip(table)
+    assert rows == list(zip(*(expected for _, _, expected in CASES)))
+
+
+def test_uint64_above_bigint_range_loads_as_numeric():
+    values = [2**63, 10_000, 10**16, 1]
+    assert [r[0] for r in _round_trip(pa.table({"v": pa.array(values, pa.uint64())}))] == values
+
+
+def test_sub_microsecond_timestamps_are_truncated():
+    ns = pa.array([1_000_000_001_999, None], pa.timestamp("ns", "UTC"))
+    rows = _round_trip(pa.table({"ts": ns}))
+    assert rows == [(datetime(1970, 1, 1, 0, 16, 40, 1, tzinfo=timezone.utc),), (None,)]
+
+
+def test_sliced_string_batch():
+    batch = pa.record_batch({"s": pa.array(["skip", "kept", None, "too"])}).slice(1, 2)
+    data = PGCOPY_HEADER + encode_binary_rows(batch) + PGCOPY_TRAILER
+    assert parse_pgcopy(data, ["text"]) == [("kept",), (None,)]
+
+
+class _CopyCursor:
+    def __init__(self):
+        self.sql, self.data = None, b""
+
+    def copy_expert(self, sql, file, size=8192):
+        self.sql = sql
+        while chunk := file.read(size):
+            self.data += chunk
+
+
+def test_copy_binary_streams_a_reader():
+    table = pa.table({"well_id": ["W1", "W2", None], "depth_ft": [1.0, None, 3.0]})
+    reader = pa.RecordBatchReader.from_batches(table.schema, table.to_batches(max_chunksize=1))
+    cur = _CopyCursor()
+
+    assert copy_binary(cur, "raw_vault.t", reader) == 3
+    assert cur.sql == 'COPY raw_vault.t ("well_id", "depth_ft") FROM STDIN WITH (FORMAT binary)'
+    assert parse_pgcopy(cur.data, ["text", "double precision"]) == [("W1", 1.0), ("W2", None), (None, 3.0)]
+
+
+def test_vault_satellite_is_staged_with_the_dag_types():
+    vault = pa.table({
+        "sensor_well_hk": ["a1"],
+        "well_id": ["W1"],
+        "survey_type_id": pa.array([101], pa.int64()),
+        "quality_flag": pa.array([1], pa.int64()),
+        "timestamp": pa.array([datetime(2023, 1, 2, 3, 4, 5, 6)], pa.timestamp("ns")),
+        "hashdiff": pa.array([-7], pa.int64()),
+    })
+    schema = satellite_arrow_schema(vault.schema)
+    sat = dict(SAT_COLUMNS)
+    assert [(f.name, pg_column_type(f.type)) for f in schema] == [
+        ("sensor_well_hk", "text"), ("well_id", sat["well_id"]), ("survey_type_id", sat["survey_type_id"]),
+        ("quality_flag", sat["quality_flag"]), ("timestamp", sat["timestamp"]), ("hashdiff", "bigint"),
+    ]
+
+    reader = cast_reader(pa.RecordBatchReader.from_batches(vault.schema, vault.to_batches()), schema)
+    types = [pg_column_type(f.type) for f in schema]
+    assert parse_pgcopy(b"".join(binary_copy_chunks(reader)), types) == [
+        ("a1", "W1", "101", 1, datetime(2023, 1, 2, 3, 4, 5, 6, tzinfo=timezone.utc), -7),
+    ]
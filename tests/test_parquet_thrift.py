@@ -0,0 +1,85 @@
+import io
+import struct
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import parquet_thrift as pt
+
+
+def _parquet_bytes(row_groups: int = 3) -> bytes:
+    table = pa.table({
+        "well_id": pa.array(["W1", "W2", None] * 4).dictionary_encode(),
+        "depth_ft": [1.5, None, 3.0] * 4,
+        "quality_flag": pa.array([0, 1, None] * 4, pa.int32()),
+    })
+    buf = io.BytesIO()
+    pq.write_table(table, buf, row_group_size=len(table) // row_groups)
+    return buf.getvalue()
+
+
+def _footer(data: bytes) -> tuple[int, int]:
+    (length,) = struct.unpack("<I", data[-8:-4])
+    return len(data) - 8 - length, length
+
+
+def test_file_metadata_round_trip():
+    data = _parquet_bytes()
+    start, length = _footer(data)
+
+    meta, end = pt.read_struct_at(data, start, start + length)
+    assert end == start + length
+    assert pt.int_field(meta, 3) == 12  # num_rows
+    row_groups = meta[4][1][1]
+    assert len(row_groups) == 3
+    assert sum(pt.int_field(rg, 3) for rg in row_groups) == 12
+    schema = meta[2][1][1]
+    assert [e[4][1] for e in schema[1:]] == [b"well_id", b"depth_ft", b"quality_flag"]
+
+    encoded = pt.encode_struct(meta)
+    assert encoded == data[start:start + length]
+
+
+def test_rewritten_footer_is_readable():
+    data = _parquet_bytes()
+    start, length = _footer(data)
+    meta, _ = pt.read_struct_at(data, start, start + length)
+
+    # keep the first row group only, as the salvage does
+    meta[4] = (pt.LIST, (pt.STRUCT, meta[4][1][1][:1]))
+    meta[3] = (pt.I64, pt.int_field(meta[4][1][1][0], 3))
+    footer = pt.encode_struct(meta)
+    rewritten = data[:start] + footer + struct.pack("<I", len(footer)) + b"PAR1"
+
+    table = pq.read_table(io.BytesIO(rewritten))
+    assert table.num_rows == 4
+    assert table.column("depth_ft").to_pylist() == [1.5, None, 3.0, 1.5]
+
+
+def test_struct_round_trip_all_types():
+    fields = {
+        1: (pt.BYTE, -5),
+        2: (pt.I16, -300),
+        3: (pt.I32, 2**31 - 1),
+        4: (pt.I64, -2**63),
+        5: (pt.DOUBLE, 2.5),
+        6: (pt.BINARY, b"\x00PAR1"),
+        7: (pt.TRUE, True),
+        8: (pt.TRUE, False),
+        9: (pt.LIST, (pt.I32, list(range(20)))),
+        10: (pt.SET, (pt.TRUE, [True, False])),
+        11: (pt.MAP, (pt.BINARY, pt.I64, [(b"a", 1), (b"b", -1)])),
+        12: (pt.MAP, (pt.STOP, pt.STOP, [])),
+        40: (pt.STRUCT, {1: (pt.LIST, (pt.STRUCT, [{1: (pt.I32, 7)}, {}]))}),
+    }
+    encoded = pt.encode_struct(fields)
+    decoded, end = pt.read_struct_at(encoded)
+    assert end == len(encoded)
+    assert decoded == fields
+
+
+@pytest.mark.parametrize("garbage", [b"", b"\x15", b"\x19\xfc\x01", b"\x18\x80\x80\x80\x80\x80\x80\x80\x80\x80\x80\x01"])
+def test_truncated_or_garbage_input_raises(garbage):
+    with pytest.raises(pt.ThriftError):
+        pt.read_struct_at(garbage)
@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from raw_vault import pipeline
+
+RUN_LOAD_DTS = "2026-01-01T00:00:00+00:00"
+
+
+def test_partition_range_uses_the_files_load_dts(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "SAT_PARTITION_COLUMN", "load_dts")
+    fp = tmp_path / "sat.parquet"
+    # text order differs from time order once offsets differ
+    pq.write_table(pa.table({"load_dts": ["2023-01-05T00:00:00+00:00", "2023-03-01T01:00:00+04:00", None]}), fp)
+
+    assert pipeline._partition_range(fp, RUN_LOAD_DTS) == (
+        datetime(2023, 1, 5, tzinfo=timezone.utc), datetime(2023, 2, 28, 21, tzinfo=timezone.utc),
+    )
+
+
+def test_partition_range_falls_back_to_the_run_load_dts(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "SAT_PARTITION_COLUMN", "load_dts")
+    fp = tmp_path / "decoded.parquet"
+    pq.write_table(pa.table({"depth_ft": [1.0]}), fp)
+
+    assert pipeline._partition_range(fp, RUN_LOAD_DTS) == (RUN_LOAD_DTS, RUN_LOAD_DTS)
+
+
+def test_failed_task_still_flushes_its_metrics(monkeypatch):
+    flushed = []
+    monkeypatch.setattr(pipeline.MetricsRecorder, "flush", lambda self, conn=None: flushed.extend(self.records))
+
+    def no_database():
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(pipeline, "pipeline_connection", no_database)
+
+    with pytest.raises(ConnectionError):
+        pipeline.process_and_load(["/data/a.parquet"])
+    assert [(m.stage, m.status) for m in flushed] == [("process_and_load", "failed")]
+
+
+class _FakeConnection:
+    """Manifest rows for SELECT; DELETEs and COPYs are recorded."""
+
+    def __init__(self, manifest: dict[str, str]):
+        self.manifest = manifest
+        self.executed = []
+        self.copied = []
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                conn.executed.append(sql)
+
+            def fetchall(self):
+                return list(conn.manifest.items())
+
+        return Cursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_diff_stores_the_batches_and_returns_only_their_ids(monkeypatch):
+    conn = _FakeConnection({"/data/same.parquet": "s0", "/data/gone.parquet": "g0"})
+
+    @contextmanager
+    def fake_connection():
+        yield conn
+
+    monkeypatch.setattr(pipeline, "pipeline_connection", fake_connection)
+    monkeypatch.setattr(pipeline, "copy_rows", lambda cur, table, df: conn.copied.append((table, df)))
+    monkeypatch.setattr(pipeline.MetricsRecorder, "flush", lambda self, conn=None: None)
+
+    files = [
+        {"file_path": f"/data/{name}.parquet", "sha256": sha, "file_size": 1, "file_mtime_ns": 2, "file_inode": 3}
+        for name, sha in [("same", "s0"), ("new1", "n1"), ("new2", "n2"), ("new3", "n3")]
+    ]
+    diff = pipeline.diff_against_manifest(files, batch_size=2)
+
+    assert diff == {"batches": [0, 1], "missing": ["/data/gone.parquet"]}
+    [(table, scan)] = conn.copied
+    assert table == pipeline.SCAN_TABLE
+    assert scan["batch_id"].tolist() == [0, 0, 1]
+    assert scan["file_path"].tolist() == ["/data/new1.parquet", "/data/new2.parquet", "/data/new3.parquet"]
+    assert any(sql.startswith(f"DELETE FROM {pipeline.SCAN_TABLE}") for sql in conn.executed)
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import recover_parquet as rp
+
+ROWS_PER_GROUP = 100
+
+
+def _write(path: Path, row_groups: int = 3) -> pa.Table:
+    n = row_groups * ROWS_PER_GROUP
+    table = pa.table({"well_id": [f"W{i % 7}" for i in range(n)], "depth_ft": [float(i) for i in range(n)]})
+    pq.write_table(table, path, row_group_size=ROWS_PER_GROUP)
+    return table
+
+
+def _depths(path: Path) -> list[float]:
+    return pq.read_table(path).column("depth_ft").to_pylist()
+
+
+def test_salvage_drops_a_damaged_middle_row_group(tmp_path):
+    good = tmp_path / "good.parquet"
+    _write(good)
+    chunk = pq.ParquetFile(good).metadata.row_group(1).column(0)
+    start = chunk.dictionary_page_offset or chunk.data_page_offset
+    data = bytearray(good.read_bytes())
+    data[start:start + 16] = b"\xff" * 16
+    bad = tmp_path / "bad.parquet"
+    bad.write_bytes(data)
+
+    report = rp.salvage_one(bad, tmp_path / "out.parquet")
+
+    assert report["mode"] == "footer"
+    assert [(lost["row_group"], lost["rows"]) for lost in report["row_groups_lost"]] == [(1, ROWS_PER_GROUP)]
+    assert (report["rows_recovered"], report["rows_lost"]) == (200, 100)
+    assert _depths(tmp_path / "out.parquet") == [float(i) for i in list(range(100)) + list(range(200, 300))]
+
+
+def test_salvage_rebuilds_a_damaged_footer_from_the_pages(tmp_path):
+    good = tmp_path / "good.parquet"
+    table = _write(good)
+    data = bytearray(good.read_bytes())
+    data[-30:] = b"\0" * 30
+    bad = tmp_path / "bad.parquet"
+    bad.write_bytes(data)
+
+    report = rp.salvage_one(bad, tmp_path / "out.parquet", schema_from=good)
+
+    assert report["mode"] == "scan"
+    assert report["row_groups_lost"] == []
+    assert report["rows_recovered"] == table.num_rows
+    assert pq.read_table(tmp_path / "out.parquet").equals(table)
+
+
+def test_open_recovered_reads_the_valid_prefix(tmp_path):
+    path = tmp_path / "junk.parquet"
+    table = _write(path, row_groups=2)
+    with path.open("ab") as f:
+        f.write(b"PAR1 trailing junk")
+
+    pf = rp.open_recovered(path)
+
+    assert pf is not None and pf.read().equals(table)
+    path.write_bytes(b"PAR1 not parquet")
+    assert rp.open_recovered(path) is None
@@ -0,0 +1,49 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+import build_sat_link_sensor_well_readings as build_sat
+from vault_hash import hash_diff
+
+
+def _sat(rows: list[tuple], record_source: str = "part.parquet") -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=["sensor_id", "well_id", "timestamp", "amplitude"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    sat, reason = build_sat.satellite_rows(df, record_source, "c0ffee", "2024-01-01T00:00:00+00:00")
+    assert reason is None
+    return sat
+
+
+def test_hash_diff_is_md5_of_canonical_values():
+    df = pd.DataFrame({"b": [" x "], "a": [1], "t": pd.to_datetime(["1970-01-01 00:00:01"])})
+    expected = hashlib.md5("1.0||x||1000000000".encode("utf-8")).hexdigest()
+    assert hash_diff(df, ["t", "b", "a"]).tolist() == [expected]
+
+
+def test_hash_diff_ignores_dtype_and_column_order():
+    ints = pd.DataFrame({"a": [1, 2], "b": ["x", None]})
+    floats = pd.DataFrame({"b": ["x ", np.nan], "a": [1.0, 2.0]})
+    assert hash_diff(ints, ["a", "b"]).tolist() == hash_diff(floats, ["b", "a"]).tolist()
+    assert hash_diff(ints, ["a", "b"]).nunique() == 2
+
+
+def test_full_build_keeps_every_distinct_row():
+    # the same reading in two source files (decoded and recovered): the full
+    # build keeps both, as the CSV build did; exact duplicates are dropped
+    reading = ("s1", "w1", "2024-01-01", 0.5)
+    sat = pd.concat([_sat([reading, reading], "a.parquet"), _sat([reading], "b.parquet")], ignore_index=True)
+    rows, latest = build_sat.distinct_rows(sat)
+    assert rows["record_source"].tolist() == ["a.parquet", "b.parquet"]
+    assert latest["hashdiff"].tolist() == [rows["hashdiff"].iloc[0]]
+
+    changed, _ = build_sat.detect_changes(sat, build_sat.empty_latest())
+    assert len(changed) == 1
+
+
+def test_incremental_run_appends_only_changes_against_latest():
+    _, latest = build_sat.distinct_rows(_sat([("s1", "w1", "2024-01-01", 0.5)]))
+    delta = _sat([("s1", "w1", "2024-01-01", 0.5), ("s1", "w1", "2024-01-02", 0.7)], "new.parquet")
+    changed, latest = build_sat.detect_changes(delta, latest)
+    assert changed["amplitude"].tolist() == [0.7]
+    assert latest["hashdiff"].tolist() == changed["hashdiff"].tolist()